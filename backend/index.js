@@ -2,22 +2,30 @@
  * Endpoints:
  *  - GET  /health
  *  - GET  /api/events
+ *  - GET  /api/events/tiles/:z/:x/:y  (aggregati precalcolati da backend/tools/build_tiles.py)
  *  - GET  /api/options  (type=continents|countries|locations|groups)
  *  - POST /generate      (genera Excel da istruzioni toolbox)
  *
  * NOTE:
  * 1) Se esistono in DB le RPC (events_public, options_*), il backend le usa.
- * 2) Se NON esistono, usa un fallback lato Node (funzionale).
+ * 2) Se NON esistono e LOCAL_QUERY_URL è impostato, inoltra a backend/tools/query_service.py.
+ * 3) Altrimenti usa un fallback lato Node (funzionale).
  */
 
 const express = require("express");
 const cors = require("cors");
 const { createClient } = require("@supabase/supabase-js");
 const XLSX = require("xlsx");
+const fs = require("fs");
+const path = require("path");
+const zlib = require("zlib");
 require("dotenv").config();
 
 const PORT = process.env.PORT || 4000;
 const CORS_ORIGIN = process.env.CORS_ORIGIN || "*";
+const EVENT_TILES_PATH = process.env.EVENT_TILES_PATH || path.join(__dirname, "data", "event_tiles.json");
+const LOCAL_QUERY_URL = (process.env.LOCAL_QUERY_URL || "").replace(/\/+$/, "");
+const LOCAL_QUERY_TIMEOUT_MS = parseInt(process.env.LOCAL_QUERY_TIMEOUT_MS || "2000", 10);
 
 const SUPABASE_URL = process.env.SUPABASE_URL;
 const SUPABASE_KEY = process.env.SUPABASE_SERVICE_ROLE_KEY;
@@ -50,6 +58,24 @@ const computeYears = (row) => {
   return { from_year: fromY, to_year: toY };
 };
 
+// Servizio locale sullo snapshot (backend/tools/query_service.py); null se non configurato o non raggiungibile.
+const queryLocal = async (pathname, params) => {
+  if (!LOCAL_QUERY_URL) return null;
+  try {
+    const qs = new URLSearchParams(
+      Object.entries(params).filter(([, v]) => v != null && v !== "")
+    ).toString();
+    const resp = await fetch(`${LOCAL_QUERY_URL}${pathname}?${qs}`, {
+      signal: AbortSignal.timeout(LOCAL_QUERY_TIMEOUT_MS)
+    });
+    if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+    return await resp.json();
+  } catch (err) {
+    console.warn("Local query service error:", err?.message || err);
+    return null;
+  }
+};
+
 // ---------- Health ----------
 app.get("/health", (_req, res) => {
   res.json({ ok: true, service: "geohistory-backend", ts: new Date().toISOString() });
@@ -97,7 +123,11 @@ app.get("/api/events", async (req, res) => {
       /* fallback */
     }
 
-    // ---- 2) Fallback diretto su tabella events
+    // ---- 2) Servizio locale sullo snapshot, se configurato
+    const local = await queryLocal("/api/events", req.query);
+    if (local) return res.json(local);
+
+    // ---- 3) Fallback diretto su tabella events
     let query = supabase
       .from("events")
       .select(
@@ -327,6 +357,55 @@ app.get("/api/events", async (req, res) => {
   }
 });
 
+// ---------- /api/events/tiles ----------
+// Legge il file generato da backend/tools/build_tiles.py; lo ricarica solo se cambia su disco.
+let tilesCache = { mtimeMs: 0, data: null };
+const loadEventTiles = () => {
+  const stat = fs.statSync(EVENT_TILES_PATH);
+  if (tilesCache.data && tilesCache.mtimeMs === stat.mtimeMs) return tilesCache.data;
+  let raw = fs.readFileSync(EVENT_TILES_PATH);
+  if (EVENT_TILES_PATH.endsWith(".gz")) raw = zlib.gunzipSync(raw);
+  tilesCache = { mtimeMs: stat.mtimeMs, data: JSON.parse(raw.toString("utf-8")) };
+  return tilesCache.data;
+};
+
+app.get("/api/events/tiles/:z/:x/:y", (req, res) => {
+  try {
+    const { bucket = null, year_start = null, year_end = null } = req.query;
+    let tiles;
+    try {
+      tiles = loadEventTiles();
+    } catch (_e) {
+      return res.status(404).json({ error: "Tiles not built" });
+    }
+    const key = `${toInt(req.params.z, -1)}/${toInt(req.params.x, -1)}/${toInt(req.params.y, -1)}`;
+    const tile = tiles.tiles[key];
+    if (!tile) return res.json({ tile: key, n: 0, ids: [], buckets: {} });
+
+    if (!bucket) {
+      const { n, lat, lon, ids } = tile;
+      return res.json({ tile: key, n, lat, lon, ids });
+    }
+    const size = tiles.buckets?.[bucket];
+    if (!size || !tile[bucket]) return res.status(400).json({ error: "Unknown bucket" });
+
+    const yStart = toInt(year_start, null);
+    const yEnd = toInt(year_end, null);
+    const buckets = {};
+    for (const [start, agg] of Object.entries(tile[bucket])) {
+      const from = parseInt(start, 10);
+      if (yEnd != null && from > yEnd) continue;
+      if (yStart != null && from + size - 1 < yStart) continue;
+      buckets[start] = agg;
+    }
+    res.setHeader("Cache-Control", "public, max-age=300");
+    return res.json({ tile: key, bucket, size, buckets });
+  } catch (err) {
+    console.error(err);
+    res.status(500).json({ error: "Internal error", detail: String(err?.message || err) });
+  }
+});
+
 // ---------- /api/options ----------
 app.get("/api/options", async (req, res) => {
   try {
@@ -385,7 +464,11 @@ app.get("/api/options", async (req, res) => {
       const out = await tryRPC();
       return res.json({ rows: out, source: "rpc" });
     } catch {
-      // 2) Fallback senza RPC
+      // 2) Servizio locale sullo snapshot, se configurato
+      const local = await queryLocal("/api/options", req.query);
+      if (local) return res.json(local);
+
+      // 3) Fallback senza RPC
       let cols = ["continent", "country", "location", "group_event_en", "group_event_it", "event_year", "year_from", "year_to", "exact_date"];
       let query = supabase.from("events").select(cols.join(","));
 
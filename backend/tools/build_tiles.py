@@ -0,0 +1,175 @@
+# FILE: backend/tools/build_tiles.py
+#
+# USO:
+# python backend/tools/build_tiles.py --snapshot backend/data/events_snapshot.jsonl --out backend/data/event_tiles.json
+#
+# OUTPUT:
+# File JSON compatto con aggregati per tile della mappa (z/x/y) e per secolo/decennio:
+# conteggi, baricentro e ID evento rappresentativi. Il backend lo serve su /api/events/tiles.
+
+import argparse
+import gzip
+import json
+import math
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from events_snapshot import DEFAULT_SNAPSHOT_PATH, event_coords, event_years, load_snapshot
+
+DEFAULT_TILES_PATH = DEFAULT_SNAPSHOT_PATH.parent / "event_tiles.json"
+BUCKET_SIZES = {"century": 100, "decade": 10}
+MAX_LAT = 85.05112878
+
+
+def tile_for(lat: float, lon: float, zoom: int) -> tuple[int, int]:
+    # Web Mercator (stesse tile di Mapbox/OSM).
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    n = 1 << zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def buckets_for(start: int, end: int, size: int) -> range:
+    # Chiave = primo anno (con segno) del bucket; un evento conta in ogni bucket che attraversa.
+    first = math.floor(start / size) * size
+    last = math.floor(end / size) * size
+    return range(first, last + size, size)
+
+
+def rank_key(ev: dict[str, Any]) -> tuple:
+    # Rappresentativi: eventi presenti in più journey, poi i più antichi.
+    return (-ev["weight"], ev["start"] if ev["start"] is not None else 10**9, ev["id"])
+
+
+def new_cell() -> dict[str, Any]:
+    return {"n": 0, "lat": 0.0, "lon": 0.0, "top": []}
+
+
+def add_to_cell(cell: dict[str, Any], ev: dict[str, Any], sample: int) -> None:
+    cell["n"] += 1
+    cell["lat"] += ev["lat"]
+    cell["lon"] += ev["lon"]
+    top = cell["top"]
+    top.append(ev)
+    if len(top) > sample * 4:
+        top.sort(key=rank_key)
+        del top[sample:]
+
+
+def finish_cell(cell: dict[str, Any], sample: int) -> dict[str, Any]:
+    top = sorted(cell["top"], key=rank_key)[:sample]
+    return {
+        "n": cell["n"],
+        "lat": round(cell["lat"] / cell["n"], 4),
+        "lon": round(cell["lon"] / cell["n"], 4),
+        "ids": [ev["id"] for ev in top],
+    }
+
+
+def build_tiles(
+    rows: list[dict[str, Any]],
+    min_zoom: int,
+    max_zoom: int,
+    bucket_names: list[str],
+    sample: int,
+) -> dict[str, Any]:
+    events: list[dict[str, Any]] = []
+    skipped = 0
+    for row in rows:
+        coords = event_coords(row)
+        if not coords or not row.get("id"):
+            skipped += 1
+            continue
+        start, end = event_years(row)
+        events.append(
+            {
+                "id": row["id"],
+                "lat": coords[0],
+                "lon": coords[1],
+                "start": start,
+                "end": end,
+                "weight": len(row.get("groups") or []),
+            }
+        )
+
+    tiles: dict[str, dict[str, Any]] = {}
+    for zoom in range(min_zoom, max_zoom + 1):
+        cells: dict[tuple[int, int], dict[str, Any]] = {}
+        for ev in events:
+            key = tile_for(ev["lat"], ev["lon"], zoom)
+            cell = cells.get(key)
+            if cell is None:
+                cell = {"all": new_cell(), **{name: {} for name in bucket_names}}
+                cells[key] = cell
+            add_to_cell(cell["all"], ev, sample)
+            if ev["start"] is None:
+                continue
+            for name in bucket_names:
+                for bucket in buckets_for(ev["start"], ev["end"], BUCKET_SIZES[name]):
+                    add_to_cell(cell[name].setdefault(bucket, new_cell()), ev, sample)
+        for (x, y), cell in cells.items():
+            out = finish_cell(cell["all"], sample)
+            for name in bucket_names:
+                out[name] = {str(b): finish_cell(c, sample) for b, c in sorted(cell[name].items())}
+            tiles[f"{zoom}/{x}/{y}"] = out
+
+    return {
+        "version": 1,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        "buckets": {name: BUCKET_SIZES[name] for name in bucket_names},
+        "sample": sample,
+        "events": len(events),
+        "skipped": skipped,
+        "tiles": tiles,
+    }
+
+
+def write_tiles(payload: dict[str, Any], path: Path) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if path.suffix == ".gz":
+        raw = gzip.compress(raw, compresslevel=9)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_bytes(raw)
+    tmp_path.replace(path)
+    return len(raw)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot", default=str(DEFAULT_SNAPSHOT_PATH))
+    parser.add_argument("--out", default=str(DEFAULT_TILES_PATH))
+    parser.add_argument("--min-zoom", type=int, default=0)
+    parser.add_argument("--max-zoom", type=int, default=8)
+    parser.add_argument("--buckets", default="century,decade")
+    parser.add_argument("--sample", type=int, default=5)
+    args = parser.parse_args()
+
+    bucket_names = [b.strip() for b in args.buckets.split(",") if b.strip()]
+    unknown = [b for b in bucket_names if b not in BUCKET_SIZES]
+    if unknown:
+        raise SystemExit(f"Bucket non supportati: {', '.join(unknown)}")
+    if not 0 <= args.min_zoom <= args.max_zoom <= 22:
+        raise SystemExit("Intervallo zoom non valido")
+
+    rows = list(load_snapshot(Path(args.snapshot)))
+    payload = build_tiles(rows, args.min_zoom, args.max_zoom, bucket_names, max(1, args.sample))
+    size = write_tiles(payload, Path(args.out))
+    print(json.dumps({
+        "events": payload["events"],
+        "skipped": payload["skipped"],
+        "tiles": len(payload["tiles"]),
+        "bytes": size,
+        "out": str(Path(args.out)),
+    }, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
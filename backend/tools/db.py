@@ -0,0 +1,15 @@
+import os
+
+import psycopg
+from psycopg.rows import dict_row
+
+
+def database_url() -> str:
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        raise SystemExit("DATABASE_URL non presente nelle variabili d'ambiente")
+    return url
+
+
+def connect(**kwargs) -> psycopg.Connection:
+    return psycopg.connect(database_url(), row_factory=dict_row, **kwargs)
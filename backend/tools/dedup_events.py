@@ -0,0 +1,405 @@
+# FILE: backend/tools/dedup_events.py
+#
+# USO:
+# python backend/tools/dedup_events.py --snapshot backend/data/events_snapshot.jsonl --out backend/data/dedup_report.json
+# python backend/tools/dedup_events.py --journey frontend/PROMPT/OUTPUT_PROMPT_2.json
+#
+# Trova eventi quasi duplicati (stesso fatto con titolo/descrizione diversi) senza confronti all-pairs:
+# 1) blocking per cella geohash (più le celle vicine entro --max-km) e bucket di anni che si sovrappongono;
+# 2) dentro ogni blocco, LSH sulle firme MinHash dei titoli (per lingua): si confrontano solo le coppie
+#    che condividono almeno una banda;
+# 3) le coppie candidate vengono verificate su distanza, anni, titolo (MinHash) e descrizione (Jaccard).
+# Con --journey vengono riportate solo le coppie che coinvolgono gli eventi del JSON in ingresso.
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import sys
+import unicodedata
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable
+
+from events_snapshot import DEFAULT_SNAPSHOT_PATH, event_coords, event_years, load_snapshot
+from journey_json import LANGS, JourneyValidationError, load_journey
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+STOPWORDS = {
+    "a", "al", "alla", "and", "at", "da", "dei", "del", "della", "delle", "di", "e", "gli",
+    "i", "il", "in", "la", "le", "lo", "of", "on", "per", "the", "to", "un", "una",
+}
+
+
+# =========================
+# GEOHASH
+# =========================
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    out = []
+    bits, ch, even = 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(GEOHASH_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def geohash_cell_size(precision: int) -> tuple[float, float]:
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_neighbourhood(lat: float, lon: float, precision: int, max_km: float) -> set[str]:
+    # Cella dell'evento più tutte quelle entro max_km (almeno le 8 adiacenti): due eventi a distanza
+    # <= max_km restano confrontabili anche se le celle sono più piccole della distanza.
+    dlat, dlon = geohash_cell_size(precision)
+    lat_rings = max(1, math.ceil(max_km / (dlat * KM_PER_DEGREE)))
+    # In longitudine le celle si restringono verso i poli: conta la latitudine più alta raggiungibile.
+    reach = min(90.0, abs(lat) + lat_rings * dlat)
+    lon_km = dlon * KM_PER_DEGREE * math.cos(math.radians(reach))
+    all_lon = math.ceil(180.0 / dlon)
+    lon_rings = all_lon if lon_km <= 0 else min(all_lon, max(1, math.ceil(max_km / lon_km)))
+    cells = set()
+    for i in range(-lat_rings, lat_rings + 1):
+        for j in range(-lon_rings, lon_rings + 1):
+            nlat = max(-90.0, min(90.0, lat + i * dlat))
+            nlon = (lon + j * dlon + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(nlat, nlon, precision))
+    return cells
+
+
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(a: tuple[float, float], b: tuple[float, float]) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(min(1.0, math.sqrt(h)))
+
+
+# =========================
+# TESTO / MINHASH
+# =========================
+def normalize_text(text: str | None) -> list[str]:
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [tok for tok in re.findall(r"[a-z0-9]+", text) if tok not in STOPWORDS]
+
+
+def char_shingles(tokens: list[str], k: int = 3) -> set[str]:
+    text = " ".join(tokens)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def word_shingles(tokens: list[str], k: int = 2) -> set[str]:
+    if len(tokens) < k:
+        return set(tokens)
+    return {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def stable_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        # Permutazioni (a*x + b) mod p deterministiche: firme confrontabili tra esecuzioni diverse.
+        params = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(f"{seed}:{i}".encode(), digest_size=16).digest()
+            a = int.from_bytes(digest[:8], "little") % (MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:], "little") % MERSENNE_PRIME
+            params.append((a, b))
+        self.params = params
+        self.num_perm = num_perm
+
+    def signature(self, shingles: set[str]) -> tuple[int, ...] | None:
+        if not shingles:
+            return None
+        hashes = [stable_hash(s) for s in shingles]
+        return tuple(min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in self.params)
+
+    @staticmethod
+    def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+# =========================
+# RECORD
+# =========================
+def journey_rows(path: Path) -> list[dict[str, Any]]:
+    journey = load_journey(path)
+    rows = []
+    for idx, ev in enumerate(journey["events"]):
+        rows.append({**ev, "id": f"journey[{idx}]"})
+    return rows
+
+
+def build_record(row: dict[str, Any], hasher: MinHasher, incoming: bool) -> dict[str, Any] | None:
+    coords = event_coords(row)
+    start, end = event_years(row)
+    if not coords or start is None or not row.get("id"):
+        return None
+    texts = {}
+    for lang in LANGS:
+        tr = (row.get("translations") or {}).get(lang) or {}
+        title_tokens = normalize_text(tr.get("title"))
+        sig = hasher.signature(char_shingles(title_tokens))
+        if sig is None:
+            continue
+        texts[lang] = {
+            "title": tr.get("title"),
+            "sig": sig,
+            "desc": word_shingles(normalize_text(tr.get("description"))),
+        }
+    if not texts:
+        return None
+    return {
+        "id": str(row["id"]),
+        "coords": coords,
+        "start": start,
+        "end": end,
+        "location": row.get("location"),
+        "texts": texts,
+        "incoming": incoming,
+    }
+
+
+def year_buckets(start: int, end: int, size: int) -> range:
+    return range(math.floor(start / size), math.floor(end / size) + 1)
+
+
+# =========================
+# MOTORE
+# =========================
+class DedupIndex:
+    def __init__(
+        self,
+        precision: int = 4,
+        max_km: float = 50.0,
+        year_bucket: int = 50,
+        year_tolerance: int = 5,
+        bands: int = 16,
+        num_perm: int = 64,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm deve essere multiplo di bands")
+        self.precision = precision
+        self.max_km = max_km
+        self.year_bucket = year_bucket
+        self.year_tolerance = year_tolerance
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.records: list[dict[str, Any]] = []
+        # (cella, bucket anni, lingua, banda, hash banda) -> indici dei record
+        self.buckets: dict[tuple, list[int]] = {}
+        self.lookups = 0
+
+    def band_keys(self, sig: tuple[int, ...]) -> Iterable[tuple[int, int]]:
+        r = self.rows_per_band
+        for band in range(self.bands):
+            yield band, hash(sig[band * r:(band + 1) * r])
+
+    def candidates(self, rec: dict[str, Any]) -> set[int]:
+        found: set[int] = set()
+        cells = geohash_neighbourhood(rec["coords"][0], rec["coords"][1], self.precision, self.max_km)
+        years = year_buckets(rec["start"] - self.year_tolerance, rec["end"] + self.year_tolerance, self.year_bucket)
+        for lang, text in rec["texts"].items():
+            keys = list(self.band_keys(text["sig"]))
+            for cell in cells:
+                for year in years:
+                    for band, band_hash in keys:
+                        self.lookups += 1
+                        found.update(self.buckets.get((cell, year, lang, band, band_hash), ()))
+        return found
+
+    def add(self, rec: dict[str, Any]) -> int:
+        idx = len(self.records)
+        self.records.append(rec)
+        cell = geohash_encode(rec["coords"][0], rec["coords"][1], self.precision)
+        for lang, text in rec["texts"].items():
+            for band, band_hash in self.band_keys(text["sig"]):
+                for year in year_buckets(rec["start"], rec["end"], self.year_bucket):
+                    self.buckets.setdefault((cell, year, lang, band, band_hash), []).append(idx)
+        return idx
+
+
+def compare(a: dict[str, Any], b: dict[str, Any], year_tolerance: int, max_km: float) -> dict[str, Any] | None:
+    if a["start"] > b["end"] + year_tolerance or b["start"] > a["end"] + year_tolerance:
+        return None
+    distance = haversine_km(a["coords"], b["coords"])
+    if distance > max_km:
+        return None
+    best = None
+    for lang in a["texts"].keys() & b["texts"].keys():
+        ta, tb = a["texts"][lang], b["texts"][lang]
+        title_sim = MinHasher.similarity(ta["sig"], tb["sig"])
+        desc_sim = jaccard(ta["desc"], tb["desc"]) if ta["desc"] and tb["desc"] else None
+        score = title_sim if desc_sim is None else 0.7 * title_sim + 0.3 * desc_sim
+        if best is None or score > best["score"]:
+            best = {"lang": lang, "title_sim": round(title_sim, 3), "description_sim": desc_sim, "score": score}
+    if best is None:
+        return None
+    if best["description_sim"] is not None:
+        best["description_sim"] = round(best["description_sim"], 3)
+    best["score"] = round(best["score"], 3)
+    best["distance_km"] = round(distance, 1)
+    return best
+
+
+def describe(rec: dict[str, Any], lang: str) -> dict[str, Any]:
+    return {
+        "id": rec["id"],
+        "title": rec["texts"][lang]["title"],
+        "years": [rec["start"], rec["end"]],
+        "location": rec["location"],
+        "lat": rec["coords"][0],
+        "lon": rec["coords"][1],
+    }
+
+
+def find_duplicates(
+    existing: Iterable[dict[str, Any]],
+    incoming: Iterable[dict[str, Any]] = (),
+    threshold: float = 0.5,
+    max_km: float = 50.0,
+    **index_options: Any,
+) -> dict[str, Any]:
+    # Senza incoming: duplicati interni al catalogo. Con incoming: solo coppie con almeno un evento nuovo
+    # (anche due eventi nuovi dello stesso journey).
+    index = DedupIndex(max_km=max_km, **index_options)
+    skipped = 0
+    pairs: list[dict[str, Any]] = []
+    compared = 0
+
+    def process(rows: Iterable[dict[str, Any]], is_incoming: bool, report: bool) -> None:
+        nonlocal skipped, compared
+        for row in rows:
+            rec = build_record(row, index.hasher, is_incoming)
+            if rec is None:
+                skipped += 1
+                continue
+            if report:
+                for other_idx in sorted(index.candidates(rec)):
+                    other = index.records[other_idx]
+                    compared += 1
+                    match = compare(other, rec, index.year_tolerance, max_km)
+                    if match and match["score"] >= threshold:
+                        lang = match.pop("lang")
+                        pairs.append({"a": describe(other, lang), "b": describe(rec, lang), "lang": lang, **match})
+            index.add(rec)
+
+    incoming = list(incoming)
+    only_incoming = bool(incoming)
+    process(existing, False, report=not only_incoming)
+    process(incoming, True, report=True)
+
+    pairs.sort(key=lambda p: (-p["score"], p["a"]["id"], p["b"]["id"]))
+    n = len(index.records)
+    return {
+        "version": 1,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "mode": "journey" if only_incoming else "snapshot",
+        "params": {
+            "threshold": threshold,
+            "max_km": max_km,
+            "precision": index.precision,
+            "year_bucket": index.year_bucket,
+            "year_tolerance": index.year_tolerance,
+            "bands": index.bands,
+            "num_perm": index.hasher.num_perm,
+        },
+        "events": n,
+        "skipped": skipped,
+        "all_pairs": n * (n - 1) // 2,
+        "compared": compared,
+        "lookups": index.lookups,
+        "candidates": pairs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot", default=str(DEFAULT_SNAPSHOT_PATH))
+    parser.add_argument("--journey", help="JSON del journey in ingresso: riporta solo i suoi possibili duplicati")
+    parser.add_argument("--no-snapshot", action="store_true", help="Con --journey: confronta solo gli eventi del journey tra loro")
+    parser.add_argument("--out", help="Scrive il report JSON anche su file")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Punteggio minimo (0-1)")
+    parser.add_argument("--max-km", type=float, default=50.0)
+    parser.add_argument("--precision", type=int, default=4, help="Precisione geohash (4 = celle di ~40x20 km)")
+    parser.add_argument("--year-bucket", type=int, default=50)
+    parser.add_argument("--year-tolerance", type=int, default=5)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--num-perm", type=int, default=64)
+    args = parser.parse_args()
+
+    incoming: list[dict[str, Any]] = []
+    if args.journey:
+        try:
+            incoming = journey_rows(Path(args.journey))
+        except JourneyValidationError as exc:
+            for err in exc.errors:
+                print(f"INVALID:{err}", file=sys.stderr)
+            return 2
+    existing: Iterable[dict[str, Any]] = () if args.journey and args.no_snapshot else load_snapshot(Path(args.snapshot))
+
+    report = find_duplicates(
+        existing,
+        incoming,
+        threshold=args.threshold,
+        max_km=args.max_km,
+        precision=args.precision,
+        year_bucket=args.year_bucket,
+        year_tolerance=args.year_tolerance,
+        bands=args.bands,
+        num_perm=args.num_perm,
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(text, encoding="utf-8")
+        summary = {k: report[k] for k in ("mode", "events", "skipped", "all_pairs", "compared")}
+        print(json.dumps({**summary, "candidates": len(report["candidates"]), "report": str(out)}, ensure_ascii=False))
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# FILE: backend/tools/events_snapshot.py
+#
+# USO:
+# python backend/tools/events_snapshot.py --out backend/data/events_snapshot.jsonl
+#
+# OUTPUT:
+# Un evento per riga (JSONL) con anni, luogo, coordinate, journey collegati, traduzioni e media
+# (cover e gallery da v_media_attachments_expanded, come il fallback Node di /api/events).
+# Gli altri tool in backend/tools leggono questo file con load_snapshot().
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_SNAPSHOT_PATH = BASE_DIR.parent / "data" / "events_snapshot.jsonl"
+PAGE_SIZE = 1000
+
+EVENT_COLUMNS = "id,era,year_from,year_to,exact_date,continent,country,location,latitude,longitude,event_types_id"
+TRANSLATION_COLUMNS = "event_id,lang,title,description,description_short,wikipedia_url"
+GROUP_LINK_COLUMNS = "event_id,group_event_id"
+GROUP_TRANSLATION_COLUMNS = "group_event_id,lang,title"
+MEDIA_COLUMNS = (
+    "id,media_id,event_id,role,title,caption,alt_text,is_primary,sort_order,storage_bucket,storage_path,"
+    "media_type,status,mime_type,original_filename,file_size_bytes,checksum_sha256,width,height,"
+    "duration_seconds,public_url,preview_url,source_url,credits,attachment_metadata,asset_metadata"
+)
+
+
+def rest_config() -> tuple[str, dict[str, str]]:
+    base_url = os.environ.get("SUPABASE_URL") or os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
+    service_role = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not base_url or not service_role:
+        raise SystemExit("Servono SUPABASE_URL (o NEXT_PUBLIC_SUPABASE_URL) e SUPABASE_SERVICE_ROLE_KEY")
+    headers = {
+        "apikey": service_role,
+        "Authorization": f"Bearer {service_role}",
+        "Content-Type": "application/json",
+        "Prefer": "count=exact",
+    }
+    return f"{base_url}/rest/v1", headers
+
+
+def fetch_table(table: str, select: str, filters: dict[str, str] | None = None) -> list[dict[str, Any]]:
+    import requests
+
+    rest_url, headers = rest_config()
+    rows: list[dict[str, Any]] = []
+    offset = 0
+    while True:
+        range_header = {"Range": f"{offset}-{offset + PAGE_SIZE - 1}"}
+        resp = requests.get(
+            f"{rest_url}/{table}",
+            params={"select": select, **(filters or {})},
+            headers={**headers, **range_header},
+            timeout=30,
+        )
+        resp.raise_for_status()
+        rows.extend(resp.json())
+        total = int(resp.headers.get("Content-Range", "0-0/0").split("/")[-1])
+        offset += PAGE_SIZE
+        if offset >= total:
+            break
+    return rows
+
+
+def shape_attachment(row: dict[str, Any]) -> dict[str, Any]:
+    # Stessa forma di shapeAttachment in backend/index.js.
+    shaped = {key: row.get(key) for key in MEDIA_COLUMNS.split(",") if key not in ("id", "event_id")}
+    shaped["attachment_id"] = row.get("id")
+    shaped["is_primary"] = bool(row.get("is_primary"))
+    shaped["sort_order"] = row.get("sort_order") if isinstance(row.get("sort_order"), int) else 0
+    shaped["attachment_metadata"] = row.get("attachment_metadata") or {}
+    shaped["asset_metadata"] = row.get("asset_metadata") or {}
+    return shaped
+
+
+def media_by_event(rows: Iterable[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    # Cover: is_primary prima, poi sort_order più basso; gallery: tutti gli altri ruoli, per sort_order.
+    media: dict[str, dict[str, Any]] = {}
+    for row in rows:
+        if not row.get("event_id"):
+            continue
+        entry = media.setdefault(row["event_id"], {"cover": None, "gallery": []})
+        shaped = shape_attachment(row)
+        if row.get("role") == "cover":
+            cover = entry["cover"]
+            rank = (not shaped["is_primary"], shaped["sort_order"])
+            if cover is None or rank < (not cover["is_primary"], cover["sort_order"]):
+                entry["cover"] = shaped
+        else:
+            entry["gallery"].append(shaped)
+    for entry in media.values():
+        entry["gallery"].sort(key=lambda item: (item["sort_order"], not item["is_primary"]))
+    return media
+
+
+def legacy_covers() -> dict[str, str]:
+    # events_list.image_url esiste solo sui database non ancora migrati ai media (vedi 20251007_add_media_assets.sql).
+    import requests
+
+    try:
+        rows = fetch_table("events_list", "id,image_url", {"image_url": "not.is.null"})
+    except requests.HTTPError:
+        return {}
+    return {row["id"]: row["image_url"] for row in rows if row.get("image_url")}
+
+
+def build_snapshot() -> list[dict[str, Any]]:
+    events = fetch_table("events_list", EVENT_COLUMNS)
+    translations = fetch_table("event_translations", TRANSLATION_COLUMNS)
+    links = fetch_table("event_group_event", GROUP_LINK_COLUMNS)
+    group_translations = fetch_table("group_event_translations", GROUP_TRANSLATION_COLUMNS)
+    media = media_by_event(fetch_table("v_media_attachments_expanded", MEDIA_COLUMNS, {"event_id": "not.is.null"}))
+    covers = legacy_covers()
+
+    tr_by_event: dict[str, dict[str, dict[str, Any]]] = {}
+    for tr in translations:
+        lang = str(tr.get("lang") or "").strip().lower()
+        if not lang or not tr.get("event_id"):
+            continue
+        tr_by_event.setdefault(tr["event_id"], {})[lang] = {
+            "title": tr.get("title"),
+            "description": tr.get("description"),
+            "description_short": tr.get("description_short"),
+            "wikipedia_url": tr.get("wikipedia_url"),
+        }
+
+    group_titles: dict[str, dict[str, str]] = {}
+    for tr in group_translations:
+        lang = str(tr.get("lang") or "").strip().lower()
+        if lang and tr.get("group_event_id") and tr.get("title"):
+            group_titles.setdefault(tr["group_event_id"], {})[lang] = tr["title"]
+
+    groups_by_event: dict[str, list[str]] = {}
+    for link in links:
+        if link.get("event_id") and link.get("group_event_id"):
+            groups_by_event.setdefault(link["event_id"], []).append(link["group_event_id"])
+
+    rows: list[dict[str, Any]] = []
+    for ev in events:
+        group_ids = sorted(set(groups_by_event.get(ev["id"], [])))
+        rows.append(
+            {
+                **ev,
+                "groups": [{"id": gid, "titles": group_titles.get(gid, {})} for gid in group_ids],
+                "translations": tr_by_event.get(ev["id"], {}),
+                "image_url": covers.get(ev["id"]),
+                "media": media.get(ev["id"], {"cover": None, "gallery": []}),
+            }
+        )
+    return rows
+
+
+def write_snapshot(rows: Iterable[dict[str, Any]], path: Path) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+            count += 1
+    tmp_path.replace(path)
+    return count
+
+
+def load_snapshot(path: Path) -> Iterator[dict[str, Any]]:
+    if not path.exists():
+        raise FileNotFoundError(f"Snapshot mancante: {path}")
+    if path.suffix == ".json":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        yield from (data.get("rows", []) if isinstance(data, dict) else data)
+        return
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def is_bc(era: str | None) -> bool:
+    if not era:
+        return False
+    return str(era).strip().upper() in {"BC", "BCE"}
+
+
+def event_years(row: dict[str, Any]) -> tuple[int | None, int | None]:
+    # Anni con segno (BC negativi) e sempre start <= end.
+    year_from = row.get("year_from")
+    year_to = row.get("year_to")
+    if year_from is None and row.get("exact_date"):
+        try:
+            year_from = int(str(row["exact_date"])[:4])
+        except ValueError:
+            year_from = None
+    if year_from is None and year_to is None:
+        return None, None
+    if year_from is None:
+        year_from = year_to
+    if year_to is None:
+        year_to = year_from
+    sign = -1 if is_bc(row.get("era")) else 1
+    a, b = sign * int(year_from), sign * int(year_to)
+    return min(a, b), max(a, b)
+
+
+def event_coords(row: dict[str, Any]) -> tuple[float, float] | None:
+    lat, lon = row.get("latitude"), row.get("longitude")
+    if lat is None or lon is None:
+        return None
+    try:
+        lat_f, lon_f = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat_f <= 90.0 and -180.0 <= lon_f <= 180.0):
+        return None
+    return lat_f, lon_f
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default=str(DEFAULT_SNAPSHOT_PATH))
+    args = parser.parse_args()
+
+    rows = build_snapshot()
+    count = write_snapshot(rows, Path(args.out))
+    print(json.dumps({"events": count, "snapshot": str(Path(args.out))}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+# FILE: backend/tools/export_xlsx.py
+#
+# USO:
+# python backend/tools/export_xlsx.py frontend/PROMPT/OUTPUT_PROMPT_2.json _tmp_meso.xlsx --out journeys.xlsx
+# python backend/tools/export_xlsx.py --snapshot backend/data/events_snapshot.jsonl --out catalogo.xlsx
+# python backend/tools/export_xlsx.py journey_result.json --layout import --out journey_import.xlsx
+#
+# Esporta journey in XLSX senza tenere il workbook in memoria (openpyxl write_only: ogni foglio va su un
+# file temporaneo riga per riga). Ingressi accettati, anche mescolati:
+# - JSON di new_journey.py (JSON_RESULT del PROMPT 3, OUTPUT_PROMPT_2.json o log completo);
+# - XLSX nel formato del builder (_tmp_meso.xlsx: fogli "Journey" ed "Events") o un export di questo script;
+# - snapshot JSONL degli eventi (--snapshot): un journey per gruppo, letto con due passate per offset.
+# Layout "sheets" (default): foglio indice "Journeys" e un foglio per journey con le colonne del PROMPT 3.
+# Layout "import": fogli "Journey" ed "Events" come _tmp_meso.xlsx, reimportabili dal builder (un solo journey).
+
+import argparse
+import json
+import re
+import sys
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+try:
+    import resource
+except ImportError:  # Windows: niente picco di memoria nel riepilogo
+    resource = None
+
+from events_snapshot import event_years, is_bc
+from journey_json import EXCEL_EVENT_KEYS, EXCEL_JOURNEY_KEYS, read_journey_file
+
+JOURNEY_HEADERS = list(EXCEL_JOURNEY_KEYS)
+EVENT_HEADERS = [
+    "Journey IT",
+    "Journey EN",
+    "Era",
+    "From",
+    "To",
+    "Event date",
+    "Continent",
+    "Country",
+    "Location",
+    "Lat",
+    "Lon",
+    "Titolo evento IT",
+    "Wikipedia URL evento IT",
+    "Descrizione evento IT",
+    "Title event EN",
+    "Wikipedia URL event EN",
+    "Description event EN",
+    "Type events",
+    "Journey approfondimento 1",
+    "Journey approfondimento 2",
+    "Journey approfondimento 3",
+]
+INDEX_HEADERS = ["Sheet", *JOURNEY_HEADERS, "Events"]
+INDEX_SHEET = "Journeys"
+# Righe dati per foglio: il limite di Excel è 1.048.576 righe, intestazione compresa.
+MAX_SHEET_ROWS = 1_048_575
+SHEET_NAME_MAX = 31
+INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+# Separatore dei fogli di un journey nella colonna Sheet dell'indice: "/" non può comparire nel nome di un foglio.
+SHEET_SEPARATOR = " / "
+PROMPT2_TO_EXCEL = {key: header for header, key in EXCEL_EVENT_KEYS.items()}
+
+
+def header_key(header: Any) -> str:
+    # Come normalizeHeader del builder, più il suffisso tra parentesi del template ("Era (AD|BC)" -> "era").
+    text = str(header or "").replace("\u00a0", " ").split("(")[0]
+    return re.sub(r"\s+", " ", re.sub(r"[_-]+", " ", text.lower())).strip()
+
+
+HEADER_BY_KEY = {header_key(header): header for header in EVENT_HEADERS + JOURNEY_HEADERS}
+HEADER_BY_KEY["type event"] = "Type events"
+
+
+def canonical_row(headers: list[str | None], values: Iterable[Any]) -> dict[str, Any]:
+    return {header: value for header, value in zip(headers, values) if header}
+
+
+# =========================
+# INGRESSI
+# =========================
+def journey_meta(row: dict[str, Any]) -> dict[str, Any]:
+    return {header: row.get(header) for header in JOURNEY_HEADERS}
+
+
+def journeys_from_json(path: Path) -> Iterator[tuple[dict[str, Any], Iterator[dict[str, Any]]]]:
+    payload = read_journey_file(path)
+    if isinstance(payload.get("journey"), list):
+        meta = journey_meta(payload["journey"][0] if payload["journey"] else {})
+        events = payload.get("events") or []
+    else:
+        meta = {header: payload.get(key) for header, key in EXCEL_JOURNEY_KEYS.items()}
+        events = [{PROMPT2_TO_EXCEL[key]: value for key, value in ev.items() if key in PROMPT2_TO_EXCEL} for ev in payload.get("events") or []]
+
+    def rows() -> Iterator[dict[str, Any]]:
+        for ev in events:
+            yield {"Journey IT": meta["Titolo IT"], "Journey EN": meta["Title EN"], **ev}
+
+    yield meta, rows()
+
+
+def sheet_rows(ws) -> Iterator[dict[str, Any]]:
+    rows = ws.iter_rows(values_only=True)
+    header_row = next(rows, None) or ()
+    headers = [HEADER_BY_KEY.get(header_key(cell)) for cell in header_row]
+    for values in rows:
+        if any(value not in (None, "") for value in values):
+            yield canonical_row(headers, values)
+
+
+def journeys_from_xlsx(path: Path) -> Iterator[tuple[dict[str, Any], Iterator[dict[str, Any]]]]:
+    from openpyxl import load_workbook
+
+    # read_only: le righe vengono lette dal file XML man mano, senza caricare i fogli.
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = {name.strip().lower(): name for name in wb.sheetnames}
+        if "journey" in sheets and "events" in sheets:
+            meta = journey_meta(next(sheet_rows(wb[sheets["journey"]]), {}))
+            yield meta, sheet_rows(wb[sheets["events"]])
+        elif INDEX_SHEET.lower() in sheets:
+            for entry in list(sheet_rows_raw(wb[sheets[INDEX_SHEET.lower()]])):
+                # Un journey oltre il limite di righe continua su più fogli: torna un journey solo.
+                names = index_sheet_names(path, entry.get("Sheet"), wb.sheetnames)
+                yield journey_meta(entry), chain.from_iterable(sheet_rows(wb[name]) for name in names)
+        else:
+            raise ValueError(f"{path}: servono i fogli Journey ed Events (formato builder) o {INDEX_SHEET}")
+    finally:
+        wb.close()
+
+
+def index_sheet_names(path: Path, cell: Any, sheetnames: list[str]) -> list[str]:
+    text = str(cell or "").strip()
+    names = [name.strip() for name in text.split(SHEET_SEPARATOR.strip())]
+    if text and not all(name in sheetnames for name in names):
+        # Export precedenti separavano con ", " (ambiguo con titoli che contengono una virgola).
+        legacy = text.split(", ")
+        names = legacy if all(name in sheetnames for name in legacy) else names
+    missing = [name for name in names if name not in sheetnames]
+    if not text or missing:
+        raise ValueError(f"{path}: il foglio {INDEX_SHEET} cita fogli inesistenti: {missing or [text]}")
+    return names
+
+
+def sheet_rows_raw(ws) -> Iterator[dict[str, Any]]:
+    rows = ws.iter_rows(values_only=True)
+    headers = [str(cell).strip() if cell is not None else None for cell in next(rows, None) or ()]
+    for values in rows:
+        yield canonical_row(headers, values)
+
+
+def format_coord(value: Any) -> str | None:
+    # Regola 8.3/8.5 del PROMPT 3: testo con il punto decimale, al massimo 6 decimali.
+    if value is None or value == "":
+        return None
+    return f"{float(value):.6f}".rstrip("0").rstrip(".")
+
+
+def snapshot_event_row(row: dict[str, Any], journey: dict[str, Any]) -> dict[str, Any]:
+    translations = row.get("translations") or {}
+    it, en = translations.get("it") or {}, translations.get("en") or {}
+    year_from, year_to = event_years(row)
+    exact = row.get("exact_date")
+    return {
+        "Journey IT": journey["Titolo IT"],
+        "Journey EN": journey["Title EN"],
+        "Era": "BC" if is_bc(row.get("era")) else "AD",
+        "From": abs(year_from) if year_from is not None else None,
+        "To": abs(year_to) if year_to is not None else None,
+        "Event date": f"{exact[8:10]}/{exact[5:7]}/{exact[:4]}" if exact and len(str(exact)) >= 10 else None,
+        "Continent": row.get("continent"),
+        "Country": row.get("country"),
+        "Location": row.get("location"),
+        "Lat": format_coord(row.get("latitude")),
+        "Lon": format_coord(row.get("longitude")),
+        "Titolo evento IT": it.get("title"),
+        "Wikipedia URL evento IT": it.get("wikipedia_url"),
+        "Descrizione evento IT": it.get("description"),
+        "Title event EN": en.get("title"),
+        "Wikipedia URL event EN": en.get("wikipedia_url"),
+        "Description event EN": en.get("description"),
+        "Type events": row.get("event_types_id") or row.get("type_code"),
+    }
+
+
+def journeys_from_snapshot(path: Path, group_ids: set[str] | None = None) -> Iterator[tuple[dict[str, Any], Iterator[dict[str, Any]]]]:
+    # Prima passata: solo offset di riga e titoli per gruppo, così la memoria non cresce con le descrizioni.
+    offsets: dict[str, list[int]] = {}
+    titles: dict[str, dict[str, str]] = {}
+    with path.open("rb") as fh:
+        while True:
+            offset = fh.tell()
+            line = fh.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            for group in row.get("groups") or [{"id": None, "titles": {}}]:
+                gid = group.get("id") or ""
+                if group_ids and gid not in group_ids:
+                    continue
+                offsets.setdefault(gid, []).append(offset)
+                titles.setdefault(gid, group.get("titles") or {})
+
+    def rows(gid: str, meta: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        with path.open("rb") as fh:
+            for offset in offsets[gid]:
+                fh.seek(offset)
+                yield snapshot_event_row(json.loads(fh.readline()), meta)
+
+    ordered = sorted(offsets, key=lambda gid: (gid == "", (titles[gid].get("it") or titles[gid].get("en") or "").lower(), gid))
+    for gid in ordered:
+        group_titles = titles[gid]
+        meta = {
+            "Titolo IT": group_titles.get("it") or group_titles.get("en") or ("Senza journey" if not gid else gid),
+            "Descrizione IT": None,
+            "Title EN": group_titles.get("en") or group_titles.get("it") or ("No journey" if not gid else gid),
+            "Description EN": None,
+        }
+        yield meta, rows(gid, meta)
+
+
+# =========================
+# SCRITTURA
+# =========================
+def sheet_name(title: str | None, used: set[str]) -> str:
+    base = INVALID_SHEET_CHARS.sub(" ", str(title or "Journey")).strip().strip("'") or "Journey"
+    base = base[:SHEET_NAME_MAX].strip()
+    name, n = base, 2
+    while name.lower() in used:
+        suffix = f" ({n})"
+        name = base[: SHEET_NAME_MAX - len(suffix)].rstrip() + suffix
+        n += 1
+    used.add(name.lower())
+    return name
+
+
+def new_sheet(wb, name: str, headers: list[str]):
+    ws = wb.create_sheet(name)
+    ws.freeze_panes = "A2"
+    ws.append(headers)
+    return ws
+
+
+def event_values(row: dict[str, Any]) -> list[Any]:
+    return [row.get(header) for header in EVENT_HEADERS]
+
+
+def export(
+    sources: Iterable[tuple[dict[str, Any], Iterator[dict[str, Any]]]],
+    out_path: Path,
+    layout: str = "sheets",
+    max_sheet_rows: int = MAX_SHEET_ROWS,
+) -> dict[str, Any]:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    try:
+        stats = {"journeys": 0, "events": 0, "sheets": 0}
+        if layout == "import":
+            journeys = iter(sources)
+            meta, events = next(journeys, (None, None))
+            if meta is None:
+                raise ValueError("nessun journey in ingresso")
+            new_sheet(wb, "Journey", JOURNEY_HEADERS).append([meta.get(header) for header in JOURNEY_HEADERS])
+            ws = new_sheet(wb, "Events", EVENT_HEADERS)
+            # Gli eventi vanno letti prima di chiedere il journey successivo: un XLSX in ingresso si chiude a fine generatore.
+            for row in events:
+                ws.append(event_values(row))
+                stats["events"] += 1
+            if next(journeys, None) is not None:
+                raise ValueError("il layout import contiene un solo journey: usare --layout sheets")
+            stats.update(journeys=1, sheets=2)
+        else:
+            # In write_only i fogli scrivono su file separati: l'indice può crescere mentre si scrivono i journey.
+            index = new_sheet(wb, INDEX_SHEET, INDEX_HEADERS)
+            used = {INDEX_SHEET.lower()}
+            for meta, events in sources:
+                names = [sheet_name(meta.get("Titolo IT") or meta.get("Title EN"), used)]
+                ws = new_sheet(wb, names[0], EVENT_HEADERS)
+                count = rows_in_sheet = 0
+                for row in events:
+                    if rows_in_sheet >= max_sheet_rows:
+                        names.append(sheet_name(names[0], used))
+                        ws = new_sheet(wb, names[-1], EVENT_HEADERS)
+                        rows_in_sheet = 0
+                    ws.append(event_values(row))
+                    count += 1
+                    rows_in_sheet += 1
+                index.append([SHEET_SEPARATOR.join(names), *(meta.get(header) for header in JOURNEY_HEADERS), count])
+                stats["journeys"] += 1
+                stats["events"] += count
+                stats["sheets"] += len(names)
+            stats["sheets"] += 1
+    except Exception:
+        # Chiude i file temporanei dei fogli già aperti prima di propagare l'errore.
+        for ws in wb.worksheets:
+            ws.close()
+        raise
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    wb.save(tmp_path)
+    tmp_path.replace(out_path)
+    return stats
+
+
+def sources_from_args(inputs: list[str], snapshot: str | None, groups: list[str]) -> Iterator[tuple[dict[str, Any], Iterator[dict[str, Any]]]]:
+    for item in inputs:
+        path = Path(item)
+        if path.suffix.lower() in (".xlsx", ".xlsm"):
+            yield from journeys_from_xlsx(path)
+        else:
+            yield from journeys_from_json(path)
+    if snapshot:
+        yield from journeys_from_snapshot(Path(snapshot), set(groups) or None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputs", nargs="*", help="JSON di new_journey.py o XLSX nel formato del builder")
+    parser.add_argument("--snapshot", help="Snapshot JSONL: un foglio per journey (gruppo)")
+    parser.add_argument("--group", action="append", default=[], help="Solo questi group_event_id dello snapshot")
+    parser.add_argument("--layout", choices=["sheets", "import"], default="sheets")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    if not args.inputs and not args.snapshot:
+        parser.error("servono file in ingresso o --snapshot")
+
+    started = time.perf_counter()
+    try:
+        stats = export(sources_from_args(args.inputs, args.snapshot, args.group), Path(args.out), args.layout)
+    except ValueError as exc:
+        print(f"EXPORT_ERROR:{exc}", file=sys.stderr)
+        return 2
+    stats["out"] = args.out
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    if resource is not None:
+        # ru_maxrss è in KB su Linux.
+        stats["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(stats, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
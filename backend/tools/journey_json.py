@@ -0,0 +1,216 @@
+# FILE: backend/tools/journey_json.py
+#
+# Lettura e validazione dei JSON prodotti da frontend/PROMPT/new_journey.py:
+# - output PROMPT 3 / JSON_RESULT ({"journey": [...], "events": [...]} con le colonne Excel)
+# - output PROMPT 2 / OUTPUT_PROMPT_2.json (chiavi titolo_evento_it, descrizione_evento_it, ...)
+# - log completo dello script (viene usata l'ultima riga JSON_RESULT:)
+#
+# normalize_journey() restituisce sempre la stessa struttura, usata da loader, dedup ed export.
+
+import json
+import re
+from datetime import date
+from pathlib import Path
+from typing import Any
+
+EVENT_TYPES = {
+    "colonialism",
+    "culture_society",
+    "demographics",
+    "diplomacy",
+    "economy",
+    "environment",
+    "exploration_expansion",
+    "health",
+    "humanrights",
+    "independence_reform",
+    "law_justice",
+    "other",
+    "politics",
+    "revolts",
+    "science_technology",
+    "treaties_agreements",
+    "war_conflict",
+}
+ERAS = {"AD", "BC"}
+LANGS = ("it", "en")
+
+# Colonne PROMPT 3 / Excel -> chiavi PROMPT 2
+EXCEL_EVENT_KEYS = {
+    "Era": "era",
+    "From": "from",
+    "To": "to",
+    "Event date": "event_date",
+    "Continent": "continent",
+    "Country": "country",
+    "Location": "location",
+    "Lat": "lat",
+    "Lon": "lon",
+    "Titolo evento IT": "titolo_evento_it",
+    "Wikipedia URL evento IT": "wikipedia_url_it",
+    "Descrizione evento IT": "descrizione_evento_it",
+    "Title event EN": "title_event_en",
+    "Wikipedia URL event EN": "wikipedia_url_en",
+    "Description event EN": "description_event_en",
+    "Type events": "type_event",
+}
+EXCEL_JOURNEY_KEYS = {
+    "Titolo IT": "journey_title_it",
+    "Descrizione IT": "journey_description_it",
+    "Title EN": "journey_title_en",
+    "Description EN": "journey_description_en",
+}
+
+
+class JourneyValidationError(ValueError):
+    def __init__(self, errors: list[str]):
+        super().__init__("; ".join(errors[:20]) + (f" (+{len(errors) - 20})" if len(errors) > 20 else ""))
+        self.errors = errors
+
+
+def read_journey_file(path: Path) -> dict[str, Any]:
+    text = path.read_text(encoding="utf-8")
+    marker = "JSON_RESULT:"
+    idx = text.rfind(marker)
+    if idx != -1:
+        text = text[idx + len(marker):].strip().splitlines()[0]
+    return json.loads(text)
+
+
+def clean(value: Any) -> str | None:
+    if value is None:
+        return None
+    text = str(value).replace("\u00a0", " ").strip()
+    return text or None
+
+
+def parse_year(value: Any) -> int | None:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.search(r"-?\d{1,5}", str(value))
+    return int(match.group(0)) if match else None
+
+
+def parse_coord(value: Any) -> float | None:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if "," in text:
+        # Regola 8.4 del PROMPT 3: la virgola decimale non è ammessa.
+        raise ValueError(f"virgola decimale non ammessa: {text!r}")
+    return float(text)
+
+
+def parse_event_date(value: Any) -> str | None:
+    text = clean(value)
+    if not text:
+        return None
+    match = re.fullmatch(r"(\d{1,2})[/-](\d{1,2})[/-](\d{4})", text)
+    if match:
+        day, month, year = (int(g) for g in match.groups())
+        return date(year, month, day).isoformat()
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", text[:10]):
+        return date.fromisoformat(text[:10]).isoformat()
+    raise ValueError(f"data non valida: {text!r}")
+
+
+def to_prompt2_shape(payload: dict[str, Any]) -> dict[str, Any]:
+    if isinstance(payload.get("journey"), list):
+        journey_row = payload["journey"][0] if payload["journey"] else {}
+        shaped = {EXCEL_JOURNEY_KEYS[k]: v for k, v in journey_row.items() if k in EXCEL_JOURNEY_KEYS}
+        shaped["events"] = [
+            {EXCEL_EVENT_KEYS[k]: v for k, v in ev.items() if k in EXCEL_EVENT_KEYS}
+            for ev in payload.get("events") or []
+        ]
+        return shaped
+    return payload
+
+
+def normalize_journey(payload: dict[str, Any]) -> dict[str, Any]:
+    data = to_prompt2_shape(payload)
+    errors: list[str] = []
+    journey = {
+        "title": {"it": clean(data.get("journey_title_it")), "en": clean(data.get("journey_title_en"))},
+        "description": {"it": clean(data.get("journey_description_it")), "en": clean(data.get("journey_description_en"))},
+        "events": [],
+    }
+    if not journey["title"]["it"] and not journey["title"]["en"]:
+        errors.append("journey: titolo mancante")
+    events = data.get("events")
+    if not isinstance(events, list) or not events:
+        errors.append("events: lista vuota o mancante")
+        raise JourneyValidationError(errors)
+
+    for idx, ev in enumerate(events):
+        where = f"events[{idx}]"
+        if not isinstance(ev, dict):
+            errors.append(f"{where}: non è un oggetto")
+            continue
+        era = (clean(ev.get("era")) or "AD").upper()
+        if era not in ERAS:
+            errors.append(f"{where}.era: {era!r} non ammessa")
+        year_from = parse_year(ev.get("from"))
+        year_to = parse_year(ev.get("to"))
+        if year_from is None:
+            errors.append(f"{where}.from: anno mancante")
+        if year_to is None:
+            year_to = year_from
+        try:
+            lat = parse_coord(ev.get("lat"))
+            lon = parse_coord(ev.get("lon"))
+        except ValueError as exc:
+            errors.append(f"{where}.lat/lon: {exc}")
+            lat = lon = None
+        if lat is not None and not -90.0 <= lat <= 90.0:
+            errors.append(f"{where}.lat: fuori intervallo ({lat})")
+        if lon is not None and not -180.0 <= lon <= 180.0:
+            errors.append(f"{where}.lon: fuori intervallo ({lon})")
+        try:
+            exact_date = parse_event_date(ev.get("event_date"))
+        except ValueError as exc:
+            errors.append(f"{where}.event_date: {exc}")
+            exact_date = None
+        type_code = clean(ev.get("type_event")) or "other"
+        if type_code not in EVENT_TYPES:
+            errors.append(f"{where}.type_event: {type_code!r} non ammesso")
+        translations = {
+            "it": {
+                "title": clean(ev.get("titolo_evento_it")),
+                "description": clean(ev.get("descrizione_evento_it")),
+                "wikipedia_url": clean(ev.get("wikipedia_url_it")),
+            },
+            "en": {
+                "title": clean(ev.get("title_event_en")),
+                "description": clean(ev.get("description_event_en")),
+                "wikipedia_url": clean(ev.get("wikipedia_url_en")),
+            },
+        }
+        translations = {lang: tr for lang, tr in translations.items() if tr["title"]}
+        if not translations:
+            errors.append(f"{where}: nessun titolo (IT/EN)")
+        journey["events"].append(
+            {
+                "era": era,
+                "year_from": year_from,
+                "year_to": year_to,
+                "exact_date": exact_date,
+                "continent": clean(ev.get("continent")),
+                "country": clean(ev.get("country")),
+                "location": clean(ev.get("location")),
+                "latitude": lat,
+                "longitude": lon,
+                "type_code": type_code,
+                "translations": translations,
+            }
+        )
+    if errors:
+        raise JourneyValidationError(errors)
+    return journey
+
+
+def load_journey(path: Path) -> dict[str, Any]:
+    return normalize_journey(read_journey_file(path))
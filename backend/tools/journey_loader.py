@@ -0,0 +1,234 @@
+# FILE: backend/tools/journey_loader.py
+#
+# USO:
+# python backend/tools/journey_loader.py frontend/PROMPT/OUTPUT_PROMPT_2.json --dry-run
+# python backend/tools/journey_loader.py journey_result.json --owner-profile-id <uuid>
+# python backend/tools/journey_loader.py journey_result.json --group-event-id <uuid>
+#
+# Valida il JSON del journey e scrive group_events, group_event_translations, events_list,
+# event_group_event, event_translations ed event_type_map in UNA transazione:
+# COPY verso tabelle temporanee di staging, poi un unico script di merge set-based.
+
+import argparse
+import json
+import sys
+import uuid
+from pathlib import Path
+from typing import Any
+
+from journey_json import JourneyValidationError, LANGS, load_journey
+
+STAGING_DDL = """
+create temp table stg_journey (
+  group_event_id uuid not null,
+  is_new boolean not null,
+  visibility text,
+  workflow_state text,
+  owner_profile_id uuid,
+  title_it text,
+  description_it text,
+  title_en text,
+  description_en text
+) on commit drop;
+
+create temp table stg_events (
+  seq integer not null,
+  id uuid not null,
+  era text,
+  year_from integer,
+  year_to integer,
+  exact_date date,
+  continent text,
+  country text,
+  location text,
+  latitude double precision,
+  longitude double precision,
+  type_code text
+) on commit drop;
+
+create temp table stg_event_translations (
+  event_id uuid not null,
+  lang text not null,
+  title text,
+  description text,
+  wikipedia_url text
+) on commit drop;
+"""
+
+MERGE_SQL = """
+insert into group_events (id, visibility, workflow_state, owner_profile_id, created_at, updated_at)
+select group_event_id, visibility, workflow_state, owner_profile_id, now(), now()
+from stg_journey
+where is_new;
+
+insert into group_event_translations (group_event_id, lang, title, description)
+select j.group_event_id, t.lang, t.title, t.description
+from stg_journey j
+cross join lateral (
+  values ('it', j.title_it, j.description_it), ('en', j.title_en, j.description_en)
+) as t(lang, title, description)
+where j.is_new
+  and t.title is not null
+on conflict (group_event_id, lang) do nothing;
+
+insert into events_list (
+  id, era, year_from, year_to, exact_date, continent, country, location,
+  latitude, longitude, event_types_id, created_at
+)
+select
+  id, era, year_from, year_to, exact_date, continent, country, location,
+  latitude, longitude, type_code, now()
+from stg_events
+order by seq;
+
+insert into event_group_event (event_id, group_event_id, created_at)
+select e.id, j.group_event_id, now()
+from stg_events e
+cross join stg_journey j;
+
+insert into event_translations (event_id, lang, title, description, description_short, wikipedia_url, created_at, updated_at)
+select event_id, lang, title, coalesce(description, ''), '', wikipedia_url, now(), now()
+from stg_event_translations
+on conflict (event_id, lang) do update
+  set title = excluded.title,
+      description = excluded.description,
+      wikipedia_url = excluded.wikipedia_url,
+      updated_at = now();
+
+insert into event_type_map (event_id, type_code)
+select id, type_code
+from stg_events
+where type_code is not null;
+
+select
+  (select group_event_id from stg_journey) as group_event_id,
+  (select count(*) from stg_events) as events,
+  (select count(*) from stg_event_translations) as translations;
+"""
+
+JOURNEY_COLUMNS = (
+    "group_event_id",
+    "is_new",
+    "visibility",
+    "workflow_state",
+    "owner_profile_id",
+    "title_it",
+    "description_it",
+    "title_en",
+    "description_en",
+)
+EVENT_COLUMNS = (
+    "seq",
+    "id",
+    "era",
+    "year_from",
+    "year_to",
+    "exact_date",
+    "continent",
+    "country",
+    "location",
+    "latitude",
+    "longitude",
+    "type_code",
+)
+TRANSLATION_COLUMNS = ("event_id", "lang", "title", "description", "wikipedia_url")
+
+
+def staging_rows(journey: dict[str, Any], group_event_id: str | None, owner_profile_id: str | None, visibility: str):
+    is_new = group_event_id is None
+    journey_row = (
+        group_event_id or str(uuid.uuid4()),
+        is_new,
+        visibility,
+        # Stesse regole di saveJourney: i privati sono pubblicati per il proprietario, gli altri restano in bozza.
+        "published" if visibility == "private" else "draft",
+        owner_profile_id,
+        journey["title"]["it"],
+        journey["description"]["it"],
+        journey["title"]["en"],
+        journey["description"]["en"],
+    )
+    event_rows = []
+    translation_rows = []
+    for seq, ev in enumerate(journey["events"]):
+        event_id = str(uuid.uuid4())
+        event_rows.append(
+            (
+                seq,
+                event_id,
+                ev["era"],
+                ev["year_from"],
+                ev["year_to"],
+                ev["exact_date"],
+                ev["continent"],
+                ev["country"],
+                ev["location"],
+                ev["latitude"],
+                ev["longitude"],
+                ev["type_code"],
+            )
+        )
+        for lang in LANGS:
+            tr = ev["translations"].get(lang)
+            if tr:
+                translation_rows.append((event_id, lang, tr["title"], tr["description"], tr["wikipedia_url"]))
+    return journey_row, event_rows, translation_rows
+
+
+def copy_rows(cur, table: str, columns: tuple[str, ...], rows: list[tuple]) -> None:
+    with cur.copy(f"copy {table} ({', '.join(columns)}) from stdin") as copy:
+        for row in rows:
+            copy.write_row(row)
+
+
+def load(journey: dict[str, Any], group_event_id: str | None, owner_profile_id: str | None, visibility: str) -> dict[str, Any]:
+    from db import connect
+
+    journey_row, event_rows, translation_rows = staging_rows(journey, group_event_id, owner_profile_id, visibility)
+    with connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(STAGING_DDL)
+            copy_rows(cur, "stg_journey", JOURNEY_COLUMNS, [journey_row])
+            copy_rows(cur, "stg_events", EVENT_COLUMNS, event_rows)
+            copy_rows(cur, "stg_event_translations", TRANSLATION_COLUMNS, translation_rows)
+            cur.execute(MERGE_SQL)
+            # Lo script di merge restituisce un risultato per statement: il riepilogo è l'ultimo.
+            while cur.nextset():
+                pass
+            result = cur.fetchone()
+        conn.commit()
+    return {
+        "group_event_id": str(result["group_event_id"]),
+        "events": result["events"],
+        "translations": result["translations"],
+        "new_group_event": group_event_id is None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("journey_json", help="JSON_RESULT, OUTPUT_PROMPT_2.json o log di new_journey.py")
+    parser.add_argument("--group-event-id", help="Aggiunge gli eventi a un journey esistente")
+    parser.add_argument("--owner-profile-id")
+    parser.add_argument("--visibility", default="private")
+    parser.add_argument("--dry-run", action="store_true", help="Valida senza scrivere sul DB")
+    args = parser.parse_args()
+
+    try:
+        journey = load_journey(Path(args.journey_json))
+    except JourneyValidationError as exc:
+        for err in exc.errors:
+            print(f"INVALID:{err}", file=sys.stderr)
+        return 2
+
+    if args.dry_run:
+        print(json.dumps({"valid": True, "events": len(journey["events"])}, ensure_ascii=False))
+        return 0
+
+    result = load(journey, args.group_event_id, args.owner_profile_id, args.visibility)
+    print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
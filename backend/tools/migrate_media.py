@@ -0,0 +1,555 @@
+# FILE: backend/tools/migrate_media.py
+#
+# USO:
+# python backend/tools/migrate_media.py --dry-run
+# python backend/tools/migrate_media.py --bucket media --concurrency 8 --thumb-workers 4
+# python backend/tools/migrate_media.py --local-dir /tmp/media --public-base http://localhost:8080/media
+#
+# Migra le immagini legacy (events_list.image_url, events_list.images, group_events.cover_url) nello storage
+# e in media_assets/media_attachments:
+# 1) download con un pool limitato di thread; lo SHA-256 è calcolato mentre il file arriva (streaming);
+# 2) il percorso nello storage deriva dall'hash (legacy/ab/abcd....jpg), quindi file identici da URL diversi
+#    finiscono sulla stessa riga di media_assets grazie all'indice unico (storage_bucket, storage_path);
+# 3) le miniature vengono generate in un pool di processi (Pillow, opzionale);
+# 4) asset e attachment vengono scritti a blocchi: COPY verso tabelle di staging e un merge set-based per blocco.
+# Lo stato di ogni URL è salvato in un file SQLite: rilanciando lo script si riparte da dove ci si era fermati.
+# Gli attachment creati da 20251007_migrate_legacy_media.sql (bucket 'legacy', path = URL) vengono sostituiti.
+
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote, unquote, urlparse
+
+try:
+    from PIL import Image
+except ImportError:  # le miniature sono opzionali
+    Image = None
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_STATE_PATH = BASE_DIR.parent / "data" / "media_migration.sqlite"
+CHUNK_SIZE = 64 * 1024
+MAX_BYTES = 50 * 1024 * 1024
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+USER_AGENT = "GeoHistoryMediaMigration/1.0"
+
+LEGACY_SQL = """
+select 'event' as entity_type, e.id as entity_id, 'cover' as role, 0 as sort_order, true as is_primary,
+       trim(e.image_url) as url, 'events_list.image_url' as source_column
+from events_list e
+where nullif(trim(e.image_url), '') is not null
+
+union all
+
+select 'event', e.id, 'gallery', (arr.ord - 1)::integer, arr.ord = 1, trim(arr.url), 'events_list.images'
+from events_list e
+cross join lateral jsonb_array_elements_text(
+  case when jsonb_typeof(e.images) = 'array' then e.images else '[]'::jsonb end
+) with ordinality as arr(url, ord)
+where nullif(trim(arr.url), '') is not null
+
+union all
+
+select 'group_event', g.id, 'cover', 0, true, trim(g.cover_url), 'group_events.cover_url'
+from group_events g
+where nullif(trim(g.cover_url), '') is not null
+"""
+
+STAGING_DDL = """
+create temp table stg_media (
+  url text not null,
+  storage_bucket text not null,
+  storage_path text not null,
+  media_type text not null,
+  mime_type text,
+  original_filename text,
+  file_size_bytes bigint,
+  checksum_sha256 text,
+  width integer,
+  height integer,
+  public_url text,
+  preview_url text
+) on commit drop;
+
+create temp table stg_media_refs (
+  entity_type text not null,
+  entity_id uuid not null,
+  role text not null,
+  sort_order integer not null,
+  is_primary boolean not null,
+  url text not null,
+  source_column text
+) on commit drop;
+"""
+
+MERGE_SQL = """
+insert into media_assets (
+  storage_bucket, storage_path, media_type, status, mime_type, original_filename, file_size_bytes,
+  checksum_sha256, width, height, public_url, preview_url, source_url, metadata
+)
+select distinct on (storage_bucket, storage_path)
+  storage_bucket, storage_path, media_type::media_asset_type, 'ready'::media_asset_status, mime_type,
+  original_filename, file_size_bytes, checksum_sha256, width, height, public_url, preview_url, url,
+  jsonb_build_object('imported_at', now(), 'imported_via', 'migrate_media.py')
+from stg_media
+order by storage_bucket, storage_path, url
+on conflict (storage_bucket, storage_path) do update
+  set preview_url = coalesce(excluded.preview_url, media_assets.preview_url),
+      width = coalesce(media_assets.width, excluded.width),
+      height = coalesce(media_assets.height, excluded.height),
+      status = 'ready'::media_asset_status,
+      metadata = media_assets.metadata || excluded.metadata;
+
+create temp table stg_resolved on commit drop as
+select r.*, a.id as media_id
+from stg_media_refs r
+join stg_media m on m.url = r.url
+join media_assets a on a.storage_bucket = m.storage_bucket and a.storage_path = m.storage_path;
+
+-- Segnaposto di 20251007_migrate_legacy_media.sql per lo stesso URL e slot: sostituiti dal nuovo asset.
+delete from media_attachments ma
+using stg_resolved r, media_assets legacy
+where legacy.id = ma.media_id
+  and legacy.storage_bucket = 'legacy'
+  and legacy.storage_path = r.url
+  and ma.entity_type = r.entity_type::media_attachment_entity
+  and ma.entity_id = r.entity_id
+  and ma.role = r.role::media_attachment_role;
+
+insert into media_attachments (media_id, entity_type, event_id, group_event_id, role, is_primary, sort_order, metadata)
+select
+  media_id,
+  entity_type::media_attachment_entity,
+  case when entity_type = 'event' then entity_id end,
+  case when entity_type = 'group_event' then entity_id end,
+  role::media_attachment_role,
+  is_primary,
+  sort_order,
+  jsonb_build_object('imported_from', source_column, 'imported_via', 'migrate_media.py', 'legacy_url', url)
+from stg_resolved
+on conflict do nothing;
+
+update media_assets a
+set status = 'archived'::media_asset_status
+where a.storage_bucket = 'legacy'
+  and a.storage_path in (select url from stg_media)
+  and not exists (select 1 from media_attachments ma where ma.media_id = a.id);
+
+select
+  (select count(*) from stg_media) as urls,
+  (select count(distinct (storage_bucket, storage_path)) from stg_media) as assets,
+  (select count(*) from stg_resolved) as attachments;
+"""
+
+MEDIA_COLUMNS = (
+    "url",
+    "storage_bucket",
+    "storage_path",
+    "media_type",
+    "mime_type",
+    "original_filename",
+    "file_size_bytes",
+    "checksum_sha256",
+    "width",
+    "height",
+    "public_url",
+    "preview_url",
+)
+REF_COLUMNS = ("entity_type", "entity_id", "role", "sort_order", "is_primary", "url", "source_column")
+
+
+# =========================
+# STATO (resume)
+# =========================
+def open_state(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS urls ("
+        " url TEXT PRIMARY KEY, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT,"
+        " sha256 TEXT, bytes INTEGER, mime TEXT, width INTEGER, height INTEGER,"
+        " storage_path TEXT, public_url TEXT, preview_url TEXT, updated REAL)"
+    )
+    return conn
+
+
+def save_state(conn: sqlite3.Connection, url: str, **fields: Any) -> None:
+    fields["updated"] = time.time()
+    columns = ", ".join(fields)
+    placeholders = ", ".join("?" for _ in fields)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+    conn.execute(
+        f"INSERT INTO urls (url, {columns}) VALUES (?, {placeholders}) ON CONFLICT(url) DO UPDATE SET {updates}",
+        (url, *fields.values()),
+    )
+
+
+# =========================
+# STORAGE
+# =========================
+class SupabaseStorage:
+    def __init__(self, bucket: str):
+        base_url = os.environ.get("SUPABASE_URL") or os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
+        key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not base_url or not key:
+            raise SystemExit("Servono SUPABASE_URL (o NEXT_PUBLIC_SUPABASE_URL) e SUPABASE_SERVICE_ROLE_KEY")
+        self.bucket = bucket
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"apikey": key, "Authorization": f"Bearer {key}", "x-upsert": "true"}
+
+    def upload(self, session, local_path: Path, storage_path: str, mime: str) -> None:
+        with local_path.open("rb") as fh:
+            resp = session.post(
+                f"{self.base_url}/storage/v1/object/{self.bucket}/{quote(storage_path)}",
+                data=fh,
+                headers={**self.headers, "Content-Type": mime},
+                timeout=120,
+            )
+        resp.raise_for_status()
+
+    def public_url(self, storage_path: str) -> str:
+        return f"{self.base_url}/storage/v1/object/public/{self.bucket}/{quote(storage_path)}"
+
+
+class LocalStorage:
+    """Copia su disco invece dello storage Supabase: prove in locale e migrazioni verso un altro CDN."""
+
+    def __init__(self, bucket: str, root: Path, public_base: str | None):
+        self.bucket = bucket
+        self.root = root
+        self.public_base = (public_base or root.resolve().as_uri()).rstrip("/")
+
+    def upload(self, session, local_path: Path, storage_path: str, mime: str) -> None:
+        target = self.root / storage_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(local_path, target)
+
+    def public_url(self, storage_path: str) -> str:
+        return f"{self.public_base}/{quote(storage_path)}"
+
+
+# =========================
+# DOWNLOAD / HASH / MINIATURE
+# =========================
+def media_type_for(mime: str) -> str:
+    kind = mime.split("/", 1)[0]
+    return kind if kind in {"image", "video", "audio"} else "document"
+
+
+def extension_for(url: str, mime: str) -> str:
+    ext = mimetypes.guess_extension(mime) if mime else None
+    if ext in (None, ".jpe"):
+        ext = Path(urlparse(url).path).suffix.lower() or ".bin"
+    return ".jpg" if ext in (".jpeg", ".jpe") else ext
+
+
+def fetch(session, url: str, work_dir: Path, retries: int) -> dict[str, Any]:
+    # Scarica su file temporaneo calcolando lo SHA-256 sui blocchi, senza tenere il file in memoria.
+    import requests
+
+    for attempt in range(retries + 1):
+        try:
+            with session.get(url, stream=True, timeout=(10, 60), headers={"User-Agent": USER_AGENT}) as resp:
+                if resp.status_code in RETRYABLE_STATUS and attempt < retries:
+                    raise RuntimeError(f"HTTP {resp.status_code}")
+                resp.raise_for_status()
+                mime = (resp.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+                if not mime or mime == "application/octet-stream":
+                    mime = mimetypes.guess_type(urlparse(url).path)[0] or "application/octet-stream"
+                digest = hashlib.sha256()
+                size = 0
+                fd, tmp_name = tempfile.mkstemp(dir=work_dir)
+                with os.fdopen(fd, "wb") as out:
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > MAX_BYTES:
+                            out.close()
+                            os.unlink(tmp_name)
+                            raise ValueError(f"file oltre {MAX_BYTES} byte")
+                        digest.update(chunk)
+                        out.write(chunk)
+            sha = digest.hexdigest()
+            return {"path": Path(tmp_name), "sha256": sha, "bytes": size, "mime": mime}
+        except (ValueError, requests.HTTPError):
+            # File troppo grande o 4xx: ritentare non cambia il risultato.
+            raise
+        except Exception:
+            if attempt >= retries:
+                raise
+            time.sleep(random.uniform(0, min(30.0, 2**attempt)))
+    raise RuntimeError("unreachable")
+
+
+def make_thumbnail(src: str, dst: str, size: int) -> dict[str, int]:
+    # Eseguita nel pool di processi: decodifica e ridimensionamento sono CPU-bound.
+    with Image.open(src) as img:
+        width, height = img.size
+        img.thumbnail((size, size))
+        img.convert("RGB").save(dst, "JPEG", quality=80, optimize=True)
+    return {"width": width, "height": height}
+
+
+# =========================
+# DATABASE
+# =========================
+def legacy_refs() -> list[dict[str, Any]]:
+    from db import connect
+
+    with connect() as conn:
+        return conn.execute(LEGACY_SQL).fetchall()
+
+
+def copy_rows(cur, table: str, columns: tuple[str, ...], rows: list[tuple]) -> None:
+    with cur.copy(f"copy {table} ({', '.join(columns)}) from stdin") as copy:
+        for row in rows:
+            copy.write_row(row)
+
+
+def merge_batch(media_rows: list[tuple], ref_rows: list[tuple]) -> dict[str, Any]:
+    from db import connect
+
+    with connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(STAGING_DDL)
+            copy_rows(cur, "stg_media", MEDIA_COLUMNS, media_rows)
+            copy_rows(cur, "stg_media_refs", REF_COLUMNS, ref_rows)
+            cur.execute(MERGE_SQL)
+            # Un risultato per statement: il riepilogo è l'ultimo.
+            while cur.nextset():
+                pass
+            result = cur.fetchone()
+        conn.commit()
+    return dict(result)
+
+
+def media_row(url: str, state: sqlite3.Row, bucket: str) -> tuple:
+    filename = unquote(Path(urlparse(url).path).name) or None
+    return (
+        url,
+        bucket,
+        state["storage_path"],
+        media_type_for(state["mime"] or ""),
+        state["mime"],
+        filename,
+        state["bytes"],
+        state["sha256"],
+        state["width"],
+        state["height"],
+        state["public_url"],
+        state["preview_url"],
+    )
+
+
+# =========================
+# PIPELINE
+# =========================
+def migrate(args: argparse.Namespace) -> dict[str, Any]:
+    import requests
+
+    refs = legacy_refs()
+    storage = LocalStorage(args.bucket, Path(args.local_dir), args.public_base) if args.local_dir else SupabaseStorage(args.bucket)
+    skip_prefix = storage.public_url("")
+    refs_by_url: dict[str, list[dict[str, Any]]] = {}
+    for ref in refs:
+        url = ref["url"]
+        # Solo URL esterni: quelli già nello storage di destinazione non vanno migrati di nuovo.
+        if urlparse(url).scheme in ("http", "https") and not url.startswith(skip_prefix):
+            refs_by_url.setdefault(url, []).append(ref)
+
+    state = open_state(Path(args.state))
+    known = {row["url"]: row for row in state.execute("SELECT * FROM urls")}
+    todo = [
+        url
+        for url in refs_by_url
+        if url not in known
+        or (known[url]["status"] == "failed" and known[url]["attempts"] < args.max_attempts)
+    ]
+    pending_load = [url for url in refs_by_url if url in known and known[url]["status"] == "stored"]
+    # Contenuti già caricati in esecuzioni precedenti: bastano hash e percorso.
+    stored_by_sha = {row["sha256"]: row for row in known.values() if row["sha256"] and row["status"] in ("stored", "loaded")}
+    stats = {
+        "urls": len(refs_by_url),
+        "references": sum(len(items) for items in refs_by_url.values()),
+        "todo": len(todo),
+        "resumed": len(pending_load),
+        "already_loaded": sum(1 for url in refs_by_url if url in known and known[url]["status"] == "loaded"),
+        "downloaded_bytes": 0,
+        "duplicates": 0,
+        "failed": 0,
+        "thumbnails": 0,
+        "batches": [],
+    }
+    print(f"MEDIA_PLAN:{json.dumps({key: stats[key] for key in ('urls', 'references', 'todo', 'resumed', 'already_loaded')})}", flush=True)
+    if args.dry_run:
+        return stats
+    thumbnails = Image is not None and args.thumb_size > 0
+    if not thumbnails:
+        print("THUMBNAILS:disabilitate (Pillow non installato o --thumb-size 0)", flush=True)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="media_migration_"))
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    ready: list[str] = list(pending_load)
+    in_flight_sha: dict[str, list[str]] = {}
+
+    def flush(force: bool = False) -> None:
+        while ready and (force or len(ready) >= args.batch):
+            batch, ready[:] = ready[: args.batch], ready[args.batch :]
+            rows = {row["url"]: row for row in state.execute(f"SELECT * FROM urls WHERE url IN ({','.join('?' * len(batch))})", batch)}
+            media_rows = [media_row(url, rows[url], args.bucket) for url in batch]
+            ref_rows = [
+                (ref["entity_type"], ref["entity_id"], ref["role"], ref["sort_order"], ref["is_primary"], url, ref["source_column"])
+                for url in batch
+                for ref in refs_by_url[url]
+            ]
+            result = merge_batch(media_rows, ref_rows)
+            state.executemany("UPDATE urls SET status = 'loaded' WHERE url = ?", [(url,) for url in batch])
+            stats["batches"].append(result)
+            print(f"MEDIA_BATCH:{json.dumps(result)}", flush=True)
+
+    def finish(url: str, source: dict[str, Any]) -> None:
+        save_state(
+            state,
+            url,
+            status="stored",
+            error=None,
+            **{key: source[key] for key in ("sha256", "bytes", "mime", "width", "height", "storage_path", "public_url", "preview_url")},
+        )
+        ready.append(url)
+        flush()
+
+    def store(item: dict[str, Any], thumb: Path | None, size: dict[str, int] | None) -> dict[str, Any]:
+        sha, mime = item["sha256"], item["mime"]
+        storage_path = f"legacy/{sha[:2]}/{sha}{extension_for(item['url'], mime)}"
+        storage.upload(session, item["path"], storage_path, mime)
+        preview_url = None
+        if thumb is not None:
+            thumb_path = f"legacy/{sha[:2]}/{sha}_thumb.jpg"
+            storage.upload(session, thumb, thumb_path, "image/jpeg")
+            preview_url = storage.public_url(thumb_path)
+        return {
+            **item,
+            **(size or {"width": None, "height": None}),
+            "storage_path": storage_path,
+            "public_url": storage.public_url(storage_path),
+            "preview_url": preview_url,
+        }
+
+    def cleanup(*paths: Path | None) -> None:
+        for path in paths:
+            if path is not None:
+                path.unlink(missing_ok=True)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as io_pool, ProcessPoolExecutor(max_workers=args.thumb_workers) as cpu_pool:
+        futures: dict[Future, tuple[str, Any]] = {}
+        queue = iter(todo)
+
+        def submit_downloads() -> None:
+            # Al massimo 2x concurrency download in coda: la memoria e i file temporanei restano limitati.
+            while sum(1 for stage, _ in futures.values() if stage == "fetch") < args.concurrency * 2:
+                url = next(queue, None)
+                if url is None:
+                    return
+                futures[io_pool.submit(fetch, session, url, work_dir, args.retries)] = ("fetch", url)
+
+        submit_downloads()
+        while futures:
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, payload = futures.pop(future)
+                url = payload if stage == "fetch" else payload["url"]
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    if stage == "thumb":
+                        # Miniatura non generabile (formato non supportato da Pillow): si carica solo l'originale.
+                        print(f"THUMB_FAILED:{url}:{exc}", flush=True)
+                        cleanup(payload.pop("thumb"))
+                        futures[io_pool.submit(store, payload, None, None)] = ("store", payload)
+                        continue
+                    attempts = (known[url]["attempts"] if url in known else 0) + 1
+                    save_state(state, url, status="failed", attempts=attempts, error=str(exc)[:500])
+                    stats["failed"] += 1
+                    print(f"MEDIA_FAILED:{url}:{exc}", flush=True)
+                    if stage != "fetch":
+                        cleanup(payload["path"], payload.get("thumb"))
+                        # Gli altri URL con lo stesso contenuto aspettavano questo upload: riprovano al prossimo giro.
+                        for other in in_flight_sha.pop(payload["sha256"], []):
+                            save_state(state, other, status="failed", attempts=1, error="upload dello stesso contenuto fallito")
+                    continue
+
+                if stage == "fetch":
+                    item = {**result, "url": url}
+                    stats["downloaded_bytes"] += item["bytes"]
+                    sha = item["sha256"]
+                    if sha in stored_by_sha:
+                        stats["duplicates"] += 1
+                        cleanup(item["path"])
+                        finish(url, {**dict(stored_by_sha[sha]), "bytes": item["bytes"], "mime": item["mime"]})
+                    elif sha in in_flight_sha:
+                        stats["duplicates"] += 1
+                        cleanup(item["path"])
+                        in_flight_sha[sha].append(url)
+                    else:
+                        in_flight_sha[sha] = []
+                        if thumbnails and item["mime"].startswith("image/"):
+                            thumb = work_dir / f"{sha}_thumb.jpg"
+                            item["thumb"] = thumb
+                            futures[cpu_pool.submit(make_thumbnail, str(item["path"]), str(thumb), args.thumb_size)] = ("thumb", item)
+                        else:
+                            futures[io_pool.submit(store, item, None, None)] = ("store", item)
+                elif stage == "thumb":
+                    stats["thumbnails"] += 1
+                    futures[io_pool.submit(store, payload, payload["thumb"], result)] = ("store", payload)
+                else:
+                    cleanup(payload["path"], payload.get("thumb"))
+                    stored_by_sha[result["sha256"]] = result
+                    finish(url, result)
+                    for other in in_flight_sha.pop(result["sha256"], []):
+                        finish(other, result)
+            submit_downloads()
+
+    flush(force=True)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    state.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bucket", default="media", help="Bucket Supabase di destinazione (storage_bucket)")
+    parser.add_argument("--local-dir", help="Copia i file in questa cartella invece che su Supabase Storage")
+    parser.add_argument("--public-base", help="URL pubblico della cartella di --local-dir")
+    parser.add_argument("--state", default=str(DEFAULT_STATE_PATH), help="File SQLite con lo stato per la ripresa")
+    parser.add_argument("--concurrency", type=int, default=8, help="Download/upload in parallelo")
+    parser.add_argument("--thumb-workers", type=int, default=os.cpu_count() or 1, help="Processi per le miniature")
+    parser.add_argument("--thumb-size", type=int, default=480, help="Lato massimo della miniatura (0 = nessuna)")
+    parser.add_argument("--batch", type=int, default=500, help="URL per transazione su media_assets/media_attachments")
+    parser.add_argument("--retries", type=int, default=3, help="Tentativi per URL (429/5xx/rete) nella stessa esecuzione")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Esecuzioni dopo cui un URL fallito non viene più ritentato")
+    parser.add_argument("--dry-run", action="store_true", help="Conta URL e riferimenti senza scaricare nulla")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = migrate(args)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(stats, ensure_ascii=False, default=str))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
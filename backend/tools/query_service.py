@@ -0,0 +1,425 @@
+# FILE: backend/tools/query_service.py
+#
+# USO:
+# python backend/tools/query_service.py --snapshot backend/data/events_snapshot.jsonl --port 4100
+# GET http://127.0.0.1:4100/api/events?lang=IT&q=roma&year_start=-500&year_end=500&limit=50
+# GET http://127.0.0.1:4100/api/options?type=countries&continent=Europe
+# GET http://127.0.0.1:4100/api/search?q=battaglia%20di%20azio&lang=it   (indice di search_index.py)
+#
+# Servizio di sola lettura per il fallback di /api/events e /api/options (backend/index.js con LOCAL_QUERY_URL).
+# Lo snapshot viene caricato in memoria in forma colonnare, ordinato come il fallback Node
+# (year_from, exact_date, id): ogni filtro diventa una bitmap (int Python, un bit per evento) e i filtri si
+# combinano con AND. Indici:
+# - continent, country, location, group: bitmap per valore;
+# - year_end: prefisso dell'array ordinato per anno di inizio (bisect);
+# - year_start: bitmap cumulative per secolo sull'anno di fine, rifinite solo sul secolo di confine;
+# - q: trigrammi sul testo normalizzato (minuscole, senza accenti), poi verifica della sottostringa.
+# I conteggi per faccetta dell'intero catalogo sono precalcolati; lo snapshot si ricarica quando cambia su disco.
+
+import argparse
+import bisect
+import json
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+from urllib.parse import parse_qs, urlparse
+
+from events_snapshot import DEFAULT_SNAPSHOT_PATH, event_years, load_snapshot
+from search_index import DEFAULT_INDEX_PATH, SearchIndex
+
+FACET_FIELDS = ("continent", "country", "location")
+OPTION_TYPES = {"continents": "continent", "countries": "country", "locations": "location", "groups": "group"}
+LANGS = ("it", "en")
+YEAR_BUCKET = 100
+# Con pochi risultati conviene contare le faccette scorrendo le righe invece di fare un AND per valore.
+FACET_SCAN_ROWS = 2000
+NO_YEAR = 999999
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+# =========================
+# BITMAP
+# =========================
+def mask_from_rows(rows: Iterable[int], size: int) -> int:
+    buf = bytearray((size + 7) // 8)
+    for row in rows:
+        buf[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(buf, "little")
+
+
+def iter_rows(mask: int) -> Iterator[int]:
+    # Posizioni dei bit a 1 in ordine crescente, cioè nell'ordine del catalogo.
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    for i, byte in enumerate(data):
+        if byte:
+            base = i << 3
+            for bit in BYTE_BITS[byte]:
+                yield base + bit
+
+
+# =========================
+# TESTO
+# =========================
+def normalize(text: str | None) -> str:
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def pick(values: dict[str, Any], lang: str) -> Any:
+    # Come il fallback Node: prima la lingua richiesta, poi l'altra.
+    order = (lang,) + tuple(other for other in LANGS if other != lang)
+    for key in order:
+        if values.get(key):
+            return values[key]
+    return None
+
+
+def media_url(item: dict[str, Any]) -> str | None:
+    return item.get("public_url") or item.get("preview_url") or item.get("source_url")
+
+
+def parse_int(value: Any, default: int | None = None) -> int | None:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return default
+
+
+# =========================
+# INDICE
+# =========================
+class EventIndex:
+    def __init__(self, rows: Iterable[dict[str, Any]]):
+        started = time.perf_counter()
+        items = []
+        for row in rows:
+            year_from, year_to = event_years(row)
+            items.append((year_from is None, year_from or 0, str(row.get("exact_date") or ""), str(row.get("id")), row, year_from, year_to))
+        items.sort(key=lambda item: item[:4])
+
+        self.size = len(items)
+        self.all_mask = (1 << self.size) - 1
+        self.rows: list[dict[str, Any]] = []
+        self.year_from: list[int | None] = []
+        self.year_to: list[int | None] = []
+        self.groups: list[list[dict[str, Any]]] = []
+        self.search_text: list[str] = []
+        self.option_text: list[str] = []
+        values: dict[str, dict[str, list[int]]] = {field: {} for field in FACET_FIELDS}
+        group_rows: dict[str, list[int]] = {}
+        postings: dict[str, list[int]] = {}
+
+        for idx, (_, _, _, _, row, year_from, year_to) in enumerate(items):
+            translations = row.get("translations") or {}
+            groups = row.get("groups") or []
+            self.rows.append(row)
+            self.year_from.append(year_from)
+            self.year_to.append(year_to)
+            self.groups.append(groups)
+            for field in FACET_FIELDS:
+                if row.get(field):
+                    values[field].setdefault(row[field], []).append(idx)
+            group_names = set()
+            for group in groups:
+                keys = {group.get("id")} | set((group.get("titles") or {}).values())
+                for key in keys - {None, ""}:
+                    group_rows.setdefault(key, []).append(idx)
+                group_names.update(title for title in (group.get("titles") or {}).values() if title)
+
+            place = [row.get(field) or "" for field in FACET_FIELDS]
+            option_text = normalize(" | ".join(sorted(group_names) + place))
+            texts = [option_text]
+            for tr in translations.values():
+                texts.extend(normalize(tr.get(key)) for key in ("title", "description", "description_short"))
+            search_text = " | ".join(text for text in texts if text)
+            self.option_text.append(option_text)
+            self.search_text.append(search_text)
+            for gram in trigrams(search_text):
+                postings.setdefault(gram, []).append(idx)
+
+        self.value_masks = {
+            field: {value: mask_from_rows(idxs, self.size) for value, idxs in by_value.items()} for field, by_value in values.items()
+        }
+        self.group_masks = {key: mask_from_rows(idxs, self.size) for key, idxs in group_rows.items()}
+        self.postings = postings
+
+        # year_end: gli eventi con anno sono un prefisso ordinato per anno di inizio, quelli senza anno stanno in coda.
+        self.dated = sum(1 for year in self.year_from if year is not None)
+        self.from_sorted = self.year_from[: self.dated]
+        self.undated_mask = self.all_mask ^ ((1 << self.dated) - 1)
+
+        # year_start: per ogni secolo la bitmap degli eventi che finiscono in quel secolo o dopo.
+        by_bucket: dict[int, list[tuple[int, int]]] = {}
+        for idx in range(self.dated):
+            year_to = self.year_to[idx]
+            by_bucket.setdefault(year_to // YEAR_BUCKET, []).append((year_to, idx))
+        self.to_buckets = {bucket: sorted(entries) for bucket, entries in by_bucket.items()}
+        self.bucket_keys = sorted(self.to_buckets)
+        self.to_suffix: dict[int, int] = {}
+        running = 0
+        for bucket in reversed(self.bucket_keys):
+            running |= mask_from_rows((idx for _, idx in self.to_buckets[bucket]), self.size)
+            self.to_suffix[bucket] = running
+
+        self.total_facets = {lang: self.facets(self.all_mask, lang, None) for lang in LANGS}
+        self.build_seconds = time.perf_counter() - started
+
+    # ---------- filtri ----------
+    def year_mask(self, year_start: int | None, year_end: int | None) -> int:
+        mask = self.all_mask
+        if year_end is not None:
+            mask &= ((1 << bisect.bisect_right(self.from_sorted, year_end)) - 1) | self.undated_mask
+        if year_start is not None:
+            bucket = year_start // YEAR_BUCKET
+            pos = bisect.bisect_left(self.bucket_keys, bucket)
+            ending = self.to_suffix[self.bucket_keys[pos]] if pos < len(self.bucket_keys) else 0
+            if pos < len(self.bucket_keys) and self.bucket_keys[pos] == bucket:
+                entries = self.to_buckets[bucket]
+                before = bisect.bisect_left(entries, (year_start, -1))
+                if before:
+                    ending &= ~mask_from_rows((idx for _, idx in entries[:before]), self.size)
+            mask &= ending | self.undated_mask
+        return mask
+
+    def text_mask(self, q: str, mask: int, texts: list[str]) -> int:
+        needle = normalize(q).strip()
+        if not needle or not mask:
+            return mask
+        grams = trigrams(needle)
+        if grams:
+            lists = sorted((self.postings.get(gram, []) for gram in grams), key=len)
+            if not lists[0]:
+                return 0
+            candidates = mask & mask_from_rows(lists[0], self.size)
+            for posting in lists[1:4]:
+                if not candidates:
+                    return 0
+                candidates &= mask_from_rows(posting, self.size)
+        else:
+            candidates = mask
+        return mask_from_rows((idx for idx in iter_rows(candidates) if needle in texts[idx]), self.size)
+
+    def filter_mask(self, params: dict[str, Any], texts: list[str] | None = None) -> int:
+        mask = self.all_mask
+        for field in FACET_FIELDS:
+            if params.get(field):
+                mask &= self.value_masks[field].get(params[field], 0)
+        if params.get("group"):
+            mask &= self.group_masks.get(params["group"], 0)
+        year_start, year_end = parse_int(params.get("year_start")), parse_int(params.get("year_end"))
+        if year_start is not None or year_end is not None:
+            mask &= self.year_mask(year_start, year_end)
+        if params.get("q"):
+            mask = self.text_mask(params["q"], mask, texts if texts is not None else self.search_text)
+        return mask
+
+    # ---------- faccette ----------
+    def group_title(self, group: dict[str, Any], lang: str) -> str | None:
+        return pick(group.get("titles") or {}, lang)
+
+    def facets(self, mask: int, lang: str, limit: int | None = 50) -> dict[str, list[dict[str, Any]]]:
+        if mask == self.all_mask and getattr(self, "total_facets", None) and lang in self.total_facets:
+            return {field: rows[:limit] if limit else rows for field, rows in self.total_facets[lang].items()}
+        matched = mask.bit_count()
+        counts: dict[str, Counter] = {}
+        for field in FACET_FIELDS:
+            if matched <= FACET_SCAN_ROWS:
+                counts[field] = Counter(self.rows[idx][field] for idx in iter_rows(mask) if self.rows[idx].get(field))
+            else:
+                counts[field] = Counter(
+                    {value: (mask & value_mask).bit_count() for value, value_mask in self.value_masks[field].items()}
+                )
+        counts["group"] = self.group_counts(mask, lang)[0]
+        out = {}
+        for field, counter in counts.items():
+            ranked = [{"value": value, "count": count} for value, count in counter.most_common() if count]
+            out[field] = ranked[:limit] if limit else ranked
+        return out
+
+    def group_counts(self, mask: int, lang: str) -> tuple[Counter, dict[str, int]]:
+        counts: Counter = Counter()
+        first_year: dict[str, int] = {}
+        for idx in iter_rows(mask):
+            year = self.year_from[idx]
+            for group in self.groups[idx]:
+                title = self.group_title(group, lang)
+                if not title:
+                    continue
+                counts[title] += 1
+                if year is not None and year < first_year.get(title, NO_YEAR):
+                    first_year[title] = year
+        return counts, first_year
+
+    # ---------- API ----------
+    def shape_row(self, idx: int, lang: str) -> dict[str, Any]:
+        row = self.rows[idx]
+        translations = row.get("translations") or {}
+        by_lang = lambda key: {code: tr.get(key) for code, tr in translations.items()}
+        groups = [self.group_title(group, lang) for group in self.groups[idx]]
+        media = row.get("media") or {}
+        cover = media.get("cover")
+        gallery = media.get("gallery") or []
+        return {
+            "id": row.get("id"),
+            "event": pick(by_lang("title"), lang),
+            "description": pick(by_lang("description"), lang) or pick(by_lang("description_short"), lang),
+            "group_event": next((title for title in groups if title), None),
+            "type_event": row.get("event_types_id"),
+            "continent": row.get("continent"),
+            "country": row.get("country"),
+            "location": row.get("location"),
+            "latitude": row.get("latitude"),
+            "longitude": row.get("longitude"),
+            "wikipedia": pick(by_lang("wikipedia_url"), lang),
+            "from_year": self.year_from[idx],
+            "to_year": self.year_to[idx],
+            # Come il fallback Node: URL della cover (o image_url legacy) e URL della gallery.
+            "image_url": media_url(cover) if cover else row.get("image_url"),
+            "images": [url for url in map(media_url, gallery) if url],
+            "media": {"cover": cover, "gallery": gallery},
+        }
+
+    def events(self, params: dict[str, Any]) -> dict[str, Any]:
+        started = time.perf_counter()
+        lang = str(params.get("lang") or "IT").lower()
+        limit = max(0, parse_int(params.get("limit"), 1000))
+        offset = max(0, parse_int(params.get("offset"), 0))
+        mask = self.filter_mask(params)
+        filter_ms = (time.perf_counter() - started) * 1000
+        page = [self.shape_row(idx, lang) for idx in islice(iter_rows(mask), offset, offset + limit)]
+        return {
+            "rows": page,
+            "total": mask.bit_count(),
+            "facets": self.facets(mask, lang),
+            "source": "local",
+            "filter_ms": round(filter_ms, 3),
+        }
+
+    def options(self, params: dict[str, Any]) -> dict[str, Any]:
+        option_type = params.get("type")
+        if option_type not in OPTION_TYPES:
+            raise ValueError("Unknown type" if option_type else "Missing 'type' param")
+        lang = str(params.get("lang") or "IT").lower()
+        scope = {key: params.get(key) for key in ("q", *FACET_FIELDS)}
+        mask = self.filter_mask(scope, self.option_text)
+        field = OPTION_TYPES[option_type]
+        if field == "group":
+            counts, first_year = self.group_counts(mask, lang)
+            rows = [{"value": value, "count": count, "first_year": first_year.get(value, NO_YEAR)} for value, count in counts.items()]
+            rows.sort(key=lambda item: (item["first_year"], item["value"]))
+        else:
+            rows = [
+                {"value": value, "count": (mask & value_mask).bit_count()}
+                for value, value_mask in sorted(self.value_masks[field].items())
+            ]
+            rows = [item for item in rows if item["count"]]
+        return {"rows": rows, "source": "local"}
+
+
+# =========================
+# SERVIZIO HTTP
+# =========================
+class CachedFile:
+    """Oggetto condiviso tra i thread del server, ricostruito quando il file cambia su disco."""
+
+    def __init__(self, path: Path, build: Callable[[Path], Any], label: str):
+        self.path = path
+        self.build = build
+        self.label = label
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.value: Any = None
+
+    def get(self) -> Any:
+        mtime = self.path.stat().st_mtime_ns
+        if self.value is None or mtime != self.mtime:
+            with self.lock:
+                if self.value is None or mtime != self.mtime:
+                    started = time.perf_counter()
+                    self.value = self.build(self.path)
+                    self.mtime = mtime
+                    print(f"{self.label}:{self.path} caricato in {time.perf_counter() - started:.2f}s", flush=True)
+        return self.value
+
+
+def query_params(raw: str) -> dict[str, Any]:
+    return {key: values[-1] for key, values in parse_qs(raw).items() if values and values[-1] != ""}
+
+
+def make_handler(snapshot: CachedFile, search: CachedFile):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status: int, payload: dict[str, Any]) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = query_params(url.query)
+            try:
+                if url.path == "/health":
+                    index = snapshot.get()
+                    return self.send_json(200, {"ok": True, "events": index.size, "snapshot": str(snapshot.path)})
+                if url.path == "/api/events":
+                    return self.send_json(200, snapshot.get().events(params))
+                if url.path == "/api/options":
+                    return self.send_json(200, snapshot.get().options(params))
+                if url.path == "/api/search":
+                    if not search.path.exists():
+                        return self.send_json(404, {"error": "Search index not built", "index": str(search.path)})
+                    hits = search.get().search(
+                        params.get("q") or "",
+                        params.get("lang"),
+                        max(0, parse_int(params.get("limit"), 20)),
+                        max(0, parse_int(params.get("offset"), 0)),
+                    )
+                    return self.send_json(200, {"rows": hits, "source": "search_index"})
+                return self.send_json(404, {"error": "Not found"})
+            except ValueError as exc:
+                return self.send_json(400, {"error": str(exc)})
+            except Exception as exc:
+                return self.send_json(500, {"error": "Internal error", "detail": str(exc)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot", default=str(DEFAULT_SNAPSHOT_PATH))
+    parser.add_argument("--search-index", default=str(DEFAULT_INDEX_PATH), help="Indice di search_index.py per /api/search")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4100)
+    args = parser.parse_args()
+
+    snapshot = CachedFile(Path(args.snapshot), lambda path: EventIndex(load_snapshot(path)), "INDEX")
+    search = CachedFile(Path(args.search_index), SearchIndex.load, "SEARCH_INDEX")
+    snapshot.get()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(snapshot, search))
+    print(f"LISTENING:http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
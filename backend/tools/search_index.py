@@ -0,0 +1,406 @@
+# FILE: backend/tools/search_index.py
+#
+# USO:
+# python backend/tools/search_index.py build --snapshot backend/data/events_snapshot.jsonl
+# python backend/tools/search_index.py update --snapshot backend/data/events_snapshot.jsonl
+# python backend/tools/search_index.py update --events nuovi_eventi.jsonl --delete <event_id>
+# python backend/tools/search_index.py query "battaglia di azio" --lang it --limit 10
+#
+# Indice invertito full-text (BM25) su titoli e descrizioni degli eventi, separato per lingua (IT/EN).
+# Normalizzazione: minuscole, accenti rimossi, stopword per lingua, stemming leggero (italiano e inglese).
+# Aggiornamento incrementale: per ogni evento si conserva un hash del testo; gli eventi cambiati o rimossi
+# vengono marcati come cancellati e quelli nuovi/cambiati aggiunti in coda alle posting list, che restano
+# ordinate. Quando i documenti cancellati superano COMPACT_RATIO l'indice viene compattato.
+# La query restituisce gli ID evento ordinati per punteggio; l'ultima parola vale anche come prefisso.
+
+import argparse
+import bisect
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import re
+import sys
+import time
+import unicodedata
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterable
+
+from events_snapshot import DEFAULT_SNAPSHOT_PATH, load_snapshot
+
+DEFAULT_INDEX_PATH = DEFAULT_SNAPSHOT_PATH.parent / "search_index.json.gz"
+INDEX_VERSION = 1
+LANGS = ("it", "en")
+# Peso di ogni campo nella frequenza dei termini (BM25F semplificato).
+FIELD_WEIGHTS = {"title": 3, "description_short": 1, "description": 1}
+K1 = 1.2
+B = 0.75
+COMPACT_RATIO = 0.25
+MAX_PREFIX_TERMS = 30
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "it": {
+        "a", "ad", "agli", "ai", "al", "alla", "alle", "allo", "anche", "che", "chi", "con", "come", "cui", "da",
+        "dagli", "dai", "dal", "dalla", "dalle", "dallo", "degli", "dei", "del", "della", "delle", "dello", "di",
+        "e", "ed", "fra", "gli", "i", "il", "in", "la", "le", "lo", "ma", "negli", "nei", "nel", "nella", "nelle",
+        "nello", "non", "o", "per", "piu", "se", "si", "sono", "su", "sua", "sue", "sui", "sul", "sulla", "suo",
+        "suoi", "tra", "un", "una", "uno", "era", "fu", "furono", "questo", "questa", "loro",
+    },
+    "en": {
+        "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "had", "has", "have", "he", "her", "his",
+        "in", "into", "is", "it", "its", "of", "on", "or", "that", "the", "their", "this", "to", "was", "were",
+        "which", "with", "who", "after", "they", "them",
+    },
+}
+# Suffissi italiani, dal più lungo: derivazionali, participi, infiniti e passati remoti.
+IT_SUFFIXES = sorted(
+    [
+        "azione", "azioni", "amento", "amenti", "imento", "imenti", "mente", "zione", "zioni",
+        "arono", "erono", "irono", "ando", "endo", "ato", "ata", "ati", "ate", "ito", "ita", "iti", "ite",
+        "uto", "uta", "uti", "ute", "are", "ere", "ire",
+    ],
+    key=len,
+    reverse=True,
+)
+
+
+# =========================
+# TESTO
+# =========================
+def normalize(text: str | None) -> str:
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem_it(word: str) -> str:
+    if len(word) <= 4 or word.isdigit():
+        return word
+    for suffix in IT_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    # Vocale finale: battaglia/battaglie, romano/romani.
+    return word[:-1] if word[-1] in "aeiou" else word
+
+
+def stem_en(word: str) -> str:
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("sses"):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ing", "ed", "ly"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+STEMMERS = {"it": stem_it, "en": stem_en}
+
+
+def words(text: str | None) -> list[str]:
+    return TOKEN_RE.findall(normalize(text))
+
+
+def tokenize(text: str | None, lang: str) -> list[str]:
+    stop = STOPWORDS.get(lang, set())
+    stem = STEMMERS.get(lang, lambda word: word)
+    return [stem(word) for word in words(text) if word not in stop]
+
+
+def event_fields(row: dict[str, Any], lang: str) -> dict[str, str]:
+    tr = (row.get("translations") or {}).get(lang) or {}
+    return {field: tr.get(field) or "" for field in FIELD_WEIGHTS}
+
+
+def fields_digest(fields: dict[str, str]) -> str:
+    payload = json.dumps(fields, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+# =========================
+# INDICE PER LINGUA
+# =========================
+class LangIndex:
+    def __init__(self, lang: str):
+        self.lang = lang
+        # Numero documento -> ID evento (None se cancellato), hash del testo e lunghezza pesata.
+        self.docs: list[str | None] = []
+        self.hashes: list[str | None] = []
+        self.lengths = array("I")
+        self.postings: dict[str, tuple[array, array]] = {}
+        self.by_event: dict[str, int] = {}
+        self.total_length = 0
+        self.vocabulary: list[str] | None = None
+
+    @property
+    def deleted(self) -> int:
+        return len(self.docs) - len(self.by_event)
+
+    def add(self, event_id: str, fields: dict[str, str], digest: str) -> None:
+        tf: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(fields.get(field), self.lang):
+                tf[term] += weight
+        doc = len(self.docs)
+        length = sum(tf.values())
+        self.docs.append(event_id)
+        self.hashes.append(digest)
+        self.lengths.append(length)
+        self.by_event[event_id] = doc
+        self.total_length += length
+        for term, freq in tf.items():
+            docs, freqs = self.postings.setdefault(term, (array("I"), array("I")))
+            docs.append(doc)
+            freqs.append(freq)
+        self.vocabulary = None
+
+    def remove(self, event_id: str) -> bool:
+        doc = self.by_event.pop(event_id, None)
+        if doc is None:
+            return False
+        # Le posting restano fino alla compattazione; docs[doc] = None le rende invisibili alla ricerca.
+        self.docs[doc] = None
+        self.hashes[doc] = None
+        return True
+
+    def compact(self) -> None:
+        remap = array("i", [-1]) * len(self.docs)
+        docs, hashes, lengths = [], [], array("I")
+        for doc, event_id in enumerate(self.docs):
+            if event_id is not None:
+                remap[doc] = len(docs)
+                docs.append(event_id)
+                hashes.append(self.hashes[doc])
+                lengths.append(self.lengths[doc])
+        postings = {}
+        for term, (old_docs, old_freqs) in self.postings.items():
+            new_docs, new_freqs = array("I"), array("I")
+            for doc, freq in zip(old_docs, old_freqs):
+                if remap[doc] >= 0:
+                    new_docs.append(remap[doc])
+                    new_freqs.append(freq)
+            if new_docs:
+                postings[term] = (new_docs, new_freqs)
+        self.docs, self.hashes, self.lengths, self.postings = docs, hashes, lengths, postings
+        self.by_event = {event_id: doc for doc, event_id in enumerate(docs)}
+        self.total_length = sum(lengths)
+        self.vocabulary = None
+
+    def expand_prefix(self, prefix: str) -> list[str]:
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\uffff")
+        matches = self.vocabulary[start:end]
+        if len(matches) > MAX_PREFIX_TERMS:
+            matches = heapq.nlargest(MAX_PREFIX_TERMS, matches, key=lambda term: len(self.postings[term][0]))
+        return matches
+
+    def query_terms(self, query: str, prefix: bool) -> dict[str, float]:
+        terms = {term: 1.0 for term in tokenize(query, self.lang)}
+        raw = words(query)
+        if prefix and raw and len(raw[-1]) >= 3 and not query.endswith(" "):
+            # Ricerca mentre si scrive: l'ultima parola (non stemmata) vale come prefisso, con peso ridotto.
+            for term in self.expand_prefix(raw[-1]):
+                terms.setdefault(term, 0.5)
+        return terms
+
+    def score(self, query: str, prefix: bool = True) -> dict[str, float]:
+        # Le statistiche includono i documenti cancellati fino alla compattazione: differenza trascurabile sotto COMPACT_RATIO.
+        total_docs = len(self.docs)
+        if not total_docs:
+            return {}
+        avg_length = self.total_length / total_docs or 1.0
+        scores: dict[int, float] = {}
+        for term, boost in self.query_terms(query, prefix).items():
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            docs, freqs = posting
+            idf = math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5)) * boost
+            for doc, freq in zip(docs, freqs):
+                if self.docs[doc] is None:
+                    continue
+                norm = K1 * (1 - B + B * self.lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * freq * (K1 + 1) / (freq + norm)
+        return {self.docs[doc]: value for doc, value in scores.items()}
+
+    def to_json(self) -> dict[str, Any]:
+        postings = {}
+        for term, (docs, freqs) in self.postings.items():
+            # Numeri di documento come differenze dal precedente: liste brevi una volta compresse.
+            deltas = [docs[0]] + [docs[i] - docs[i - 1] for i in range(1, len(docs))]
+            postings[term] = [deltas, freqs.tolist()]
+        return {"docs": self.docs, "hashes": self.hashes, "lengths": self.lengths.tolist(), "postings": postings}
+
+    @classmethod
+    def from_json(cls, lang: str, data: dict[str, Any]) -> "LangIndex":
+        index = cls(lang)
+        index.docs = data["docs"]
+        index.hashes = data["hashes"]
+        index.lengths = array("I", data["lengths"])
+        for term, (deltas, freqs) in data["postings"].items():
+            docs = array("I")
+            current = 0
+            for delta in deltas:
+                current += delta
+                docs.append(current)
+            index.postings[term] = (docs, array("I", freqs))
+        index.by_event = {event_id: doc for doc, event_id in enumerate(index.docs) if event_id is not None}
+        index.total_length = sum(index.lengths)
+        return index
+
+
+# =========================
+# INDICE COMPLETO
+# =========================
+class SearchIndex:
+    def __init__(self, langs: Iterable[str] = LANGS):
+        self.langs = {lang: LangIndex(lang) for lang in langs}
+
+    def upsert(self, rows: Iterable[dict[str, Any]]) -> dict[str, int]:
+        stats = Counter()
+        for row in rows:
+            event_id = str(row.get("id") or "")
+            if not event_id:
+                continue
+            for lang, index in self.langs.items():
+                fields = event_fields(row, lang)
+                has_text = any(fields.values())
+                digest = fields_digest(fields)
+                doc = index.by_event.get(event_id)
+                if doc is not None and index.hashes[doc] == digest:
+                    stats["unchanged"] += 1
+                    continue
+                if doc is not None:
+                    index.remove(event_id)
+                    stats["updated" if has_text else "removed"] += 1
+                elif has_text:
+                    stats["added"] += 1
+                if has_text:
+                    index.add(event_id, fields, digest)
+        return dict(stats)
+
+    def delete(self, event_ids: Iterable[str]) -> int:
+        removed = 0
+        for event_id in event_ids:
+            for index in self.langs.values():
+                removed += index.remove(str(event_id))
+        return removed
+
+    def sync(self, rows: Iterable[dict[str, Any]]) -> dict[str, int]:
+        # Allinea l'indice a un catalogo completo: aggiorna i cambiati e cancella gli eventi spariti.
+        rows = list(rows)
+        stats = self.upsert(rows)
+        present = {str(row.get("id")) for row in rows}
+        gone = {event_id for index in self.langs.values() for event_id in index.by_event if event_id not in present}
+        stats["removed"] = stats.get("removed", 0) + self.delete(gone)
+        stats["compacted"] = self.maybe_compact()
+        return stats
+
+    def maybe_compact(self) -> int:
+        compacted = 0
+        for index in self.langs.values():
+            if index.docs and index.deleted / len(index.docs) > COMPACT_RATIO:
+                index.compact()
+                compacted += 1
+        return compacted
+
+    def search(self, query: str, lang: str | None = None, limit: int = 20, offset: int = 0, prefix: bool = True) -> list[dict[str, Any]]:
+        langs = [lang.lower()] if lang and lang.lower() in self.langs else list(self.langs)
+        best: dict[str, tuple[float, str]] = {}
+        for code in langs:
+            for event_id, value in self.langs[code].score(query, prefix).items():
+                if value > best.get(event_id, (0.0, ""))[0]:
+                    best[event_id] = (value, code)
+        ranked = heapq.nlargest(offset + limit, best.items(), key=lambda item: (item[1][0], item[0]))
+        return [{"id": event_id, "score": round(value, 4), "lang": code} for event_id, (value, code) in ranked[offset:]]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            lang: {"events": len(index.by_event), "deleted": index.deleted, "terms": len(index.postings)}
+            for lang, index in self.langs.items()
+        }
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"version": INDEX_VERSION, "langs": {lang: index.to_json() for lang, index in self.langs.items()}}
+        data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_bytes(gzip.compress(data) if path.suffix == ".gz" else data)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "SearchIndex":
+        raw = path.read_bytes()
+        payload = json.loads(gzip.decompress(raw) if path.suffix == ".gz" else raw)
+        if payload.get("version") != INDEX_VERSION:
+            raise ValueError(f"Versione indice non supportata in {path}: ricostruire con 'build'")
+        index = cls(payload["langs"].keys())
+        index.langs = {lang: LangIndex.from_json(lang, data) for lang, data in payload["langs"].items()}
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Ricostruisce l'indice dallo snapshot")
+    build.add_argument("--snapshot", default=str(DEFAULT_SNAPSHOT_PATH))
+    update = sub.add_parser("update", help="Aggiornamento incrementale")
+    update.add_argument("--snapshot", help="Catalogo completo: aggiorna i cambiati e rimuove gli eventi spariti")
+    update.add_argument("--events", help="JSONL di eventi (formato snapshot) da aggiungere o aggiornare")
+    update.add_argument("--delete", nargs="*", default=[], help="ID evento da rimuovere")
+    query = sub.add_parser("query", help="ID evento ordinati per rilevanza")
+    query.add_argument("text")
+    query.add_argument("--lang", choices=LANGS)
+    query.add_argument("--limit", type=int, default=20)
+    query.add_argument("--offset", type=int, default=0)
+    query.add_argument("--no-prefix", action="store_true", help="Solo parole intere")
+    for command in (build, update, query):
+        command.add_argument("--index", default=str(DEFAULT_INDEX_PATH))
+    args = parser.parse_args()
+
+    index_path = Path(args.index)
+    started = time.perf_counter()
+    if args.command == "build":
+        index = SearchIndex()
+        result = index.upsert(load_snapshot(Path(args.snapshot)))
+        index.save(index_path)
+    elif args.command == "update":
+        index = SearchIndex.load(index_path) if index_path.exists() else SearchIndex()
+        result = {}
+        if args.snapshot:
+            result = index.sync(load_snapshot(Path(args.snapshot)))
+        if args.events:
+            result.update({f"events_{key}": value for key, value in index.upsert(load_snapshot(Path(args.events))).items()})
+        if args.delete:
+            result["deleted"] = index.delete(args.delete)
+            result["compacted"] = index.maybe_compact()
+        index.save(index_path)
+    else:
+        index = SearchIndex.load(index_path)
+        loaded = time.perf_counter()
+        hits = index.search(args.text, args.lang, args.limit, args.offset, prefix=not args.no_prefix)
+        print(json.dumps({"hits": hits, "query_ms": round((time.perf_counter() - loaded) * 1000, 3)}, ensure_ascii=False))
+        return 0
+
+    print(
+        json.dumps(
+            {"index": str(index_path), "result": result, "stats": index.stats(), "seconds": round(time.perf_counter() - started, 2)},
+            ensure_ascii=False,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
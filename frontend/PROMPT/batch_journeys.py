@@ -0,0 +1,415 @@
+# FILE: frontend/PROMPT/batch_journeys.py
+#
+# USO:
+# python batch_journeys.py --batch-id stagione_2026 --titles titoli.txt --audience Studenti --styles Narrativo --detail-level medio
+# python batch_journeys.py --batch-id stagione_2026              (riprende: si ricollega ai batch in corso)
+# python batch_journeys.py --batch-id stagione_2026 --no-wait    (invia i batch pronti ed esce)
+# python batch_journeys.py --batch-id prova --titles titoli.txt ... --backend stub
+#
+# Generazione di molti journey con la Batch API: tutti i PROMPT_1 vanno in un unico file JSONL, i risultati alimentano
+# un batch PROMPT_2 e poi uno PROMPT_3 (stessi prompt e stessa proiezione/splice di new_journey.py).
+# Titoli: un titolo per riga, oppure righe JSON {"title", "audience", "styles", "detail_level", "event_guideline"}
+# che sovrascrivono i parametri della CLI.
+# Stato per titolo in NEW_JOURNEY_JOBS_DIR/batches/<batch-id>/manifest.json; i file di ogni titolo stanno nel workspace
+# NEW_JOURNEY_JOBS_DIR/<batch-id>-NNNN (OUTPUT_PROMPT_1.json, OUTPUT_PROMPT_2.json, result.json, status.json),
+# quindi un titolo si può anche completare a mano con new_journey.py --job-id <batch-id>-NNNN --step N.
+# --backend stub usa frontend/benchmarks/stub_openai.py (nessuna chiamata di rete).
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+BASE_DIR = Path(__file__).resolve().parent
+BENCH_DIR = BASE_DIR.parent / "benchmarks"
+STAGES = ("PROMPT_1", "PROMPT_2", "PROMPT_3")
+BATCH_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,47}$")
+RESULT_NAME = "result.json"
+BATCH_ENDPOINT = "/v1/responses"
+# Stati finali di un batch OpenAI: gli altri (validating, in_progress, finalizing, cancelling) si continuano a interrogare.
+BATCH_TERMINAL = {"completed", "failed", "expired", "cancelled"}
+
+nj: Any = None  # modulo new_journey, importato dopo l'eventuale installazione dello stub
+
+
+def load_pipeline(backend: str, stub_dir: Path, stub_delay: float, stub_fail_every: int) -> None:
+    global nj
+    if backend == "stub":
+        sys.path.insert(0, str(BENCH_DIR))
+        import stub_openai
+
+        os.environ.setdefault("OPENAI_API_KEY", "batch-stub")
+        stub_openai.install()
+        stub_openai.configure({"batches": stub_delay}, work_dir=str(stub_dir), batch_fail_every=stub_fail_every)
+    import new_journey
+
+    nj = new_journey
+
+
+# =========================
+# MANIFEST
+# =========================
+def batch_dir(batch_id: str) -> Path:
+    return nj.JOBS_DIR / "batches" / batch_id
+
+
+def save_manifest(manifest: dict) -> None:
+    path = batch_dir(manifest["batch_id"]) / "manifest.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def load_manifest(batch_id: str) -> dict | None:
+    path = batch_dir(batch_id) / "manifest.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def read_titles(path: Path, defaults: dict) -> list[dict]:
+    items = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        item = dict(defaults)
+        if stripped.startswith("{"):
+            item.update({key: value for key, value in json.loads(stripped).items() if value not in (None, "")})
+        else:
+            item["title"] = stripped
+        missing = [key for key in ("title", "audience", "styles", "detail_level") if not item.get(key)]
+        if missing:
+            raise ValueError(f"Missing {', '.join(missing)} for line: {stripped[:80]}")
+        items.append(item)
+    if not items:
+        raise ValueError(f"No titles in {path}")
+    return items
+
+
+def new_manifest(batch_id: str, items: list[dict]) -> dict:
+    titles = []
+    for idx, item in enumerate(items, start=1):
+        titles.append(
+            {
+                "job_id": f"{batch_id}-{idx:04d}",
+                "title": item["title"],
+                "audience": item["audience"],
+                "styles": item["styles"],
+                "detail_level": item["detail_level"],
+                "event_guideline": item.get("event_guideline"),
+                "stage": STAGES[0],
+                "attempts": {},
+                "error": None,
+            }
+        )
+    return {"batch_id": batch_id, "model": nj.MODEL, "created_at": nj.utc_timestamp(), "titles": titles, "batches": []}
+
+
+def workspace(entry: dict):
+    return nj.job_workspace(entry["job_id"])
+
+
+def set_stage(entry: dict, stage: str, error: str | None = None) -> None:
+    entry["stage"] = stage
+    entry["error"] = error
+    status = "done" if stage == "done" else "error" if stage == "failed" else "running"
+    payload = {"status": status, "stage": stage, "updated_at": nj.utc_timestamp()}
+    if error:
+        payload["error"] = error
+    nj.write_status(workspace(entry), payload)
+
+
+# =========================
+# RICHIESTE
+# =========================
+def read_stage_input(entry: dict, name: str) -> dict:
+    return json.loads((workspace(entry).root / name).read_text(encoding="utf-8"))
+
+
+def build_prompt(entry: dict, stage: str) -> str:
+    if stage == "PROMPT_1":
+        return nj.build_prompt_1(entry["title"], entry.get("event_guideline"))
+    if stage == "PROMPT_2":
+        json_a = read_stage_input(entry, nj.PROMPT_1_OUT_NAME)
+        prompt, _ = nj.build_prompt_2(entry["audience"], entry["styles"], entry["detail_level"], json_a)
+        return prompt
+    return nj.build_prompt_3(read_stage_input(entry, nj.PROMPT_2_OUT_NAME))
+
+
+def store_output(entry: dict, stage: str, text: str) -> None:
+    # Stesse regole dei run_prompt_* di new_journey.py; gli errori di parsing restano sul singolo titolo.
+    ws = workspace(entry)
+    data = nj.extract_json(text)
+    if stage == "PROMPT_1":
+        nj.write_json(ws.prompt_1_out, data)
+        nj.update_inputs(ws, title=entry["title"], event_guideline=entry.get("event_guideline") or "")
+        set_stage(entry, "PROMPT_2")
+    elif stage == "PROMPT_2":
+        nj.write_json(ws.prompt_2_out, data)
+        nj.update_inputs(ws, **nj.style_inputs(entry["audience"], entry["styles"], entry["detail_level"], None))
+        set_stage(entry, "PROMPT_3")
+    else:
+        data = nj.finish_prompt_3(data, read_stage_input(entry, nj.PROMPT_2_OUT_NAME))
+        nj.write_json(ws.prompt_3_out, data)
+        (ws.root / RESULT_NAME).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        set_stage(entry, "done")
+
+
+def body_output_text(body: dict) -> str:
+    out = []
+    for item in body.get("output") or []:
+        if item.get("type") == "message":
+            for content in item.get("content") or []:
+                if content.get("type") == "output_text":
+                    out.append(content.get("text") or "")
+    return "\n".join(out).strip()
+
+
+def custom_id(entry: dict, stage: str) -> str:
+    return f"{entry['job_id']}:{stage}"
+
+
+# =========================
+# BATCH
+# =========================
+class BatchRunner:
+    def __init__(self, manifest: dict, max_attempts: int, max_requests: int, poll_interval: float):
+        self.manifest = manifest
+        self.max_attempts = max_attempts
+        self.max_requests = max_requests
+        self.poll_interval = poll_interval
+        self.client = nj.client
+        self.by_job = {entry["job_id"]: entry for entry in manifest["titles"]}
+
+    def active(self) -> list[dict]:
+        return [batch for batch in self.manifest["batches"] if batch["status"] not in BATCH_TERMINAL]
+
+    def submittable(self, stage: str) -> list[dict]:
+        busy = {job for batch in self.active() for job in batch["job_ids"]}
+        return [
+            entry
+            for entry in self.manifest["titles"]
+            if entry["stage"] == stage and entry["job_id"] not in busy
+        ]
+
+    def submit_ready(self) -> int:
+        submitted = 0
+        for stage in STAGES:
+            entries = self.submittable(stage)
+            for start in range(0, len(entries), self.max_requests):
+                self.submit(stage, entries[start:start + self.max_requests])
+                submitted += 1
+        return submitted
+
+    def submit(self, stage: str, entries: list[dict]) -> None:
+        number = len(self.manifest["batches"]) + 1
+        path = batch_dir(self.manifest["batch_id"]) / f"requests_{number:03d}_{stage}.jsonl"
+        job_ids = []
+        with path.open("w", encoding="utf-8") as handle:
+            for entry in entries:
+                entry["attempts"][stage] = entry["attempts"].get(stage, 0) + 1
+                try:
+                    prompt = build_prompt(entry, stage)
+                except Exception as exc:
+                    self.fail_attempt(entry, stage, f"Prompt not built: {exc}")
+                    continue
+                request = {
+                    "custom_id": custom_id(entry, stage),
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": {"model": self.manifest["model"], "input": [{"role": "user", "content": prompt}]},
+                }
+                handle.write(json.dumps(request, ensure_ascii=False) + "\n")
+                job_ids.append(entry["job_id"])
+        if not job_ids:
+            save_manifest(self.manifest)
+            return
+        with path.open("rb") as handle:
+            uploaded = nj.call_with_limits(
+                self.manifest["model"], lambda: self.client.files.create(file=handle, purpose="batch"),
+                label="BATCH",
+                idempotent=False,
+            )
+        remote = nj.call_with_limits(
+            self.manifest["model"],
+            lambda: self.client.batches.create(
+                input_file_id=uploaded.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window="24h",
+                metadata={"batch_id": self.manifest["batch_id"], "stage": stage},
+            ),
+            label="BATCH",
+            idempotent=False,
+        )
+        batch = {
+            "id": remote.id,
+            "stage": stage,
+            "status": remote.status,
+            "input_file": path.name,
+            "job_ids": job_ids,
+            "submitted_at": nj.utc_timestamp(),
+        }
+        self.manifest["batches"].append(batch)
+        for job_id in job_ids:
+            nj.write_status(workspace(self.by_job[job_id]), {"status": "running", "stage": f"{stage}_BATCH", "updated_at": nj.utc_timestamp()})
+        save_manifest(self.manifest)
+        print("BATCH_SUBMITTED:" + json.dumps({"id": remote.id, "stage": stage, "requests": len(job_ids)}), flush=True)
+
+    def fail_attempt(self, entry: dict, stage: str, error: str) -> None:
+        # Il titolo resta allo stesso stage e rientra nel prossimo batch finché non esaurisce i tentativi.
+        if entry["attempts"].get(stage, 0) >= self.max_attempts:
+            set_stage(entry, "failed", f"{stage}: {error}")
+        else:
+            entry["error"] = f"{stage}: {error}"
+        print("TITLE_ERROR:" + json.dumps({"job_id": entry["job_id"], "stage": stage, "error": error[:500]}, ensure_ascii=False), flush=True)
+
+    def poll(self) -> int:
+        finished = 0
+        for batch in self.active():
+            remote = nj.call_with_limits(self.manifest["model"], lambda: self.client.batches.retrieve(batch["id"]), label="BATCH")
+            batch["status"] = remote.status
+            if remote.status in BATCH_TERMINAL:
+                self.collect(batch, remote)
+                finished += 1
+            save_manifest(self.manifest)
+        return finished
+
+    def read_file(self, file_id: str | None) -> list[dict]:
+        if not file_id:
+            return []
+        text = nj.call_with_limits(self.manifest["model"], lambda: self.client.files.content(file_id), label="BATCH").text
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    def collect(self, batch: dict, remote: Any) -> None:
+        stage = batch["stage"]
+        seen: set[str] = set()
+        usage = {"stage": stage, "batch": batch["id"], "requests": 0, "input_tokens": 0, "output_tokens": 0}
+        for row in self.read_file(getattr(remote, "output_file_id", None)) + self.read_file(getattr(remote, "error_file_id", None)):
+            job_id, _, row_stage = str(row.get("custom_id") or "").rpartition(":")
+            entry = self.by_job.get(job_id)
+            if not entry or row_stage != stage or job_id in seen:
+                continue
+            seen.add(job_id)
+            response = row.get("response") or {}
+            body = response.get("body") or {}
+            if row.get("error") or response.get("status_code") != 200:
+                error = row.get("error") or body.get("error") or {"status_code": response.get("status_code")}
+                self.fail_attempt(entry, stage, json.dumps(error, ensure_ascii=False))
+                continue
+            usage["requests"] += 1
+            usage["input_tokens"] += int((body.get("usage") or {}).get("input_tokens") or 0)
+            usage["output_tokens"] += int((body.get("usage") or {}).get("output_tokens") or 0)
+            try:
+                store_output(entry, stage, body_output_text(body))
+            except Exception as exc:
+                self.fail_attempt(entry, stage, str(exc))
+        for job_id in batch["job_ids"]:
+            if job_id not in seen:
+                # Batch scaduto o fallito: le richieste senza risposta contano come tentativo fallito.
+                self.fail_attempt(self.by_job[job_id], stage, f"No result (batch {remote.status})")
+        batch["finished_at"] = nj.utc_timestamp()
+        print("TOKENS:" + json.dumps(usage, ensure_ascii=False), flush=True)
+        print("BATCH_DONE:" + json.dumps({"id": batch["id"], "stage": stage, "status": remote.status}), flush=True)
+
+    def run(self, wait: bool) -> None:
+        self.submit_ready()
+        while self.active():
+            if not wait:
+                return
+            time.sleep(self.poll_interval)
+            if self.poll():
+                self.submit_ready()
+
+
+def summary(manifest: dict) -> dict:
+    counts: dict[str, int] = {}
+    for entry in manifest["titles"]:
+        counts[entry["stage"]] = counts.get(entry["stage"], 0) + 1
+    root = nj.JOBS_DIR
+    return {
+        "batch_id": manifest["batch_id"],
+        "titles": len(manifest["titles"]),
+        "stages": counts,
+        "batches": len(manifest["batches"]),
+        "results": [
+            {
+                "job_id": entry["job_id"],
+                "title": entry["title"],
+                "stage": entry["stage"],
+                "result": str(root / entry["job_id"] / RESULT_NAME) if entry["stage"] == "done" else None,
+                "error": entry["error"],
+            }
+            for entry in manifest["titles"]
+        ],
+    }
+
+
+# =========================
+# CLI
+# =========================
+def main():
+    if hasattr(sys.stdout, "reconfigure"):
+        try:
+            sys.stdout.reconfigure(encoding="utf-8")
+        except Exception:
+            pass
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-id", required=True)
+    parser.add_argument("--titles", help="File con un titolo per riga o righe JSON; solo alla creazione")
+    parser.add_argument("--audience")
+    parser.add_argument("--styles")
+    parser.add_argument("--detail-level")
+    parser.add_argument("--event-guideline")
+    parser.add_argument("--no-wait", action="store_true", help="Invia i batch pronti e termina senza attendere")
+    parser.add_argument("--poll-interval", type=float, default=30.0)
+    parser.add_argument("--max-attempts", type=int, default=3, help="Tentativi per titolo e stage")
+    parser.add_argument("--max-requests", type=int, default=5000, help="Richieste per file batch")
+    parser.add_argument("--retry-failed", action="store_true", help="Rimette in coda i titoli falliti")
+    parser.add_argument("--backend", choices=["openai", "stub"], default="openai")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="Secondi prima che un batch stub sia completato")
+    parser.add_argument("--stub-fail-every", type=int, default=0, help="Lo stub fa fallire una richiesta ogni N")
+    args = parser.parse_args()
+
+    if not BATCH_ID_RE.match(args.batch_id):
+        raise SystemExit(f"Invalid batch id: {args.batch_id!r}")
+    jobs_dir = Path(os.getenv("NEW_JOURNEY_JOBS_DIR") or BASE_DIR / "jobs")
+    load_pipeline(args.backend, jobs_dir / "batches" / args.batch_id / "stub", args.stub_delay, args.stub_fail_every)
+
+    manifest = load_manifest(args.batch_id)
+    if manifest is None:
+        if not args.titles:
+            raise SystemExit("--titles is required for a new batch")
+        defaults = {
+            "audience": args.audience,
+            "styles": args.styles,
+            "detail_level": args.detail_level,
+            "event_guideline": args.event_guideline,
+        }
+        batch_dir(args.batch_id).mkdir(parents=True, exist_ok=True)
+        manifest = new_manifest(args.batch_id, read_titles(Path(args.titles), defaults))
+        save_manifest(manifest)
+    elif args.titles:
+        raise SystemExit(f"Batch {args.batch_id} already exists: run without --titles to resume it")
+
+    if args.retry_failed:
+        for entry in manifest["titles"]:
+            if entry["stage"] == "failed":
+                stage = next((s for s in reversed(STAGES) if s in entry["attempts"]), STAGES[0])
+                entry["attempts"][stage] = 0
+                set_stage(entry, stage)
+        save_manifest(manifest)
+
+    runner = BatchRunner(manifest, args.max_attempts, args.max_requests, args.poll_interval)
+    runner.poll()
+    runner.run(wait=not args.no_wait)
+    save_manifest(manifest)
+    print("BATCH_RESULT:" + json.dumps(summary(manifest), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
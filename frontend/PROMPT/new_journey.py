@@ -2,6 +2,8 @@
 #
 # USO:
 # python new_journey.py --title "La Civiltà della Mesopotamia" --audience "Ragazzi 11-14" --style "Avventuroso divulgativo"
+# python new_journey.py ... --job-id <id> --step 1   (poi --step 2 / --step 3 con lo stesso --job-id)
+# python new_journey.py ... --job-id <id> --incremental  (dopo aver cambiato target/dettaglio/indicazioni: rigenera solo gli eventi toccati)
 #
 # OUTPUT:
 # ~/Downloads/La_Civilta_della_Mesopotamia.xlsx
@@ -9,11 +11,18 @@
 import argparse
 import json
 import os
+import re
+import shutil
 import sys
+import time
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 from openai import OpenAI
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rate_limit import call_with_limits, estimate_tokens, usage_tokens
+
 # =========================
 # PATH
 # =========================
@@ -41,14 +50,24 @@ load_env_file(ENV_PATH)
 PROMPT_1_PATH = BASE_DIR / "PROMPT_1.txt"
 PROMPT_2_PATH = BASE_DIR / "PROMPT_2.txt"
 PROMPT_3_PATH = BASE_DIR / "PROMPT_3.txt"
-PROMPT_1_OUT_PATH = BASE_DIR / "OUTPUT_PROMPT_1.json"
-PROMPT_2_OUT_PATH = BASE_DIR / "OUTPUT_PROMPT_2.json"
+PROMPT_1_OUT_NAME = "OUTPUT_PROMPT_1.json"
+PROMPT_2_OUT_NAME = "OUTPUT_PROMPT_2.json"
+PROMPT_3_OUT_NAME = "OUTPUT_PROMPT_3.json"
+# Parametri con cui sono stati prodotti gli OUTPUT_PROMPT_*.json del workspace (serve a --incremental).
+INPUTS_OUT_NAME = "OUTPUT_INPUTS.json"
+# Senza --job-id si usa il workspace condiviso JOBS_DIR/default (un job alla volta), mai la cartella versionata.
+JOBS_DIR = Path(os.getenv("NEW_JOURNEY_JOBS_DIR") or BASE_DIR / "jobs")
+DEFAULT_JOB_ID = "default"
+# Workspace non toccati da più di queste ore vengono rimossi all'avvio (0 = mai).
+DEFAULT_JOBS_MAX_AGE_HOURS = 72
+JOB_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
 
 # =========================
 # OPENAI
 # =========================
 MODEL = os.getenv("OPENAI_MODEL", "gpt-5")
-client = OpenAI()
+# I retry li fa call_with_limits: l'SDK non deve ritentare a sua volta.
+client = OpenAI(max_retries=0)
 
 # =========================
 # UTILS
@@ -68,10 +87,15 @@ def extract_json(text: str) -> dict:
         raise ValueError("No JSON found in model output.")
     return json.loads(t[start:end + 1])
 
-def responses_text(prompt: str) -> str:
-    resp = client.responses.create(
-        model=MODEL,
-        input=[{"role": "user", "content": prompt}]
+def responses_text(prompt: str, stage: str = "") -> str:
+    started = time.perf_counter()
+    resp = call_with_limits(
+        MODEL,
+        lambda: client.responses.create(
+            model=MODEL,
+            input=[{"role": "user", "content": prompt}]
+        ),
+        tokens=estimate_tokens(prompt, expected_output=8000),
     )
     out = []
     for item in resp.output:
@@ -79,51 +103,281 @@ def responses_text(prompt: str) -> str:
             for c in item.content:
                 if c.type == "output_text":
                     out.append(c.text)
+    input_tokens, output_tokens = usage_tokens(resp)
+    usage = {
+        "stage": stage,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "prompt_chars": len(prompt),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    print("TOKENS:" + json.dumps(usage, ensure_ascii=False), flush=True)
     return "\n".join(out).strip()
 
-def responses_json(prompt: str) -> dict:
-    return extract_json(responses_text(prompt))
+def responses_json(prompt: str, stage: str = "") -> dict:
+    return extract_json(responses_text(prompt, stage))
+
+# =========================
+# PROIEZIONE INPUT TRA GLI STAGE
+# =========================
+# Campi del JSON dello stage precedente che ogni prompt legge davvero: il resto non viene inviato.
+STAGE_INPUT_FIELDS = {
+    "PROMPT_2": {
+        "journey": ("journey_title_it", "journey_title_en"),
+        "events": ("titolo_evento_it", "title_event_en", "era", "from", "to", "continent", "country", "location"),
+    },
+    "PROMPT_3": {
+        # target_audience / stili_narrativi / livello_dettaglio servono solo al PROMPT 2.
+        # Le descrizioni restano: le regole 6.3/8.1 le copiano, la 8.2 e la 9.2 ne leggono il contenuto.
+        "journey": ("journey_title_it", "journey_title_en", "journey_description_it", "journey_description_en"),
+        "events": (
+            "titolo_evento_it",
+            "title_event_en",
+            "descrizione_evento_it",
+            "description_event_en",
+            "era",
+            "from",
+            "to",
+            "event_date",
+            "continent",
+            "country",
+            "location",
+            "lat",
+            "lon",
+            "wikipedia_url_it",
+            "wikipedia_url_en",
+            "type_event",
+        ),
+    },
+}
+# Colonna PROMPT 3 -> campo PROMPT 2 copiato localmente nell'output invece di passare dal modello.
+PROMPT_3_SPLICED_FIELDS = {
+    "journey": {
+        "Descrizione IT": "journey_description_it",
+        "Description EN": "journey_description_en",
+    },
+    "events": {
+        "Descrizione evento IT": "descrizione_evento_it",
+        "Description event EN": "description_event_en",
+    },
+}
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def splice_descriptions() -> bool:
+    # Opt-in: il PROMPT 3 riceve solo la prima frase di ogni descrizione (la copia così com'è) e il testo
+    # completo del PROMPT 2 viene reinserito dopo. Risparmia token ma dà meno contesto a 8.2 e 9.2.
+    return os.getenv("NEW_JOURNEY_SPLICE_DESCRIPTIONS", "0").strip() == "1"
+
+
+def first_sentence(text: str) -> str:
+    return SENTENCE_END_RE.split(text.strip(), maxsplit=1)[0]
+
+
+def project_fields(data: dict, fields: tuple[str, ...]) -> dict:
+    # I campi vuoti non portano informazione al modello (es. event_date assente).
+    return {key: data[key] for key in fields if data.get(key) not in (None, "")}
+
+
+def shorten_descriptions(item: dict, keys) -> dict:
+    for key in keys:
+        if isinstance(item.get(key), str):
+            item[key] = first_sentence(item[key])
+    return item
+
+
+def project_payload(stage: str, data: dict, event_guidelines: dict | None = None) -> dict:
+    shorten = stage == "PROMPT_3" and splice_descriptions()
+    projected = project_fields(data, STAGE_INPUT_FIELDS[stage]["journey"])
+    if shorten:
+        shorten_descriptions(projected, PROMPT_3_SPLICED_FIELDS["journey"].values())
+    projected["events"] = []
+    for ev in data.get("events") or []:
+        item = project_fields(ev, STAGE_INPUT_FIELDS[stage]["events"])
+        if shorten:
+            shorten_descriptions(item, PROMPT_3_SPLICED_FIELDS["events"].values())
+        note = (event_guidelines or {}).get(ev.get("titolo_evento_it"))
+        if note:
+            item[EVENT_GUIDELINE_FIELD] = note
+        projected["events"].append(item)
+    return projected
+
+
+def splice_prompt_3(json_c: dict, json_b: dict) -> dict:
+    for row in json_c.get("journey") or []:
+        for column, key in PROMPT_3_SPLICED_FIELDS["journey"].items():
+            row[column] = json_b.get(key, "")
+    events_in = json_b.get("events") or []
+    events_out = json_c.get("events") or []
+    by_title = {ev.get("titolo_evento_it"): ev for ev in events_in}
+    for idx, row in enumerate(events_out):
+        # 1 evento in input = 1 evento in output (regola 7.2); se il modello non la rispetta si abbina per titolo.
+        source = events_in[idx] if len(events_in) == len(events_out) else by_title.get(row.get("Titolo evento IT"))
+        if source is None:
+            # Mai scrivere descrizioni vuote: meglio fallire il job (e rilanciarlo) che perdere il testo del PROMPT 2.
+            raise RuntimeError(
+                f"PROMPT_3: evento '{row.get('Titolo evento IT')}' non presente nel PROMPT 2, descrizioni non reinseribili."
+            )
+        for column, key in PROMPT_3_SPLICED_FIELDS["events"].items():
+            row[column] = source.get(key, "")
+    return json_c
+
+
+# Indicazioni per singolo evento (titolo IT -> testo), inviate solo al PROMPT 2 e solo se presenti.
+EVENT_GUIDELINE_FIELD = "linea_guida_evento"
+EVENT_GUIDELINE_NOTE = (
+    f"NOTA DI SISTEMA: alcuni eventi del JSON di input hanno il campo {EVENT_GUIDELINE_FIELD}: è un'indicazione "
+    "redazionale vincolante per la descrizione di quell'evento e non va riportata nell'output."
+)
+PARTIAL_PROMPT_2_NOTE = (
+    "NOTA DI SISTEMA: rigenerazione parziale. Il journey contiene anche altri eventi, già descritti e non inclusi "
+    "nell'input: {others}. Scrivi le descrizioni solo per gli eventi del JSON di input, in continuità con il resto "
+    "del journey; journey_description_it e journey_description_en possono restare vuote."
+)
+PARTIAL_PROMPT_2_JOURNEY_NOTE = (
+    "NOTA DI SISTEMA: rigenerazione parziale. Il journey contiene anche altri eventi, già descritti e non inclusi "
+    "nell'input: {others}. Scrivi le descrizioni solo per gli eventi del JSON di input, in continuità con il resto "
+    "del journey. Gli eventi del journey sono cambiati: riscrivi journey_description_it e journey_description_en "
+    "per l'intero journey (eventi dell'input più quelli elencati)."
+)
+JOURNEY_DESCRIPTION_FIELDS = ("journey_description_it", "journey_description_en")
+
+
+def load_event_guidelines(value: str | None) -> dict:
+    # Accetta un file JSON oppure il JSON inline: {"<titolo_evento_it>": "<indicazione>"}.
+    if not value:
+        return {}
+    # Prima il JSON inline: un JSON lungo passato a Path().exists() fallisce con "File name too long".
+    try:
+        data = json.loads(value)
+    except json.JSONDecodeError:
+        data = json.loads(Path(value).read_text(encoding="utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError("--event-guidelines must be a JSON object: {titolo_evento_it: guideline}")
+    return {str(k): str(v).strip() for k, v in data.items() if str(v).strip()}
+
+
+def compact_json(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
 
 # =========================
 # PIPELINE
 # =========================
 
 
-STATUS_FILE: Path | None = None
-LAST_STYLE_RULES: str | None = None
+@dataclass
+class JobWorkspace:
+    # Stato di un singolo job: file intermedi, status file e regole di stile non sono più globali.
+    root: Path
+    status_file: Path | None = None
+    style_rules: str | None = None
+
+    @property
+    def prompt_1_out(self) -> Path:
+        return self.root / PROMPT_1_OUT_NAME
+
+    @property
+    def prompt_2_out(self) -> Path:
+        return self.root / PROMPT_2_OUT_NAME
+
+    @property
+    def prompt_3_out(self) -> Path:
+        return self.root / PROMPT_3_OUT_NAME
+
+    @property
+    def inputs_out(self) -> Path:
+        return self.root / INPUTS_OUT_NAME
+
+
+def job_workspace(job_id: str | None = None, status_file: str | None = None) -> JobWorkspace:
+    if not job_id:
+        root = JOBS_DIR / DEFAULT_JOB_ID
+        root.mkdir(parents=True, exist_ok=True)
+        return JobWorkspace(root, Path(status_file) if status_file else None)
+    if not JOB_ID_RE.match(job_id):
+        raise ValueError(f"Invalid job id: {job_id!r}")
+    root = JOBS_DIR / job_id
+    root.mkdir(parents=True, exist_ok=True)
+    return JobWorkspace(root, Path(status_file) if status_file else root / "status.json")
+
+
+def prune_jobs(keep: Path) -> int:
+    # Ogni richiesta della UI crea un workspace: quelli vecchi si eliminano qui. I workspace dei batch
+    # (<batch-id>-NNNN) restano finché esiste il loro manifest in JOBS_DIR/batches.
+    max_age = float(os.getenv("NEW_JOURNEY_JOBS_MAX_AGE_HOURS", str(DEFAULT_JOBS_MAX_AGE_HOURS)).strip() or "0")
+    if max_age <= 0 or not JOBS_DIR.is_dir():
+        return 0
+    batches_dir = JOBS_DIR / "batches"
+    batch_ids = {p.name for p in batches_dir.iterdir()} if batches_dir.is_dir() else set()
+    cutoff = time.time() - max_age * 3600
+    removed = 0
+    for root in JOBS_DIR.iterdir():
+        if not root.is_dir() or root == keep or root == batches_dir or root.name.rsplit("-", 1)[0] in batch_ids:
+            continue
+        try:
+            # Il mtime della cartella non cambia quando si riscrive un file esistente: conta il più recente.
+            last = max([root.stat().st_mtime, *(f.stat().st_mtime for f in root.iterdir())])
+            if last < cutoff:
+                shutil.rmtree(root)
+                removed += 1
+        except OSError:
+            continue
+    return removed
 
 
 def utc_timestamp() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def write_status(payload: dict):
-    if not STATUS_FILE:
+def write_status(ws: JobWorkspace, payload: dict):
+    if not ws.status_file:
         return
     try:
-        STATUS_FILE.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        ws.status_file.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
     except Exception:
         pass
 
 
-def log_stage(stage: str):
+def read_json(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+def write_json(path: Path, data: dict):
+    try:
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    except Exception:
+        pass
+
+
+def update_inputs(ws: JobWorkspace, **values):
+    inputs = read_json(ws.inputs_out) or {}
+    inputs.update(values)
+    write_json(ws.inputs_out, inputs)
+
+
+def log_stage(stage: str, ws: JobWorkspace | None = None):
     print(f"STAGE:{stage}", flush=True)
-    write_status({"status": "running", "stage": stage, "updated_at": utc_timestamp()})
+    if ws:
+        write_status(ws, {"status": "running", "stage": stage, "updated_at": utc_timestamp()})
 
-def run_prompt_1(title: str, event_guideline: str | None):
+def build_prompt_1(title: str, event_guideline: str | None) -> str:
     p1 = read_text(PROMPT_1_PATH)
-    log_stage("PROMPT_1_START")
     prompt1 = p1.replace("<INSERISCI TITOLO DEL JOURNEY>", title)
-    prompt1 = prompt1.replace(
+    return prompt1.replace(
         "<INSERISCI REGOLA EVENTI DALLA UI>",
         event_guideline.strip() if event_guideline else "",
     )
-    json_a = extract_json(responses_text(prompt1))
-    try:
-        PROMPT_1_OUT_PATH.write_text(json.dumps(json_a, ensure_ascii=False, indent=2), encoding="utf-8")
-    except Exception:
-        pass
-    log_stage("PROMPT_1_DONE")
+
+def run_prompt_1(ws: JobWorkspace, title: str, event_guideline: str | None):
+    prompt1 = build_prompt_1(title, event_guideline)
+    log_stage("PROMPT_1_START", ws)
+    json_a = extract_json(responses_text(prompt1, "PROMPT_1"))
+    write_json(ws.prompt_1_out, json_a)
+    update_inputs(ws, title=title, event_guideline=event_guideline or "")
+    log_stage("PROMPT_1_DONE", ws)
     return json_a
 
 def build_style_rules(audience: str, styles: str, detail_level: str) -> str:
@@ -215,49 +469,280 @@ def build_style_rules(audience: str, styles: str, detail_level: str) -> str:
     return "\n".join(lines)
 
 
-def run_prompt_2(audience: str, styles: str, detail_level: str, json_a: dict):
+def build_prompt_2(
+    audience: str,
+    styles: str,
+    detail_level: str,
+    json_a: dict,
+    event_guidelines: dict | None = None,
+    extra_note: str = "",
+) -> tuple[str, str]:
     p2 = read_text(PROMPT_2_PATH)
-    log_stage("PROMPT_2_START")
     style_rules = build_style_rules(audience, styles, detail_level)
-    global LAST_STYLE_RULES
-    LAST_STYLE_RULES = style_rules
+    payload = project_payload("PROMPT_2", json_a, event_guidelines)
+    notes = [extra_note] if extra_note else []
+    if any(EVENT_GUIDELINE_FIELD in ev for ev in payload["events"]):
+        notes.append(EVENT_GUIDELINE_NOTE)
     prompt2 = (
         p2.replace("<INSERISCI TARGET DALLA UI>", audience)
           .replace("<INSERISCI STILI DALLA UI>", styles)
           .replace("<INSERISCI LIVELLO DETTAGLIO DALLA UI>", detail_level)
           .replace("<REGOLE_STILISTICHE_DA_UI>", style_rules)
+        + "".join("\n\n" + note for note in notes)
         + "\n\nJSON_INPUT_PROMPT_1=\n"
-        + json.dumps(json_a, ensure_ascii=False)
+        + compact_json(payload)
     )
-    raw = responses_text(prompt2)
+    return prompt2, style_rules
+
+def prompt_2_json(prompt2: str) -> dict:
+    raw = responses_text(prompt2, "PROMPT_2")
     if raw.strip().startswith("TASK FAILED"):
         print("TASK_FAILED_OUTPUT:" + json.dumps({"text": raw[:2000]}, ensure_ascii=False), flush=True)
         raise RuntimeError(f"{raw.strip()} returned by model.")
-    json_b = extract_json(raw)
-    try:
-        PROMPT_2_OUT_PATH.write_text(json.dumps(json_b, ensure_ascii=False, indent=2), encoding="utf-8")
-    except Exception:
-        pass
-    log_stage("PROMPT_2_DONE")
+    return extract_json(raw)
+
+def run_prompt_2(
+    ws: JobWorkspace,
+    audience: str,
+    styles: str,
+    detail_level: str,
+    json_a: dict,
+    event_guidelines: dict | None = None,
+):
+    log_stage("PROMPT_2_START", ws)
+    prompt2, ws.style_rules = build_prompt_2(audience, styles, detail_level, json_a, event_guidelines)
+    json_b = prompt_2_json(prompt2)
+    write_json(ws.prompt_2_out, json_b)
+    update_inputs(ws, **style_inputs(audience, styles, detail_level, event_guidelines))
+    log_stage("PROMPT_2_DONE", ws)
     return json_b
 
-def run_prompt_3(json_b: dict):
+def style_inputs(audience: str, styles: str, detail_level: str, event_guidelines: dict | None) -> dict:
+    return {
+        "audience": audience,
+        "styles": styles,
+        "detail_level": detail_level,
+        "event_guidelines": event_guidelines or {},
+    }
+
+def build_prompt_3(json_b: dict) -> str:
     p3 = read_text(PROMPT_3_PATH)
-    log_stage("PROMPT_3_START")
-    prompt3 = (
+    return (
         p3
         + "\n\nJSON_INPUT_PROMPT_2=\n"
-        + json.dumps(json_b, ensure_ascii=False)
+        + compact_json(project_payload("PROMPT_3", json_b))
     )
-    log_stage("PROMPT_3_DONE")
-    json_c = responses_json(prompt3)
-    log_stage("JSON_OUTPUT_READY")
+
+def finish_prompt_3(json_c: dict, json_b: dict) -> dict:
+    if splice_descriptions():
+        json_c = splice_prompt_3(json_c, json_b)
     return json_c
 
-def run_pipeline(title: str, audience: str, styles: str, detail_level: str, event_guideline: str | None):
-    json_a = run_prompt_1(title, event_guideline)
-    json_b = run_prompt_2(audience, styles, detail_level, json_a)
-    return run_prompt_3(json_b)
+def run_prompt_3(ws: JobWorkspace, json_b: dict):
+    log_stage("PROMPT_3_START", ws)
+    prompt3 = build_prompt_3(json_b)
+    json_c = finish_prompt_3(responses_json(prompt3, "PROMPT_3"), json_b)
+    write_json(ws.prompt_3_out, json_c)
+    log_stage("PROMPT_3_DONE", ws)
+    log_stage("JSON_OUTPUT_READY", ws)
+    return json_c
+
+def run_pipeline(
+    ws: JobWorkspace,
+    title: str,
+    audience: str,
+    styles: str,
+    detail_level: str,
+    event_guideline: str | None,
+    event_guidelines: dict | None = None,
+):
+    json_a = run_prompt_1(ws, title, event_guideline)
+    json_b = run_prompt_2(ws, audience, styles, detail_level, json_a, event_guidelines)
+    return run_prompt_3(ws, json_b)
+
+# =========================
+# RIGENERAZIONE INCREMENTALE
+# =========================
+# Confronta i nuovi parametri con OUTPUT_INPUTS.json e gli OUTPUT_PROMPT_*.json del workspace:
+# - titolo e regola eventi invariati -> si riusa l'elenco eventi del PROMPT 1;
+# - target/stili/dettaglio invariati -> il PROMPT 2 riceve solo gli eventi nuovi, modificati o con indicazione cambiata;
+# - il PROMPT 3 riceve solo gli eventi la cui proiezione è cambiata; le altre righe e il journey si riusano.
+# Il risultato è sempre ricomposto nell'ordine degli eventi del PROMPT 1.
+
+
+def event_key(stage: str, ev: dict, note: str = "") -> str:
+    return compact_json(project_fields(ev, STAGE_INPUT_FIELDS[stage]["events"])) + "\x1f" + note
+
+
+def index_by_key(keys: list[str], items: list[dict]) -> dict[str, list[dict]]:
+    # Titoli duplicati sono possibili: ogni chiave tiene una coda di candidati.
+    out: dict[str, list[dict]] = {}
+    for key, item in zip(keys, items):
+        out.setdefault(key, []).append(item)
+    return out
+
+
+def match_partial(requested: list[dict], returned: list[dict], title_key: str) -> list[dict] | None:
+    # 1 evento in input = 1 evento in output; se il modello non la rispetta si abbina per titolo.
+    if len(requested) == len(returned):
+        return returned
+    by_title = {row.get(title_key): row for row in returned}
+    matched = [by_title.get(ev.get("titolo_evento_it")) for ev in requested]
+    return None if any(row is None for row in matched) else matched
+
+
+def incremental_prompt_2(
+    ws: JobWorkspace,
+    previous: dict,
+    audience: str,
+    styles: str,
+    detail_level: str,
+    json_a: dict,
+    event_guidelines: dict,
+) -> tuple[dict, int]:
+    prev_b = read_json(ws.prompt_2_out)
+    events = json_a.get("events") or []
+    same_style = all(
+        previous.get(key) == value
+        for key, value in (("audience", audience), ("styles", styles), ("detail_level", detail_level))
+    )
+    title_fields = STAGE_INPUT_FIELDS["PROMPT_2"]["journey"]
+    # Nuovo titolo del journey = nuova descrizione introduttiva: serve il PROMPT 2 completo.
+    if not prev_b or not same_style or project_fields(prev_b, title_fields) != project_fields(json_a, title_fields):
+        return run_prompt_2(ws, audience, styles, detail_level, json_a, event_guidelines), len(events)
+
+    prev_notes = previous.get("event_guidelines") or {}
+    prev_events = prev_b.get("events") or []
+    reusable = index_by_key(
+        [event_key("PROMPT_2", ev, prev_notes.get(ev.get("titolo_evento_it"), "")) for ev in prev_events], prev_events
+    )
+    merged: list[dict | None] = []
+    affected: list[int] = []
+    for idx, ev in enumerate(events):
+        candidates = reusable.get(event_key("PROMPT_2", ev, event_guidelines.get(ev.get("titolo_evento_it"), "")))
+        merged.append(candidates.pop(0) if candidates else None)
+        if merged[-1] is None:
+            affected.append(idx)
+
+    # Eventi aggiunti o tolti: la descrizione del journey va riscritta, non può restare quella vecchia.
+    titles = sorted(str(ev.get("titolo_evento_it") or "") for ev in events)
+    events_changed = titles != sorted(str(ev.get("titolo_evento_it") or "") for ev in prev_events)
+    if events_changed and not affected:
+        print("INCREMENTAL_FALLBACK:" + json.dumps({"stage": "PROMPT_2", "reason": "events removed"}), flush=True)
+        return run_prompt_2(ws, audience, styles, detail_level, json_a, event_guidelines), len(events)
+
+    journey_update: dict = {}
+    if affected:
+        log_stage("PROMPT_2_START", ws)
+        requested = [events[i] for i in affected]
+        others = [ev.get("titolo_evento_it", "") for i, ev in enumerate(events) if i not in set(affected)]
+        prompt2, ws.style_rules = build_prompt_2(
+            audience,
+            styles,
+            detail_level,
+            {**json_a, "events": requested},
+            event_guidelines,
+            (PARTIAL_PROMPT_2_JOURNEY_NOTE if events_changed else PARTIAL_PROMPT_2_NOTE).format(others=compact_json(others))
+            if others
+            else "",
+        )
+        partial = prompt_2_json(prompt2)
+        rows = match_partial(requested, partial.get("events") or [], "titolo_evento_it")
+        if rows is None:
+            print("INCREMENTAL_FALLBACK:" + json.dumps({"stage": "PROMPT_2", "reason": "event mismatch"}), flush=True)
+            return run_prompt_2(ws, audience, styles, detail_level, json_a, event_guidelines), len(events)
+        if events_changed:
+            journey_update = {key: partial.get(key) for key in JOURNEY_DESCRIPTION_FIELDS}
+            if not all(journey_update.values()):
+                print("INCREMENTAL_FALLBACK:" + json.dumps({"stage": "PROMPT_2", "reason": "journey description"}), flush=True)
+                return run_prompt_2(ws, audience, styles, detail_level, json_a, event_guidelines), len(events)
+        for idx, row in zip(affected, rows):
+            merged[idx] = row
+        log_stage("PROMPT_2_DONE", ws)
+    else:
+        ws.style_rules = build_style_rules(audience, styles, detail_level)
+
+    json_b = {**prev_b, **journey_update, "events": merged}
+    write_json(ws.prompt_2_out, json_b)
+    update_inputs(ws, **style_inputs(audience, styles, detail_level, event_guidelines))
+    return json_b, len(affected)
+
+
+def incremental_prompt_3(ws: JobWorkspace, previous_b: dict | None, json_b: dict) -> tuple[dict, int]:
+    prev_c = read_json(ws.prompt_3_out)
+    events = json_b.get("events") or []
+    journey_fields = STAGE_INPUT_FIELDS["PROMPT_3"]["journey"]
+    if (
+        not prev_c
+        or not previous_b
+        or project_fields(previous_b, journey_fields) != project_fields(json_b, journey_fields)
+        or len(prev_c.get("events") or []) != len(previous_b.get("events") or [])
+    ):
+        return run_prompt_3(ws, json_b), len(events)
+
+    prev_events = previous_b.get("events") or []
+    reusable = index_by_key([event_key("PROMPT_3", ev) for ev in prev_events], prev_c.get("events") or [])
+    rows: list[dict | None] = []
+    affected: list[int] = []
+    for idx, ev in enumerate(events):
+        candidates = reusable.get(event_key("PROMPT_3", ev))
+        rows.append(dict(candidates.pop(0)) if candidates else None)
+        if rows[-1] is None:
+            affected.append(idx)
+
+    if affected:
+        log_stage("PROMPT_3_START", ws)
+        requested = [events[i] for i in affected]
+        partial = responses_json(build_prompt_3({**json_b, "events": requested}), "PROMPT_3")
+        matched = match_partial(requested, partial.get("events") or [], "Titolo evento IT")
+        if matched is None:
+            print("INCREMENTAL_FALLBACK:" + json.dumps({"stage": "PROMPT_3", "reason": "event mismatch"}), flush=True)
+            return run_prompt_3(ws, json_b), len(events)
+        for idx, row in zip(affected, matched):
+            rows[idx] = row
+        log_stage("PROMPT_3_DONE", ws)
+    json_c = finish_prompt_3({**prev_c, "events": rows}, json_b)
+    write_json(ws.prompt_3_out, json_c)
+    log_stage("JSON_OUTPUT_READY", ws)
+    return json_c, len(affected)
+
+
+def run_pipeline_incremental(
+    ws: JobWorkspace,
+    title: str,
+    audience: str,
+    styles: str,
+    detail_level: str,
+    event_guideline: str | None,
+    event_guidelines: dict | None = None,
+):
+    previous = read_json(ws.inputs_out) or {}
+    event_guidelines = event_guidelines or {}
+    prev_a = read_json(ws.prompt_1_out)
+    previous_b = read_json(ws.prompt_2_out)
+    reuse_events = (
+        prev_a is not None
+        and previous.get("title") == title
+        and previous.get("event_guideline", "") == (event_guideline or "")
+    )
+    # Anche con un nuovo elenco eventi le descrizioni degli eventi rimasti identici si riusano.
+    json_a = prev_a if reuse_events else run_prompt_1(ws, title, event_guideline)
+    json_b, regenerated_2 = incremental_prompt_2(ws, previous, audience, styles, detail_level, json_a, event_guidelines)
+    json_c, regenerated_3 = incremental_prompt_3(ws, previous_b, json_b)
+    total = len(json_b.get("events") or [])
+    print(
+        "INCREMENTAL:"
+        + json.dumps(
+            {
+                "prompt_1": "reused" if reuse_events else "regenerated",
+                "prompt_2_events": regenerated_2,
+                "prompt_3_events": regenerated_3,
+                "events": total,
+            }
+        ),
+        flush=True,
+    )
+    return json_c
 
 # =========================
 # CLI
@@ -274,35 +759,45 @@ def main():
     parser.add_argument("--styles", required=True)
     parser.add_argument("--detail-level", required=True)
     parser.add_argument("--event-guideline")
+    parser.add_argument("--event-guidelines", help="JSON (file o inline) {titolo_evento_it: indicazione} per singoli eventi")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Riusa gli OUTPUT_PROMPT_*.json del workspace e rigenera solo gli eventi toccati dalle modifiche",
+    )
     parser.add_argument("--status-file")
     parser.add_argument("--step", choices=["1", "2", "3"])
+    parser.add_argument("--job-id", help="Workspace isolato in NEW_JOURNEY_JOBS_DIR/<job-id>; --step 2/3 leggono da lì")
     args = parser.parse_args()
 
-    global STATUS_FILE
-    if args.status_file:
-        STATUS_FILE = Path(args.status_file)
+    ws = job_workspace(args.job_id, args.status_file)
+    prune_jobs(ws.root)
+    event_guidelines = load_event_guidelines(args.event_guidelines)
 
     try:
         if args.step == "1":
-            payload = run_prompt_1(args.title, args.event_guideline)
+            payload = run_prompt_1(ws, args.title, args.event_guideline)
         elif args.step == "2":
-            if not PROMPT_1_OUT_PATH.exists():
-                raise RuntimeError("Missing OUTPUT_PROMPT_1.json")
-            json_a = json.loads(PROMPT_1_OUT_PATH.read_text(encoding="utf-8"))
-            payload = run_prompt_2(args.audience, args.styles, args.detail_level, json_a)
+            if not ws.prompt_1_out.exists():
+                raise RuntimeError(f"Missing {PROMPT_1_OUT_NAME}")
+            json_a = json.loads(ws.prompt_1_out.read_text(encoding="utf-8"))
+            payload = run_prompt_2(ws, args.audience, args.styles, args.detail_level, json_a, event_guidelines)
         elif args.step == "3":
-            if not PROMPT_2_OUT_PATH.exists():
-                raise RuntimeError("Missing OUTPUT_PROMPT_2.json")
-            json_b = json.loads(PROMPT_2_OUT_PATH.read_text(encoding="utf-8"))
-            payload = run_prompt_3(json_b)
+            if not ws.prompt_2_out.exists():
+                raise RuntimeError(f"Missing {PROMPT_2_OUT_NAME}")
+            json_b = json.loads(ws.prompt_2_out.read_text(encoding="utf-8"))
+            payload = run_prompt_3(ws, json_b)
         else:
-            payload = run_pipeline(args.title, args.audience, args.styles, args.detail_level, args.event_guideline)
-        write_status({"status": "done", "stage": "done", "updated_at": utc_timestamp()})
-        if LAST_STYLE_RULES:
-            print("STYLE_RULES:" + json.dumps({"rules": LAST_STYLE_RULES}, ensure_ascii=False))
+            pipeline = run_pipeline_incremental if args.incremental else run_pipeline
+            payload = pipeline(
+                ws, args.title, args.audience, args.styles, args.detail_level, args.event_guideline, event_guidelines
+            )
+        write_status(ws, {"status": "done", "stage": "done", "updated_at": utc_timestamp()})
+        if ws.style_rules:
+            print("STYLE_RULES:" + json.dumps({"rules": ws.style_rules}, ensure_ascii=False))
         print("JSON_RESULT:" + json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
     except Exception as exc:
-        write_status({"status": "error", "stage": "error", "error": str(exc), "updated_at": utc_timestamp()})
+        write_status(ws, {"status": "error", "stage": "error", "error": str(exc), "updated_at": utc_timestamp()})
         raise
 
 if __name__ == "__main__":
@@ -14,6 +14,7 @@ type PromptPayload = {
   detailLevel?: string;
   eventGuideline?: string;
   step?: "1" | "2" | "3";
+  workspaceId?: string;
 };
 
 type JobStatus = {
@@ -29,6 +30,7 @@ type JobStatus = {
 };
 
 const jobStatusStore = new Map<string, JobStatus>();
+const WORKSPACE_ID_RE = /^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$/;
 
 const parseStage = (stdout?: string | null) => {
   if (!stdout) return null;
@@ -126,13 +128,19 @@ export async function POST(req: Request) {
   const detailLevel = payload.detailLevel?.trim();
   const step = payload.step;
   const eventGuideline = payload.eventGuideline?.trim();
+  const requestedWorkspaceId = payload.workspaceId?.trim();
 
   if (!title || !audience || styles.length === 0 || !detailLevel || !eventGuideline) {
     return NextResponse.json({ error: "Missing title, audience, styles, detail level, or event guideline." }, { status: 400 });
   }
+  if (requestedWorkspaceId && !WORKSPACE_ID_RE.test(requestedWorkspaceId)) {
+    return NextResponse.json({ error: "Invalid workspaceId." }, { status: 400 });
+  }
 
   const scriptPath = buildScriptPath();
   const jobId = crypto.randomUUID();
+  // Steps 2/3 reuse the workspace of step 1 so concurrent jobs never share intermediate files.
+  const workspaceId = requestedWorkspaceId || jobId;
   const args = [scriptPath, "--title", title, "--audience", audience];
   args.push("--styles", styles.join(", "));
   args.push("--detail-level", detailLevel);
@@ -142,6 +150,7 @@ export async function POST(req: Request) {
   if (step) {
     args.push("--step", step);
   }
+  args.push("--job-id", workspaceId);
 
   let stdout = "";
   let stderr = "";
@@ -200,7 +209,7 @@ export async function POST(req: Request) {
     });
   });
 
-  return NextResponse.json({ ok: true, jobId, step });
+  return NextResponse.json({ ok: true, jobId, workspaceId, step });
 }
 
 export async function GET(req: Request) {
@@ -751,6 +751,7 @@ export default function BuildJourneyPage() {
   const newJourneyTokenRef = useRef<string | null>(null);
   const newJourneyRefreshRef = useRef<number | null>(null);
   const newJourneyStepRef = useRef<"1" | "2" | "3" | null>(null);
+  const newJourneyWorkspaceRef = useRef<string | null>(null);
   const newJourneyTimerRef = useRef<number | null>(null);
   const newJourneyTotalTimerRef = useRef<number | null>(null);
   const newJourneyTotalStartRef = useRef<number | null>(null);
@@ -3928,6 +3929,7 @@ export default function BuildJourneyPage() {
           detailLevel: newJourneyDetailLevel,
           eventGuideline: newJourneyEventGuideline.trim() || undefined,
           step,
+          workspaceId: step === "2" || step === "3" ? newJourneyWorkspaceRef.current || undefined : undefined,
         }),
       });
       const data = await response.json().catch(() => ({}));
@@ -3949,6 +3951,7 @@ export default function BuildJourneyPage() {
         throw new Error("Job ID mancante.");
       }
       newJourneyTokenRef.current = accessToken;
+      newJourneyWorkspaceRef.current = data.workspaceId ?? null;
       setNewJourneyJobId(data.jobId);
       startNewJourneyPolling(data.jobId);
     } catch (err: any) {
@@ -0,0 +1,301 @@
+# Offline benchmark for the reel (main.py) and journey (PROMPT/new_journey.py) pipelines.
+#
+# USO:
+# python frontend/benchmarks/bench_pipelines.py
+# python frontend/benchmarks/bench_pipelines.py --scenario reel-4s-draft --save-baseline
+# python frontend/benchmarks/bench_pipelines.py --check
+#
+# Model calls go to stub_openai.py (canned data after configurable delays), media comes
+# from FFmpeg lavfi sources. Each scenario runs in its own Python process so CPU time and
+# peak memory are measured per scenario.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BENCH_DIR = Path(__file__).resolve().parent
+FRONTEND_DIR = BENCH_DIR.parent
+PROMPT_DIR = FRONTEND_DIR / "PROMPT"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+DEFAULT_DELAYS = {"responses": 0.2, "videos": 0.5, "speech": 0.2}
+
+SCENARIOS: dict[str, dict[str, Any]] = {
+    "journey-10": {"pipeline": "journey", "events": 10},
+    "journey-50": {"pipeline": "journey", "events": 50},
+    "reel-4s-draft": {"pipeline": "reel", "scene_seconds": 4, "render_profile": "draft", "video_source": "sora"},
+    "reel-8s-draft": {"pipeline": "reel", "scene_seconds": 8, "render_profile": "draft", "video_source": "sora"},
+    "reel-4s-final": {"pipeline": "reel", "scene_seconds": 4, "render_profile": "final", "video_source": "sora"},
+    "reel-4s-draft-tts-blocks": {
+        "pipeline": "reel",
+        "scene_seconds": 4,
+        "render_profile": "draft",
+        "video_source": "sora",
+        "tts_mode": "blocks",
+    },
+    "reel-4s-draft-3aspects": {
+        "pipeline": "reel",
+        "scene_seconds": 4,
+        "render_profile": "draft",
+        "video_source": "sora",
+        "aspects": "9:16,1:1,16:9",
+    },
+}
+
+# Stage timings below this many seconds are too noisy to flag as regressions.
+MIN_STAGE_SEC = 0.05
+
+
+# =========================
+# WORKER (one scenario, in-process)
+# =========================
+class StageRecorder:
+    def __init__(self):
+        self.marks: list[tuple[str, float, float, float]] = []
+
+    def mark(self, stage: str) -> None:
+        self.marks.append((stage, time.perf_counter(), time.process_time(), children_cpu()))
+
+    def stages(self) -> dict[str, dict[str, float]]:
+        out: dict[str, dict[str, float]] = {}
+        for (stage, wall, cpu, child), (_, next_wall, next_cpu, next_child) in zip(self.marks, self.marks[1:]):
+            entry = out.setdefault(stage, {"wall_sec": 0.0, "cpu_sec": 0.0})
+            entry["wall_sec"] = round(entry["wall_sec"] + next_wall - wall, 4)
+            entry["cpu_sec"] = round(entry["cpu_sec"] + (next_cpu - cpu) + (next_child - child), 4)
+        return out
+
+
+def children_cpu() -> float:
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def peak_rss_mb() -> dict[str, float | None]:
+    if resource is None:
+        return {"self_mb": None, "children_mb": None}
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def wrap_log_stage(module: Any, recorder: StageRecorder) -> None:
+    original = module.log_stage
+
+    def log_stage(name: str, *args: Any) -> None:
+        recorder.mark(name)
+        original(name, *args)
+
+    module.log_stage = log_stage
+
+
+def run_journey(scenario: dict[str, Any], tmp_dir: Path, recorder: StageRecorder) -> dict[str, Any]:
+    sys.path.insert(0, str(PROMPT_DIR))
+    import new_journey
+
+    # Keep the canned OUTPUT_PROMPT_*.json in the repo untouched.
+    ws = new_journey.JobWorkspace(tmp_dir)
+    wrap_log_stage(new_journey, recorder)
+    payload = new_journey.run_pipeline(
+        ws,
+        "Benchmark Journey",
+        scenario.get("audience", "Studenti"),
+        scenario.get("styles", "Narrativo"),
+        scenario.get("detail_level", "medio"),
+        "Eventi principali",
+    )
+    return {"events_out": len(payload.get("events") or [])}
+
+
+def run_reel(scenario: dict[str, Any], tmp_dir: Path, recorder: StageRecorder) -> dict[str, Any]:
+    os.environ["REEL_SCENE_SECONDS"] = str(scenario.get("scene_seconds", 4))
+    os.environ["REEL_RENDER_PROFILE"] = scenario.get("render_profile", "final")
+    os.environ["REEL_ASPECTS"] = scenario.get("aspects", "9:16")
+    os.environ["REEL_TTS_MODE"] = scenario.get("tts_mode", "single")
+    sys.path.insert(0, str(FRONTEND_DIR))
+    import main
+
+    main.OUTPUT_DIR = tmp_dir / "output"
+    wrap_log_stage(main, recorder)
+    output = main.run_pipeline("Benchmark Reel", video_source=scenario.get("video_source", "hybrid"))
+    return {"output_bytes": output.stat().st_size}
+
+
+def run_worker(name: str, scenario: dict[str, Any], delays: dict[str, float]) -> dict[str, Any]:
+    sys.path.insert(0, str(BENCH_DIR))
+    import stub_openai
+
+    os.environ["OPENAI_API_KEY"] = "bench-stub"
+    for key in ("GOOGLE_EARTH_STUDIO_AERIAL_MP4", "GOOGLE_EARTH_STUDIO_ASSET_DIR"):
+        os.environ.pop(key, None)
+    stub_openai.install()
+    tmp_dir = Path(tempfile.mkdtemp(prefix="geohistory_bench_"))
+    try:
+        return measure(name, scenario, delays, tmp_dir, stub_openai)
+    finally:
+        # Reel scenarios leave hundreds of MB of clips behind.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def measure(name: str, scenario: dict[str, Any], delays: dict[str, float], tmp_dir: Path, stub_openai: Any) -> dict[str, Any]:
+    stub_openai.configure(delays, events=scenario.get("events", 52), work_dir=str(tmp_dir / "stub"))
+    # Private limiter state so parallel benchmark runs do not share buckets with real jobs.
+    os.environ["OPENAI_RATE_LIMIT_DB"] = str(tmp_dir / "rate_limit.sqlite")
+    # Same for Sora jobs; stub renders finish within DELAYS["videos"], so poll at a matching pace.
+    os.environ["SORA_JOBS_DB"] = str(tmp_dir / "sora_jobs.sqlite")
+    os.environ["SORA_POLL_MIN_SEC"] = "0.2"
+
+    recorder = StageRecorder()
+    tracemalloc.start()
+    wall0, cpu0, child0 = time.perf_counter(), time.process_time(), children_cpu()
+    recorder.mark("START")
+    runner = run_journey if scenario["pipeline"] == "journey" else run_reel
+    extra = runner(scenario, tmp_dir, recorder)
+    recorder.mark("END")
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stages = recorder.stages()
+    stages.pop("START", None)
+
+    return {
+        "scenario": name,
+        "params": scenario,
+        "total": {
+            "wall_sec": round(time.perf_counter() - wall0, 4),
+            "cpu_sec": round((time.process_time() - cpu0) + (children_cpu() - child0), 4),
+        },
+        "stages": stages,
+        "memory": {"python_peak_mb": round(py_peak / (1024 * 1024), 2), **peak_rss_mb()},
+        "calls": dict(stub_openai.CALLS),
+        **extra,
+    }
+
+
+# =========================
+# DRIVER
+# =========================
+def run_scenario(name: str, delays: dict[str, float]) -> dict[str, Any]:
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--worker", name, "--delays", json.dumps(delays)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8", check=False)
+    marker = "BENCH_RESULT:"
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(marker):
+            return json.loads(line[len(marker):])
+    return {"scenario": name, "error": (proc.stderr or proc.stdout)[-4000:]}
+
+
+def compare(results: list[dict[str, Any]], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    regressions: list[str] = []
+    previous = {r["scenario"]: r for r in baseline.get("results", [])}
+
+    def check(label: str, current: float | None, reference: float | None, floor: float) -> None:
+        if current is None or reference is None or reference < floor:
+            return
+        if current > reference * (1.0 + tolerance) + floor:
+            regressions.append(f"{label}: {current} > {reference} (+{tolerance:.0%})")
+
+    for result in results:
+        name = result["scenario"]
+        ref = previous.get(name)
+        if "error" in result:
+            continue
+        if not ref or "error" in ref:
+            # A scenario with nothing to compare against fails the check instead of passing silently.
+            regressions.append(f"{name}: no reference in the baseline (run it with --save-baseline)")
+            continue
+        check(f"{name} total.wall_sec", result["total"]["wall_sec"], ref["total"]["wall_sec"], MIN_STAGE_SEC)
+        check(f"{name} total.cpu_sec", result["total"]["cpu_sec"], ref["total"]["cpu_sec"], MIN_STAGE_SEC)
+        for stage, timing in result["stages"].items():
+            ref_timing = ref["stages"].get(stage)
+            if ref_timing:
+                check(f"{name} {stage}.wall_sec", timing["wall_sec"], ref_timing["wall_sec"], MIN_STAGE_SEC)
+        for key in ("python_peak_mb", "children_mb"):
+            check(f"{name} memory.{key}", result["memory"].get(key), ref["memory"].get(key), 1.0)
+    return regressions
+
+
+def save_baseline(path: Path, report: dict[str, Any]) -> int:
+    # Merge by scenario name: saving one scenario must not drop the references of the others.
+    baseline = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    if baseline.get("results") and baseline.get("delays") != report["delays"]:
+        print(f"Baseline not saved: {path} was recorded with delays {baseline.get('delays')}.", file=sys.stderr)
+        return 1
+    merged = {r["scenario"]: r for r in baseline.get("results", [])}
+    merged.update({r["scenario"]: r for r in report["results"]})
+    path.write_text(json.dumps({**report, "results": list(merged.values())}, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Repeatable; default: all")
+    parser.add_argument("--delays", default=json.dumps(DEFAULT_DELAYS), help='JSON, e.g. {"videos": 2.0}')
+    parser.add_argument("--out", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="Exit 1 when a metric regresses against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    delays = {**DEFAULT_DELAYS, **json.loads(args.delays)}
+
+    if args.worker:
+        result = run_worker(args.worker, SCENARIOS[args.worker], delays)
+        print("BENCH_RESULT:" + json.dumps(result, ensure_ascii=False), flush=True)
+        return 0
+
+    names = args.scenario or list(SCENARIOS)
+    results = []
+    for name in names:
+        print(f"BENCH:{name}", file=sys.stderr, flush=True)
+        results.append(run_scenario(name, delays))
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "delays": delays,
+        "results": results,
+    }
+
+    baseline_path = Path(args.baseline)
+    exit_code = 1 if any("error" in r for r in results) else 0
+    if args.check and not baseline_path.exists():
+        # Nothing to compare against is a failed check, not a passed one.
+        print(f"No baseline at {baseline_path}; run with --save-baseline first.", file=sys.stderr)
+        exit_code = 1
+    if args.check and baseline_path.exists():
+        regressions = compare(results, json.loads(baseline_path.read_text(encoding="utf-8")), args.tolerance)
+        report["regressions"] = regressions
+        if regressions:
+            exit_code = 1
+    failed = [r["scenario"] for r in results if "error" in r]
+    if args.save_baseline and failed:
+        print(f"Baseline not saved: scenarios failed: {', '.join(failed)}", file=sys.stderr)
+    elif args.save_baseline:
+        exit_code = save_baseline(baseline_path, report) or exit_code
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,352 @@
+import io
+import json
+import subprocess
+import sys
+import time
+import types
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+FRONTEND_DIR = Path(__file__).resolve().parent.parent
+PROMPT_DIR = FRONTEND_DIR / "PROMPT"
+
+# Seconds slept before each stubbed call returns; overridden per scenario via configure().
+DELAYS: dict[str, float] = {"responses": 0.0, "videos": 0.0, "speech": 0.0, "batches": 0.0}
+# batch_fail_every / video_fail_every: every Nth batch request / video render fails (0 = never).
+SETTINGS: dict[str, Any] = {
+    "events": 52,
+    "video_size": "1080x1920",
+    "work_dir": None,
+    "batch_fail_every": 0,
+    "video_fail_every": 0,
+}
+CALLS: dict[str, int] = {"responses": 0, "videos": 0, "speech": 0, "batches": 0}
+
+
+def configure(delays: dict[str, float] | None = None, **settings: Any) -> None:
+    DELAYS.update(delays or {})
+    SETTINGS.update(settings)
+
+
+def work_dir() -> Path:
+    path = Path(SETTINGS["work_dir"] or FRONTEND_DIR / "output" / "_bench_stub")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def ffmpeg(args: list[str]) -> None:
+    proc = subprocess.run(["ffmpeg", "-y", *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Stub FFmpeg failed: {proc.stderr[-2000:]}")
+
+
+# =========================
+# CANNED JOURNEY DATA
+# =========================
+def canned_events(path: Path, count: int) -> dict[str, Any]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    source = data.get("events") or []
+    data["events"] = [dict(source[i % len(source)]) for i in range(count)] if source else []
+    return data
+
+
+def canned_prompt_3(json_b: dict[str, Any]) -> dict[str, Any]:
+    journey = {
+        "Titolo IT": json_b.get("journey_title_it", ""),
+        "Descrizione IT": json_b.get("journey_description_it", ""),
+        "Title EN": json_b.get("journey_title_en", ""),
+        "Description EN": json_b.get("journey_description_en", ""),
+    }
+    events = []
+    for ev in json_b.get("events") or []:
+        events.append(
+            {
+                "Journey IT": journey["Titolo IT"],
+                "Journey EN": journey["Title EN"],
+                "Era": ev.get("era"),
+                "From": ev.get("from"),
+                "To": ev.get("to"),
+                "Event date": ev.get("event_date", ""),
+                "Continent": ev.get("continent"),
+                "Country": ev.get("country"),
+                "Location": ev.get("location"),
+                "Lat": ev.get("lat"),
+                "Lon": ev.get("lon"),
+                "Titolo evento IT": ev.get("titolo_evento_it"),
+                "Wikipedia URL evento IT": ev.get("wikipedia_url_it"),
+                "Descrizione evento IT": ev.get("descrizione_evento_it"),
+                "Title event EN": ev.get("title_event_en"),
+                "Wikipedia URL event EN": ev.get("wikipedia_url_en"),
+                "Description event EN": ev.get("description_event_en"),
+                "Type events": ev.get("type_event"),
+                "Journey approfondimento 1": "",
+                "Journey approfondimento 2": "",
+                "Journey approfondimento 3": "",
+            }
+        )
+    return {"journey": [journey], "events": events}
+
+
+def canned_reel(prompt: str) -> dict[str, Any]:
+    blocks = []
+    for idx, title in enumerate(["Hook", "Connection", "Contemporary Event", "CTA finale"], start=1):
+        blocks.append(
+            {
+                "block": idx,
+                "title": title,
+                "text_en": f"Benchmark block {idx}",
+                "voiceover_en": f"Benchmark voiceover for block {idx}, long enough to sound like a real sentence.",
+                "visual_prompt_en": f"Benchmark visual for block {idx}",
+            }
+        )
+    return {
+        "event_1": "Benchmark event one",
+        "event_1_year": "1914",
+        "event_1_location": "Milano",
+        "event_2": "Benchmark event two",
+        "event_2_year": "1914",
+        "event_2_location": "Buenos Aires",
+        "hook_question_en": "What if?",
+        "overlap_period": "1914",
+        "music_mood_en": "calm",
+        "reel_blocks": blocks,
+    }
+
+
+def answer_for(prompt: str) -> dict[str, Any]:
+    if "JSON_INPUT_PROMPT_2=" in prompt:
+        payload = prompt.split("JSON_INPUT_PROMPT_2=", 1)[1]
+        return canned_prompt_3(json.loads(payload.strip()))
+    if "JSON_INPUT_PROMPT_1=" in prompt:
+        return canned_events(PROMPT_DIR / "OUTPUT_PROMPT_2.json", SETTINGS["events"])
+    if "reel_blocks" in prompt:
+        return canned_reel(prompt)
+    return canned_events(PROMPT_DIR / "OUTPUT_PROMPT_1.json", SETTINGS["events"])
+
+
+def response_object(text: str, prompt: str = "") -> SimpleNamespace:
+    content = SimpleNamespace(type="output_text", text=text)
+    message = SimpleNamespace(type="message", content=[content])
+    # Rough 4-chars-per-token estimate, enough for relative comparisons.
+    usage = SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=len(text) // 4)
+    return SimpleNamespace(output=[message], output_text=text, usage=usage)
+
+
+# =========================
+# STUB CLIENT
+# =========================
+class StubResponses:
+    def create(self, model: str, input: Any, **kwargs: Any) -> SimpleNamespace:
+        CALLS["responses"] += 1
+        time.sleep(DELAYS["responses"])
+        prompt = input if isinstance(input, str) else "\n".join(str(m.get("content", "")) for m in input)
+        return response_object(json.dumps(answer_for(prompt), ensure_ascii=False), prompt)
+
+
+class StubContent:
+    def __init__(self, path: Path):
+        self.path = path
+
+    def write_to_file(self, file: str) -> None:
+        Path(file).write_bytes(self.path.read_bytes())
+
+
+class StubVideos:
+    # create()/retrieve() behave like the async video API: a render completes DELAYS["videos"] seconds
+    # after submission, wall clock. Jobs are kept on disk, so a restarted process can re-attach to them.
+    def __init__(self):
+        self.jobs: dict[str, dict[str, Any]] = {}
+
+    def job_path(self, video_id: str) -> Path:
+        return work_dir() / "videos" / f"{video_id}.json"
+
+    def load(self, video_id: str) -> dict[str, Any]:
+        if video_id not in self.jobs:
+            path = self.job_path(video_id)
+            if not path.exists():
+                raise RuntimeError(f"Stub video not found: {video_id}")
+            self.jobs[video_id] = json.loads(path.read_text(encoding="utf-8"))
+        return self.jobs[video_id]
+
+    def create(self, model: str, prompt: str, seconds: str = "4", **kwargs: Any) -> SimpleNamespace:
+        CALLS["videos"] += 1
+        video_id = f"video_stub_{uuid.uuid4().hex[:12]}"
+        fail_every = int(SETTINGS.get("video_fail_every") or 0)
+        job = {
+            "seconds": int(seconds),
+            "created_at": time.time(),
+            "fail": bool(fail_every and CALLS["videos"] % fail_every == 0),
+        }
+        self.jobs[video_id] = job
+        path = self.job_path(video_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(job), encoding="utf-8")
+        return SimpleNamespace(id=video_id, status="queued", progress=0, seconds=seconds, model=model)
+
+    def retrieve(self, video_id: str, **kwargs: Any) -> SimpleNamespace:
+        job = self.load(video_id)
+        elapsed = time.time() - job["created_at"]
+        progress = 100 if DELAYS["videos"] <= 0 else min(100, int(elapsed / DELAYS["videos"] * 100))
+        if progress >= 100:
+            if job["fail"]:
+                error = SimpleNamespace(code="stub_failure", message="Stub render failure")
+                return SimpleNamespace(id=video_id, status="failed", progress=progress, error=error)
+            return SimpleNamespace(id=video_id, status="completed", progress=100, error=None)
+        return SimpleNamespace(id=video_id, status="in_progress" if progress else "queued", progress=progress, error=None)
+
+    def create_and_poll(self, model: str, prompt: str, seconds: str = "4", **kwargs: Any) -> SimpleNamespace:
+        CALLS["videos"] += 1
+        time.sleep(DELAYS["videos"])
+        video_id = f"video_stub_{CALLS['videos']}"
+        self.jobs[video_id] = {"seconds": int(seconds)}
+        return SimpleNamespace(id=video_id, status="completed", seconds=seconds, model=model)
+
+    def download_content(self, video_id: str, **kwargs: Any) -> StubContent:
+        seconds = self.load(video_id).get("seconds", 4)
+        clip = work_dir() / f"stub_sora_{seconds}s_{SETTINGS['video_size']}.mp4"
+        if not clip.exists():
+            ffmpeg(
+                [
+                    "-f",
+                    "lavfi",
+                    "-i",
+                    f"testsrc2=s={SETTINGS['video_size']}:r=30:d={seconds}",
+                    "-c:v",
+                    "libx264",
+                    "-preset",
+                    "ultrafast",
+                    "-pix_fmt",
+                    "yuv420p",
+                    str(clip),
+                ]
+            )
+        return StubContent(clip)
+
+
+class StubSpeechStream:
+    def __init__(self, text: str):
+        self.text = text
+
+    def __enter__(self) -> "StubSpeechStream":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+    def stream_to_file(self, file: str) -> None:
+        duration = max(2, len(self.text.split()) // 3)
+        ffmpeg(
+            [
+                "-f",
+                "lavfi",
+                "-i",
+                f"sine=frequency=440:sample_rate=44100:duration={duration}",
+                "-q:a",
+                "9",
+                "-acodec",
+                "libmp3lame",
+                file,
+            ]
+        )
+
+
+class StubStreamingSpeech:
+    def create(self, model: str, voice: str, input: str, **kwargs: Any) -> StubSpeechStream:
+        CALLS["speech"] += 1
+        time.sleep(DELAYS["speech"])
+        return StubSpeechStream(input)
+
+
+class StubFiles:
+    # Files and batches live on disk under work_dir(), so a new process can re-attach to them.
+    def create(self, file: Any, purpose: str, **kwargs: Any) -> SimpleNamespace:
+        data = file.read() if hasattr(file, "read") else Path(file).read_bytes()
+        file_id = f"file_stub_{uuid.uuid4().hex[:12]}"
+        path = work_dir() / "files" / file_id
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return SimpleNamespace(id=file_id, purpose=purpose, bytes=len(data))
+
+    def content(self, file_id: str, **kwargs: Any) -> SimpleNamespace:
+        data = (work_dir() / "files" / file_id).read_bytes()
+        return SimpleNamespace(content=data, text=data.decode("utf-8"))
+
+
+class StubBatches:
+    def __init__(self, files: StubFiles):
+        self.files = files
+
+    def path(self, batch_id: str) -> Path:
+        return work_dir() / "batches" / f"{batch_id}.json"
+
+    def create(self, input_file_id: str, endpoint: str, completion_window: str, **kwargs: Any) -> SimpleNamespace:
+        CALLS["batches"] += 1
+        batch = {
+            "id": f"batch_stub_{uuid.uuid4().hex[:12]}",
+            "status": "in_progress",
+            "endpoint": endpoint,
+            "input_file_id": input_file_id,
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": time.time(),
+            "metadata": kwargs.get("metadata") or {},
+        }
+        path = self.path(batch["id"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(batch), encoding="utf-8")
+        return SimpleNamespace(**batch)
+
+    def retrieve(self, batch_id: str, **kwargs: Any) -> SimpleNamespace:
+        path = self.path(batch_id)
+        batch = json.loads(path.read_text(encoding="utf-8"))
+        if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= DELAYS["batches"]:
+            self.complete(batch)
+            path.write_text(json.dumps(batch), encoding="utf-8")
+        return SimpleNamespace(**batch)
+
+    def complete(self, batch: dict[str, Any]) -> None:
+        outputs, errors = [], []
+        lines = self.files.content(batch["input_file_id"]).text.splitlines()
+        fail_every = int(SETTINGS.get("batch_fail_every") or 0)
+        for idx, line in enumerate(filter(None, lines), start=1):
+            request = json.loads(line)
+            if fail_every and idx % fail_every == 0:
+                body = {"error": {"message": "Stub batch failure", "type": "server_error"}}
+                errors.append({"custom_id": request["custom_id"], "response": {"status_code": 500, "body": body}, "error": None})
+                continue
+            prompt = "\n".join(str(m.get("content", "")) for m in request["body"]["input"])
+            text = json.dumps(answer_for(prompt), ensure_ascii=False)
+            body = {
+                "output": [{"type": "message", "content": [{"type": "output_text", "text": text}]}],
+                "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4},
+            }
+            outputs.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None})
+        for key, rows in (("output_file_id", outputs), ("error_file_id", errors)):
+            if rows:
+                payload = "\n".join(json.dumps(row, ensure_ascii=False) for row in rows).encode("utf-8")
+                batch[key] = self.files.create(io.BytesIO(payload), purpose="batch_output").id
+        batch["status"] = "completed"
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+
+
+class StubOpenAI:
+    # Shared state so every OpenAI() built by the pipelines sees the same jobs.
+    _videos = StubVideos()
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        self.responses = StubResponses()
+        self.videos = StubOpenAI._videos
+        self.files = StubFiles()
+        self.batches = StubBatches(self.files)
+        speech = SimpleNamespace(with_streaming_response=StubStreamingSpeech())
+        self.audio = SimpleNamespace(speech=speech)
+
+
+def install() -> types.ModuleType:
+    # Make `from openai import OpenAI` resolve to the stub, with or without the real SDK installed.
+    module = types.ModuleType("openai")
+    module.OpenAI = StubOpenAI
+    sys.modules["openai"] = module
+    return module
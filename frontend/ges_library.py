@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import unicodedata
+from pathlib import Path
+from typing import Any
+
+INDEX_NAME = ".ges_index.json"
+INDEX_VERSION = 1
+# A clip this much longer than the scene is trimmed instead of linked.
+TRIM_TOLERANCE_SEC = 0.5
+
+DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+RESOLUTION_RE = re.compile(r"Stream #.*Video:.*?(\d{2,5})x(\d{2,5})")
+
+
+def probe_media(path: Path) -> dict[str, Any]:
+    # `ffmpeg -i` without an output exits non-zero but prints the container info we need.
+    proc = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-i", str(path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False,
+    )
+    info: dict[str, Any] = {"duration": None, "width": None, "height": None}
+    match = DURATION_RE.search(proc.stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        info["duration"] = round(int(hours) * 3600 + int(minutes) * 60 + float(seconds), 3)
+    match = RESOLUTION_RE.search(proc.stderr)
+    if match:
+        info["width"], info["height"] = int(match.group(1)), int(match.group(2))
+    return info
+
+
+def place_tokens(value: str) -> set[str]:
+    ascii_value = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode("ascii")
+    return {token for token in re.split(r"[^a-z0-9]+", ascii_value.lower()) if token}
+
+
+def route_tags(mp4: Path) -> dict[str, Any]:
+    # Route tags come from an optional sidecar (<name>.json with from/to/tags)
+    # or from the "<from>__<to>[__extra].mp4" naming convention.
+    sidecar = mp4.with_suffix(".json")
+    if sidecar.exists():
+        try:
+            meta = json.loads(sidecar.read_text(encoding="utf-8"))
+            return {
+                "from": str(meta.get("from") or ""),
+                "to": str(meta.get("to") or ""),
+                "tags": sorted(place_tokens(" ".join(str(t) for t in meta.get("tags") or []))),
+            }
+        except Exception:
+            pass
+    parts = mp4.stem.split("__")
+    if len(parts) >= 2:
+        return {
+            "from": parts[0].replace("_", " "),
+            "to": parts[1].replace("_", " "),
+            "tags": sorted(place_tokens(" ".join(parts[2:]))),
+        }
+    return {"from": "", "to": "", "tags": sorted(place_tokens(mp4.stem))}
+
+
+def index_path_for(asset_dir: Path) -> Path:
+    explicit = os.getenv("GOOGLE_EARTH_STUDIO_INDEX", "").strip()
+    return Path(explicit) if explicit else asset_dir / INDEX_NAME
+
+
+def load_index(asset_dir: Path) -> dict[str, Any]:
+    path = index_path_for(asset_dir)
+    if path.exists():
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == INDEX_VERSION and isinstance(data.get("assets"), dict):
+                return data
+        except Exception:
+            pass
+    return {"version": INDEX_VERSION, "dir_mtime": None, "assets": {}}
+
+
+def save_index(asset_dir: Path, index: dict[str, Any]) -> None:
+    path = index_path_for(asset_dir)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
+    if path.parent.resolve() == asset_dir.resolve():
+        # The rename above bumped the directory mtime: record it with an in-place rewrite,
+        # which does not touch the directory again.
+        index["dir_mtime"] = asset_dir.stat().st_mtime
+        path.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def refresh_index(asset_dir: Path, force: bool = False) -> dict[str, Any]:
+    index = load_index(asset_dir)
+    dir_mtime = asset_dir.stat().st_mtime
+    # Adding, removing or renaming a clip bumps the directory mtime; otherwise the index is current.
+    if not force and index["dir_mtime"] == dir_mtime and index["assets"]:
+        return index
+
+    known: dict[str, Any] = index["assets"]
+    assets: dict[str, Any] = {}
+    changed = force or index["dir_mtime"] != dir_mtime
+    with os.scandir(asset_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(".mp4"):
+                continue
+            stat = entry.stat()
+            previous = known.get(entry.name)
+            if not force and previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+                assets[entry.name] = previous
+                continue
+            mp4 = Path(entry.path)
+            assets[entry.name] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                **probe_media(mp4),
+                **route_tags(mp4),
+            }
+            changed = True
+    if changed or set(assets) != set(known):
+        index = {"version": INDEX_VERSION, "dir_mtime": dir_mtime, "assets": assets}
+        save_index(asset_dir, index)
+    return index
+
+
+def score_asset(meta: dict[str, Any], route_from: str, route_to: str, seconds: float) -> tuple:
+    from_tokens = place_tokens(route_from)
+    to_tokens = place_tokens(route_to)
+    asset_from = place_tokens(meta.get("from", ""))
+    asset_to = place_tokens(meta.get("to", ""))
+    bag = asset_from | asset_to | set(meta.get("tags") or [])
+
+    route_score = 0
+    if from_tokens and to_tokens and from_tokens <= asset_from and to_tokens <= asset_to:
+        route_score = 3
+    elif from_tokens and to_tokens and from_tokens <= bag and to_tokens <= bag:
+        route_score = 2
+    elif (to_tokens and to_tokens <= bag) or (from_tokens and from_tokens <= bag):
+        route_score = 1
+    duration = meta.get("duration") or 0.0
+    long_enough = 1 if duration >= seconds else 0
+    return route_score, long_enough, meta.get("mtime") or 0.0
+
+
+def select_asset(asset_dir: Path, route_from: str, route_to: str, seconds: float) -> tuple[Path, dict[str, Any]] | None:
+    index = refresh_index(asset_dir)
+    if not index["assets"]:
+        return None
+    name, meta = max(index["assets"].items(), key=lambda item: score_asset(item[1], route_from, route_to, seconds))
+    path = asset_dir / name
+    # A clip overwritten in place does not touch the directory mtime: re-check the one we picked.
+    try:
+        stat = path.stat()
+        stale = stat.st_size != meta["size"] or stat.st_mtime != meta["mtime"]
+    except FileNotFoundError:
+        stale = True
+    if stale:
+        index = refresh_index(asset_dir, force=True)
+        if not index["assets"]:
+            return None
+        name, meta = max(index["assets"].items(), key=lambda item: score_asset(item[1], route_from, route_to, seconds))
+        path = asset_dir / name
+    return path, meta
+
+
+def link_or_copy(source: Path, out_path: Path) -> str:
+    out_path.unlink(missing_ok=True)
+    try:
+        os.link(source, out_path)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(source, out_path)
+        return "copy"
+
+
+def place_asset(source: Path, out_path: Path, seconds: float, duration: float | None = None) -> str:
+    if duration is None:
+        duration = probe_media(source)["duration"]
+    if duration is not None and duration <= seconds + TRIM_TOLERANCE_SEC:
+        return link_or_copy(source, out_path)
+    # Stream-copy only the head of the clip: no re-encode, and only the bytes the scene needs.
+    out_path.unlink(missing_ok=True)
+    cmd = ["ffmpeg", "-y", "-t", f"{seconds:g}", "-i", str(source), "-map", "0:v:0", "-c", "copy", "-an", str(out_path)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False)
+    if proc.returncode != 0 or not out_path.exists() or out_path.stat().st_size == 0:
+        return link_or_copy(source, out_path)
+    return "trim_copy"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--asset-dir", default=os.getenv("GOOGLE_EARTH_STUDIO_ASSET_DIR", ""))
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--from", dest="route_from", default="")
+    parser.add_argument("--to", dest="route_to", default="")
+    parser.add_argument("--seconds", type=float, default=4.0)
+    args = parser.parse_args()
+
+    asset_dir = Path(args.asset_dir.strip()) if args.asset_dir.strip() else None
+    if not asset_dir or not asset_dir.is_dir():
+        print("Asset directory not found (set GOOGLE_EARTH_STUDIO_ASSET_DIR or --asset-dir).", file=sys.stderr)
+        return 2
+    index = refresh_index(asset_dir, force=args.rebuild)
+    result: dict[str, Any] = {"index": str(index_path_for(asset_dir)), "assets": len(index["assets"])}
+    if args.route_from or args.route_to:
+        picked = select_asset(asset_dir, args.route_from, args.route_to, args.seconds)
+        result["selected"] = picked[0].name if picked else None
+    print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,13 +1,19 @@
 import argparse
 import json
+import math
 import os
 import re
-import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
+from ges_library import place_asset, select_asset
+from rate_limit import call_with_limits, estimate_tokens, usage_tokens
+from reel_storage import prune, retention_from_env
+from sora_jobs import SoraJobTracker
+
 try:
     from openai import OpenAI
 except Exception:
@@ -18,6 +24,22 @@ BASE_DIR = Path(__file__).resolve().parent
 PROMPT_PATH = BASE_DIR / "prompts" / "reel_prompt.txt"
 OUTPUT_DIR = BASE_DIR / "output"
 WINDOWS_FONT = Path("C:/Windows/Fonts/arial.ttf")
+# Extra libx264 options per REEL_RENDER_PROFILE; "final" keeps the encoder defaults.
+RENDER_PROFILES: dict[str, list[str]] = {
+    "final": [],
+    "draft": ["-preset", "ultrafast", "-crf", "30"],
+}
+# Publishing formats rendered by assemble_final_video. "crop" fills the frame from the
+# 9:16 master; "blur" fits it inside a blurred, zoomed copy (landscape would lose too much).
+REEL_ASPECTS: dict[str, dict[str, Any]] = {
+    "9:16": {"size": (1080, 1920), "fit": "crop", "suffix": ""},
+    "1:1": {"size": (1080, 1080), "fit": "crop", "suffix": "_1x1"},
+    "16:9": {"size": (1920, 1080), "fit": "blur", "suffix": "_16x9"},
+}
+SCENE_FPS = 30
+# Clip lengths (seconds) the Sora video API accepts, shortest first.
+SORA_SECONDS = ("4", "8", "12")
+VOICE_STYLE = "Voice style: warm, professional, confident. Language: English."
 
 
 def log_stage(name: str) -> None:
@@ -48,7 +70,8 @@ def drawtext_filter(text: str, fontsize: int, y_expr: str) -> str:
     safe = (text or "").replace("\\", "\\\\").replace(":", "\\:").replace("'", "\\'")
     font_part = ""
     if WINDOWS_FONT.exists():
-        font_part = f"fontfile='{str(WINDOWS_FONT).replace(':', '\\:')}':"
+        font_path = str(WINDOWS_FONT).replace(":", "\\:")
+        font_part = f"fontfile='{font_path}':"
     return (
         "drawtext="
         f"{font_part}"
@@ -121,11 +144,19 @@ def generate_structure_with_openai(title: str, prompt_template: str) -> dict[str
         return fallback_structure(title)
     model = os.getenv("OPENAI_MODEL", "gpt-5")
     prompt = prompt_template.replace("{title}", title)
-    client = OpenAI()
-    response = client.responses.create(
-        model=model,
-        input=[{"role": "user", "content": prompt}],
+    # call_with_limits owns the retries; the SDK's own would stack on top of them.
+    client = OpenAI(max_retries=0)
+    response = call_with_limits(
+        model,
+        lambda: client.responses.create(
+            model=model,
+            input=[{"role": "user", "content": prompt}],
+        ),
+        tokens=estimate_tokens(prompt, expected_output=2000),
     )
+    input_tokens, output_tokens = usage_tokens(response)
+    usage = {"stage": "REEL_STRUCTURE", "input_tokens": input_tokens, "output_tokens": output_tokens, "prompt_chars": len(prompt)}
+    print("TOKENS:" + json.dumps(usage, ensure_ascii=False), flush=True)
     chunks: list[str] = []
     for item in response.output:
         if item.type != "message":
@@ -149,6 +180,28 @@ def run_ffmpeg(args: list[str]) -> None:
         raise RuntimeError(f"FFmpeg failed: {' '.join(cmd)}\n{proc.stderr}")
 
 
+def x264_args() -> list[str]:
+    profile = os.getenv("REEL_RENDER_PROFILE", "final").strip() or "final"
+    return ["-c:v", "libx264", *RENDER_PROFILES.get(profile, [])]
+
+
+def cpu_budget() -> int:
+    # Cores this reel may use; lower REEL_CPU_BUDGET when several reels render on one host.
+    raw = os.getenv("REEL_CPU_BUDGET", "").strip()
+    total = os.cpu_count() or 1
+    try:
+        return max(1, min(int(raw), total) if raw else total)
+    except ValueError:
+        print(f"REEL_CPU_BUDGET_INVALID:{raw}", flush=True)
+        return total
+
+
+def encode_plan(jobs: int, budget: int) -> tuple[int, int]:
+    # (parallel FFmpeg processes, -threads per process) so that workers * threads <= budget.
+    workers = max(1, min(jobs, budget))
+    return workers, max(1, budget // workers)
+
+
 def ffmpeg_available() -> bool:
     try:
         proc = subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False)
@@ -202,8 +255,7 @@ def create_placeholder_video_clip(text: str, out_path: Path, duration_sec: int =
             str(duration_sec),
             "-r",
             "30",
-            "-c:v",
-            "libx264",
+            *x264_args(),
             "-pix_fmt",
             "yuv420p",
             str(out_path),
@@ -212,56 +264,80 @@ def create_placeholder_video_clip(text: str, out_path: Path, duration_sec: int =
     return out_path
 
 
-def download_sora_clip(prompt: str, out_path: Path, seconds: str = "4") -> tuple[Path, str]:
-    if OpenAI is None or not os.getenv("OPENAI_API_KEY"):
-        return create_placeholder_video_clip("Sora asset placeholder", out_path, duration_sec=int(seconds)), "sora_fallback_placeholder"
-    try:
-        client = OpenAI()
-        model = os.getenv("SORA_MODEL", "sora-2")
-        video = client.videos.create_and_poll(
-            model=model,
-            prompt=prompt,
-            seconds=seconds,
-        )
-        content = client.videos.download_content(video.id)
-        if hasattr(content, "write_to_file"):
-            content.write_to_file(str(out_path))
-        elif hasattr(content, "content"):
-            out_path.write_bytes(content.content)
+def download_sora_clips(
+    requests: list[tuple[int, str, Path, str]],
+    reel: str,
+) -> dict[int, tuple[Path, str]]:
+    # requests: (block, prompt, out_path, seconds). Every render is submitted first, then one poller waits on all
+    # of them; video IDs live in the job tracker, so a rerun after a crash re-attaches instead of paying again.
+    results: dict[int, tuple[Path, str]] = {}
+    jobs: dict[int, dict[str, Any]] = {}
+    if requests and OpenAI is not None and os.getenv("OPENAI_API_KEY"):
+        tracker = None
+        try:
+            model = os.getenv("SORA_MODEL", "sora-2")
+            tracker = SoraJobTracker(OpenAI(max_retries=0), model)
+            for block, prompt, out_path, seconds in requests:
+                log_stage(f"SORA_ASSET_{block}")
+                try:
+                    tracker.submit(reel, block, prompt, seconds, out_path)
+                except Exception as exc:
+                    print(f"SORA_ERROR:{block}:{exc}", flush=True)
+            log_stage("SORA_WAIT")
+            jobs = tracker.wait(reel, [block for block, *_ in requests])
+        except Exception as exc:
+            print(f"SORA_ERROR:{exc}", flush=True)
+        finally:
+            if tracker is not None:
+                tracker.close()
+    for block, _, out_path, seconds in requests:
+        job = jobs.get(block)
+        if job and job["status"] == "downloaded":
+            log_stage("SORA_DOWNLOAD_OK")
+            results[block] = (out_path, "sora_video")
+            continue
+        if job and job.get("error"):
+            print(f"SORA_ERROR:{block}:{job['error']}", flush=True)
+        if OpenAI is not None and os.getenv("OPENAI_API_KEY"):
+            log_stage("SORA_FALLBACK")
+            results[block] = (create_placeholder_video_clip("Sora asset fallback", out_path, duration_sec=int(seconds)), "sora_fallback_placeholder")
         else:
-            out_path.write_bytes(bytes(content))
-        log_stage("SORA_DOWNLOAD_OK")
-        return out_path, "sora_video"
-    except Exception as exc:
-        print(f"SORA_ERROR:{exc}", flush=True)
-        log_stage("SORA_FALLBACK")
-        return create_placeholder_video_clip("Sora asset fallback", out_path, duration_sec=int(seconds)), "sora_fallback_placeholder"
+            results[block] = (create_placeholder_video_clip("Sora asset placeholder", out_path, duration_sec=int(seconds)), "sora_fallback_placeholder")
+    return results
 
 
-def resolve_google_earth_source() -> Path | None:
+def resolve_google_earth_source(route_from: str = "", route_to: str = "", seconds: int = 5) -> tuple[Path, float | None] | None:
     explicit = os.getenv("GOOGLE_EARTH_STUDIO_AERIAL_MP4", "").strip()
     if explicit:
         p = Path(explicit)
         if p.exists() and p.is_file():
-            return p
+            return p, None
     asset_dir = os.getenv("GOOGLE_EARTH_STUDIO_ASSET_DIR", "").strip()
     if asset_dir:
         d = Path(asset_dir)
         if d.exists() and d.is_dir():
-            candidates = sorted(d.glob("*.mp4"), key=lambda x: x.stat().st_mtime, reverse=True)
-            if candidates:
-                return candidates[0]
+            picked = select_asset(d, route_from, route_to, seconds)
+            if picked:
+                path, meta = picked
+                return path, meta.get("duration")
     return None
 
 
 def get_google_earth_aerial_clip(out_path: Path, route_from: str, route_to: str, seconds: int = 5) -> tuple[Path, str]:
-    source = resolve_google_earth_source()
+    source = resolve_google_earth_source(route_from, route_to, seconds)
     if source:
-        shutil.copy2(source, out_path)
+        path, duration = source
+        placement = place_asset(path, out_path, seconds, duration)
+        print(f"GES_ASSET:{path.name}:{placement}", flush=True)
         return out_path, "google_earth_video"
     return create_placeholder_video_clip(f"Aerial {route_from} to {route_to}", out_path, duration_sec=seconds), "google_earth_placeholder"
 
 
+def sora_seconds(duration: float) -> str:
+    # Shortest clip length Sora accepts that covers the narration (the longest one otherwise).
+    return next((value for value in SORA_SECONDS if float(value) >= duration), SORA_SECONDS[-1])
+
+
 def create_scene_video_assets(
     title: str,
     structure: dict[str, Any],
@@ -270,17 +346,21 @@ def create_scene_video_assets(
     video_source: str,
     ges_from: str,
     ges_to: str,
+    block_durations: list[float] | None = None,
 ) -> tuple[list[Path], list[dict[str, Any]]]:
     log_stage("ASSETS")
     blocks = normalize_blocks(structure)
     seconds = os.getenv("REEL_SCENE_SECONDS", "4").strip() or "4"
-    if seconds not in {"4", "8", "12"}:
+    if seconds not in SORA_SECONDS:
         seconds = "4"
-    seconds_int = int(seconds)
-    clips: list[Path] = []
-    materials: list[dict[str, Any]] = []
+    if not block_durations or len(block_durations) != len(blocks):
+        block_durations = None
+    assets: dict[int, tuple[Path, str]] = {}
+    sora_requests: list[tuple[int, str, Path, str]] = []
     for idx, block in enumerate(blocks, start=1):
         clip_path = work_dir / f"{safe}_source_{idx:02d}.mp4"
+        # With per-block narration the clip must cover the scene, otherwise it would be padded.
+        block_seconds = sora_seconds(block_durations[idx - 1]) if block_durations else seconds
         use_ges = False
         if video_source == "google_earth":
             use_ges = True
@@ -288,12 +368,19 @@ def create_scene_video_assets(
             # In hybrid mode only the connector block uses aerial view.
             use_ges = True
         if use_ges:
+            # The previous run may have left a hardlink to a library asset here: never write through it.
+            # (Sora downloads replace the file by rename and may reuse a finished download.)
+            clip_path.unlink(missing_ok=True)
             log_stage("GOOGLE_EARTH_STUDIO_AERIAL")
-            asset, material_type = get_google_earth_aerial_clip(clip_path, ges_from, ges_to, seconds=seconds_int)
+            assets[idx] = get_google_earth_aerial_clip(clip_path, ges_from, ges_to, seconds=int(block_seconds))
         else:
-            log_stage(f"SORA_ASSET_{idx}")
-            sora_prompt = build_sora_prompt(title, block, idx)
-            asset, material_type = download_sora_clip(sora_prompt, clip_path, seconds=seconds)
+            sora_requests.append((idx, build_sora_prompt(title, block, idx), clip_path, block_seconds))
+    assets.update(download_sora_clips(sora_requests, safe))
+
+    clips: list[Path] = []
+    materials: list[dict[str, Any]] = []
+    for idx, block in enumerate(blocks, start=1):
+        asset, material_type = assets[idx]
         clips.append(asset)
         materials.append(
             {
@@ -306,81 +393,210 @@ def create_scene_video_assets(
     return clips, materials
 
 
-def create_voiceover(structure: dict[str, Any], safe: str, work_dir: Path) -> tuple[Path, str]:
+def tts_mode() -> str:
+    # "single": the whole script in one TTS call; "blocks": one call per reel block, run concurrently.
+    return (os.getenv("REEL_TTS_MODE", "single").strip() or "single").lower()
+
+
+def probe_audio(path: Path) -> tuple[float, int, int]:
+    # (seconds, sample rate, channels) of the first audio stream, as FFprobe reports them.
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "format=duration:stream=sample_rate,channels",
+        "-of",
+        "json",
+        str(path),
+    ]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False)
+    if proc.returncode != 0:
+        raise RuntimeError(f"FFprobe failed: {' '.join(cmd)}\n{proc.stderr}")
+    info = json.loads(proc.stdout or "{}")
+    streams = info.get("streams") or []
+    duration = (info.get("format") or {}).get("duration")
+    if not streams or duration in (None, "N/A"):
+        raise ValueError(f"No audio stream in {path}")
+    return float(duration), int(streams[0].get("sample_rate") or 44100), int(streams[0].get("channels") or 2)
+
+
+def create_silence(out_path: Path, duration_sec: float, sample_rate: int = 44100, channels: int = 2) -> Path:
+    layout = "mono" if channels == 1 else "stereo"
+    run_ffmpeg(
+        [
+            "-f",
+            "lavfi",
+            "-i",
+            f"anullsrc=channel_layout={layout}:sample_rate={sample_rate}:duration={duration_sec:g}",
+            "-q:a",
+            "9",
+            "-acodec",
+            "libmp3lame",
+            str(out_path),
+        ]
+    )
+    return out_path
+
+
+def synthesize_speech(client: Any, model: str, voice: str, text: str, out_path: Path, instructions: str = "") -> None:
+    def synthesize(with_instructions: bool) -> None:
+        extra = {"instructions": instructions} if with_instructions else {}
+        with client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            response_format="mp3",
+            **extra,
+        ) as audio_response:
+            audio_response.stream_to_file(str(out_path))
+
+    try:
+        call_with_limits(model, lambda: synthesize(bool(instructions)), tokens=estimate_tokens(text), label="TTS")
+    except Exception as exc:
+        # Older TTS models reject "instructions": same fallback as app/api/tts.
+        if not instructions or not re.search(r"instructions|unknown parameter|unsupported", str(exc), re.I):
+            raise
+        call_with_limits(model, lambda: synthesize(False), tokens=estimate_tokens(text), label="TTS")
+
+
+def create_block_voiceover(blocks: list[dict[str, Any]], safe: str, work_dir: Path) -> tuple[Path, str, list[float]]:
+    # One TTS call per block, all in flight together; only failed blocks are retried. Segments share
+    # codec settings, so the concat is a stream copy and each block's duration comes from its own file.
+    client = OpenAI(max_retries=0)
+    model = os.getenv("OPENAI_TTS_MODEL", "gpt-4o-mini-tts")
+    voice = os.getenv("OPENAI_TTS_VOICE", "alloy")
+    rounds = 1 + max(0, int(os.getenv("REEL_TTS_BLOCK_RETRIES", "2").strip() or "2"))
+    texts = [str(block.get("voiceover_en") or "").strip() for block in blocks]
+    segments = [work_dir / f"{safe}_voiceover_{idx:02d}.mp3" for idx in range(1, len(blocks) + 1)]
+    pending = [idx for idx, text in enumerate(texts) if text]
+    errors: dict[int, str] = {}
+    for attempt in range(rounds):
+        if not pending:
+            break
+        if attempt:
+            print("TTS_RETRY:" + json.dumps({"blocks": [idx + 1 for idx in pending], "attempt": attempt + 1}), flush=True)
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            futures = {idx: pool.submit(synthesize_speech, client, model, voice, texts[idx], segments[idx], VOICE_STYLE) for idx in pending}
+        failed = []
+        for idx, future in futures.items():
+            try:
+                future.result()
+            except Exception as exc:
+                errors[idx] = str(exc)
+                failed.append(idx)
+        pending = failed
+    voiced = [idx for idx, text in enumerate(texts) if text and idx not in pending]
+    if not voiced:
+        raise RuntimeError(f"TTS failed for every block: {errors}")
+
+    _, sample_rate, channels = probe_audio(segments[voiced[0]])
+    scene_seconds = float(os.getenv("REEL_SCENE_SECONDS", "4").strip() or "4")
+    for idx, text in enumerate(texts):
+        if idx in voiced:
+            continue
+        # Failed or empty block: silence of about the same length keeps the other blocks in place.
+        print(f"TTS_BLOCK_SILENT:{idx + 1}:{errors.get(idx, 'empty voiceover')}", flush=True)
+        create_silence(segments[idx], max(1.0, len(text.split()) / 2.5) if text else scene_seconds, sample_rate, channels)
+    durations = [round(probe_audio(segment)[0], 3) for segment in segments]
+
+    voiceover_path = work_dir / f"{safe}_voiceover.mp3"
+    concat_file = work_dir / f"{safe}_voiceover_concat.txt"
+    concat_file.write_text("\n".join(f"file '{segment.as_posix()}'" for segment in segments), encoding="utf-8")
+    run_ffmpeg(["-f", "concat", "-safe", "0", "-i", str(concat_file), "-c", "copy", str(voiceover_path)])
+    print("VOICEOVER_BLOCKS:" + json.dumps({"durations": durations, "silent": [idx + 1 for idx in pending]}), flush=True)
+    return voiceover_path, "openai_tts_blocks" if not pending else "openai_tts_blocks_partial", durations
+
+
+def create_voiceover(structure: dict[str, Any], safe: str, work_dir: Path) -> tuple[Path, str, list[float] | None]:
+    # The third value is the per-block narration length (REEL_TTS_MODE=blocks), None otherwise.
     log_stage("VOICEOVER")
     voiceover_path = work_dir / f"{safe}_voiceover.mp3"
     blocks = normalize_blocks(structure)
     script_text = " ".join(block.get("voiceover_en", "") for block in blocks).strip()
     if not script_text:
         script_text = "This historical reel was automatically generated."
-    script_text = f"Voice style: warm, professional, confident. Language: English. {script_text}"
+    script_text = f"{VOICE_STYLE} {script_text}"
 
     if OpenAI is not None and os.getenv("OPENAI_API_KEY"):
         try:
-            client = OpenAI()
+            if tts_mode() == "blocks":
+                return create_block_voiceover(blocks, safe, work_dir)
+            client = OpenAI(max_retries=0)
             model = os.getenv("OPENAI_TTS_MODEL", "gpt-4o-mini-tts")
             voice = os.getenv("OPENAI_TTS_VOICE", "alloy")
-            with client.audio.speech.with_streaming_response.create(
-                model=model,
-                voice=voice,
-                input=script_text,
-                response_format="mp3",
-            ) as audio_response:
-                audio_response.stream_to_file(str(voiceover_path))
-            return voiceover_path, "openai_tts"
-        except Exception:
-            pass
+            synthesize_speech(client, model, voice, script_text, voiceover_path)
+            return voiceover_path, "openai_tts", None
+        except Exception as exc:
+            print(f"TTS_ERROR:{exc}", flush=True)
+            log_stage("TTS_FALLBACK")
 
     # Fallback: generate silent track if TTS is unavailable.
-    duration_sec = max(8, len(script_text.split()) // 2)
+    create_silence(voiceover_path, max(8, len(script_text.split()) // 2))
+    return voiceover_path, "silent_fallback", None
+
+
+def encode_scene_clip(asset: Path, clip: Path, seconds_per_scene: float, threads: int) -> Path:
+    # Only the encoder gets `threads`: decoding and the scale/crop filters run on one thread each,
+    # otherwise every process would spawn ~2x threads plus filter threads and overrun the budget.
+    # A source shorter than the scene holds its last frame instead of visibly restarting.
+    vf = (
+        f"tpad=stop_mode=clone:stop_duration={seconds_per_scene:g},"
+        "scale=1080:1920:force_original_aspect_ratio=increase,"
+        "crop=1080:1920,"
+        "format=yuv420p"
+    )
     run_ffmpeg(
         [
-            "-f",
-            "lavfi",
+            "-filter_threads",
+            "1",
+            "-threads",
+            "1",
             "-i",
-            f"anullsrc=channel_layout=stereo:sample_rate=44100:duration={duration_sec}",
-            "-q:a",
-            "9",
-            "-acodec",
-            "libmp3lame",
-            str(voiceover_path),
+            str(asset),
+            "-vf",
+            vf,
+            "-t",
+            f"{seconds_per_scene:g}",
+            "-r",
+            str(SCENE_FPS),
+            *x264_args(),
+            "-threads",
+            str(threads),
+            "-pix_fmt",
+            "yuv420p",
+            str(clip),
         ]
     )
-    return voiceover_path, "silent_fallback"
+    return clip
 
 
-def build_scene_clips(assets: list[Path], structure: dict[str, Any], safe: str, work_dir: Path) -> tuple[list[Path], int]:
+def build_scene_clips(
+    assets: list[Path],
+    structure: dict[str, Any],
+    safe: str,
+    work_dir: Path,
+    block_durations: list[float] | None = None,
+) -> tuple[list[Path], int]:
     log_stage("SCENE_CLIPS")
-    clips: list[Path] = []
     seconds_per_scene = int((os.getenv("REEL_SCENE_SECONDS", "4").strip() or "4"))
-    for idx, asset in enumerate(assets, start=1):
-        clip = work_dir / f"{safe}_clip_{idx:02d}.mp4"
-        vf = (
-            "scale=1080:1920:force_original_aspect_ratio=increase,"
-            "crop=1080:1920,"
-            "format=yuv420p"
-        )
-        run_ffmpeg(
-            [
-                "-stream_loop",
-                "-1",
-                "-t",
-                str(seconds_per_scene),
-                "-i",
-                str(asset),
-                "-vf",
-                vf,
-                "-r",
-                "30",
-                "-c:v",
-                "libx264",
-                "-pix_fmt",
-                "yuv420p",
-                str(clip),
-            ]
-        )
-        clips.append(clip)
-    return clips, seconds_per_scene * len(clips)
+    scene_seconds = [float(seconds_per_scene)] * len(assets)
+    if block_durations and len(block_durations) == len(assets):
+        # Each scene lasts as long as its block's narration, rounded to whole frames.
+        scene_seconds = [max(1.0, round(seconds * SCENE_FPS) / SCENE_FPS) for seconds in block_durations]
+    clips = [work_dir / f"{safe}_clip_{idx:02d}.mp4" for idx in range(1, len(assets) + 1)]
+    # Short clips do not scale across all cores, so encode them side by side with a fixed share each.
+    workers, threads = encode_plan(len(assets), cpu_budget())
+    print(f"SCENE_ENCODE_PLAN:{workers}x{threads}", flush=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(encode_scene_clip, asset, clip, seconds, threads)
+            for asset, clip, seconds in zip(assets, clips, scene_seconds)
+        ]
+        clips = [future.result() for future in futures]
+    return clips, math.ceil(sum(scene_seconds))
 
 
 def concat_clips(clips: list[Path], safe: str, work_dir: Path) -> Path:
@@ -388,7 +604,7 @@ def concat_clips(clips: list[Path], safe: str, work_dir: Path) -> Path:
     concat_file = work_dir / f"{safe}_concat.txt"
     concat_file.write_text("\n".join(f"file '{clip.as_posix()}'" for clip in clips), encoding="utf-8")
     scenes_out = work_dir / f"{safe}_scenes.mp4"
-    run_ffmpeg(["-f", "concat", "-safe", "0", "-i", str(concat_file), "-c:v", "libx264", "-pix_fmt", "yuv420p", str(scenes_out)])
+    run_ffmpeg(["-f", "concat", "-safe", "0", "-i", str(concat_file), *x264_args(), "-pix_fmt", "yuv420p", str(scenes_out)])
     return scenes_out
 
 
@@ -413,39 +629,83 @@ def build_music(duration_sec: int, safe: str, work_dir: Path) -> tuple[Path, str
     return music_path, "generated_background"
 
 
-def assemble_final_video(scenes: Path, voiceover: Path, music: Path, output_mp4: Path) -> None:
+def parse_aspects(value: str | None) -> list[str]:
+    aspects = [item.strip() for item in (value or "9:16").split(",") if item.strip()]
+    unknown = [item for item in aspects if item not in REEL_ASPECTS]
+    if unknown:
+        raise ValueError(f"Unknown aspect(s): {', '.join(unknown)}. Use {', '.join(REEL_ASPECTS)}.")
+    return list(dict.fromkeys(aspects)) or ["9:16"]
+
+
+def aspect_branch(label_in: str, label_out: str, aspect: str) -> str:
+    width, height = REEL_ASPECTS[aspect]["size"]
+    fill = f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height}"
+    if REEL_ASPECTS[aspect]["fit"] == "crop":
+        return f"[{label_in}]{fill},setsar=1,format=yuv420p[{label_out}]"
+    bg, fg = f"{label_out}bg", f"{label_out}fg"
+    # Blur at quarter resolution: same look, a fraction of the cost.
+    small = f"scale={width // 4}:{height // 4}:force_original_aspect_ratio=increase,crop={width // 4}:{height // 4}"
+    return (
+        f"[{label_in}]split=2[{bg}][{fg}];"
+        f"[{bg}]{small},boxblur=5:1,scale={width}:{height}[{bg}b];"
+        f"[{fg}]scale={width}:{height}:force_original_aspect_ratio=decrease[{fg}s];"
+        f"[{bg}b][{fg}s]overlay=(W-w)/2:(H-h)/2,setsar=1,format=yuv420p[{label_out}]"
+    )
+
+
+def assemble_final_video(
+    scenes: Path,
+    voiceover: Path,
+    music: Path,
+    output_mp4: Path,
+    aspects: list[str] | None = None,
+) -> dict[str, Path]:
+    # One FFmpeg process: scenes are decoded and the audio mixed once, then split into one
+    # scale/crop branch and one encoder per format. The first aspect is written to output_mp4.
     log_stage("ASSEMBLE_VIDEO")
-    run_ffmpeg(
-        [
-            "-i",
-            str(scenes),
-            "-i",
-            str(voiceover),
-            "-i",
-            str(music),
-            "-filter_complex",
-            "[1:a]volume=1.0[a1];[2:a]volume=0.25[a2];[a1][a2]amix=inputs=2:duration=longest[a]",
+    aspects = aspects or ["9:16"]
+    count = len(aspects)
+    outputs = {
+        aspect: output_mp4 if idx == 0 else output_mp4.with_name(f"{output_mp4.stem}{REEL_ASPECTS[aspect]['suffix']}{output_mp4.suffix}")
+        for idx, aspect in enumerate(aspects)
+    }
+    graph = [
+        "[1:a]volume=1.0[a1];[2:a]volume=0.25[a2];"
+        + (
+            "[a1][a2]amix=inputs=2:duration=longest[a0]"
+            if count == 1
+            else f"[a1][a2]amix=inputs=2:duration=longest,asplit={count}" + "".join(f"[a{i}]" for i in range(count))
+        ),
+        f"[0:v]fps={SCENE_FPS}" + ("[v0]" if count == 1 else f",split={count}" + "".join(f"[v{i}]" for i in range(count))),
+    ]
+    graph.extend(aspect_branch(f"v{i}", f"out{i}", aspect) for i, aspect in enumerate(aspects))
+    args = ["-i", str(scenes), "-i", str(voiceover), "-i", str(music), "-filter_complex", ";".join(graph)]
+    for i, aspect in enumerate(aspects):
+        args += [
             "-map",
-            "0:v",
+            f"[out{i}]",
             "-map",
-            "[a]",
-            "-r",
-            "30",
-            "-s",
-            "1080x1920",
-            "-c:v",
-            "libx264",
+            f"[a{i}]",
+            *x264_args(),
             "-pix_fmt",
             "yuv420p",
             "-c:a",
             "aac",
             "-shortest",
-            str(output_mp4),
+            str(outputs[aspect]),
         ]
-    )
+    run_ffmpeg(args)
+    return outputs
 
 
-def run_pipeline(title: str, video_source: str = "hybrid", ges_from: str = "Milano", ges_to: str = "Buenos Aires") -> Path:
+def run_pipeline(
+    title: str,
+    video_source: str = "hybrid",
+    ges_from: str = "Milano",
+    ges_to: str = "Buenos Aires",
+    aspects: list[str] | None = None,
+) -> Path:
+    aspects = aspects or parse_aspects(os.getenv("REEL_ASPECTS"))
     if not ffmpeg_available():
         raise RuntimeError("FFmpeg is required but was not found in PATH.")
 
@@ -491,20 +751,29 @@ def run_pipeline(title: str, video_source: str = "hybrid", ges_from: str = "Mila
     }
     print("REEL_FACTS:" + json.dumps(reel_facts, ensure_ascii=False), flush=True)
 
-    assets, materials = create_scene_video_assets(title, structure, safe, work_dir, video_source, auto_ges_from, auto_ges_to)
-    voiceover, voiceover_type = create_voiceover(structure, safe, work_dir)
-    clips, duration_sec = build_scene_clips(assets, structure, safe, work_dir)
+    # Narration first: in blocks mode its per-block durations decide how long each source clip must be.
+    voiceover, voiceover_type, block_durations = create_voiceover(structure, safe, work_dir)
+    assets, materials = create_scene_video_assets(
+        title, structure, safe, work_dir, video_source, auto_ges_from, auto_ges_to, block_durations
+    )
+    clips, duration_sec = build_scene_clips(assets, structure, safe, work_dir, block_durations)
     scenes = concat_clips(clips, safe, work_dir)
     music, music_type = build_music(duration_sec, safe, work_dir)
 
     output_mp4 = reel_dir / f"{safe}_reel.mp4"
-    assemble_final_video(scenes, voiceover, music, output_mp4)
+    outputs = assemble_final_video(scenes, voiceover, music, output_mp4, aspects)
+    print("REEL_OUTPUTS:" + json.dumps({aspect: path.as_posix() for aspect, path in outputs.items()}, ensure_ascii=False), flush=True)
     material_summary = {
         "materials": materials,
         "voiceover_type": voiceover_type,
         "music_type": music_type,
     }
     print("REEL_MATERIALS:" + json.dumps(material_summary, ensure_ascii=False), flush=True)
+    retention = retention_from_env()
+    if retention:
+        log_stage("STORAGE_RETENTION")
+        result = prune(OUTPUT_DIR, keep={safe}, **retention)
+        print("STORAGE:" + json.dumps({k: result[k] for k in ("freed_bytes", "total_bytes")}), flush=True)
     log_stage("DONE")
     return output_mp4
 
@@ -515,6 +784,7 @@ def main() -> int:
     parser.add_argument("--video-source", choices=["hybrid", "sora", "google_earth"], default=os.getenv("REEL_VIDEO_SOURCE", "hybrid"))
     parser.add_argument("--ges-from", default=os.getenv("REEL_GES_FROM", "Milano"))
     parser.add_argument("--ges-to", default=os.getenv("REEL_GES_TO", "Buenos Aires"))
+    parser.add_argument("--aspects", default=os.getenv("REEL_ASPECTS", "9:16"), help="Comma list of 9:16, 1:1, 16:9; the first is FINAL_VIDEO")
     args = parser.parse_args()
 
     load_env_file(BASE_DIR / ".env.local")
@@ -531,6 +801,7 @@ def main() -> int:
             video_source=args.video_source,
             ges_from=args.ges_from.strip() or "Milano",
             ges_to=args.ges_to.strip() or "Buenos Aires",
+            aspects=parse_aspects(args.aspects),
         )
         print(f"FINAL_VIDEO:{final_path.as_posix()}", flush=True)
         return 0
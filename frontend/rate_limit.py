@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Per-minute limits per model; override with OPENAI_RATE_LIMITS='{"gpt-5": {"rpm": 500, "tpm": 500000}}'.
+# A missing or zero tpm disables the token bucket for that model.
+DEFAULT_LIMITS: dict[str, dict[str, int]] = {
+    "default": {"rpm": 60, "tpm": 200000},
+    "sora-2": {"rpm": 5, "tpm": 0},
+    "sora-2-pro": {"rpm": 5, "tpm": 0},
+    "gpt-4o-mini-tts": {"rpm": 60, "tpm": 100000},
+}
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# A create that timed out or hit a 5xx may already have been accepted (and billed): only a 429, which the
+# server rejected before doing any work, is retried for those.
+NON_IDEMPOTENT_RETRYABLE_STATUS = {429}
+RETRYABLE_ERRORS = {"RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError", "TimeoutError", "ConnectionError"}
+BACKOFF_BASE_SEC = 1.0
+BACKOFF_CAP_SEC = 60.0
+
+
+def db_path() -> Path:
+    # One file per machine so every pipeline process draws from the same buckets.
+    return Path(os.getenv("OPENAI_RATE_LIMIT_DB") or Path(tempfile.gettempdir()) / "geohistory_rate_limit.sqlite")
+
+
+def limits_for(model: str) -> dict[str, int]:
+    limits = {**DEFAULT_LIMITS["default"], **DEFAULT_LIMITS.get(model, {})}
+    raw = os.getenv("OPENAI_RATE_LIMITS", "").strip()
+    if raw:
+        overrides = json.loads(raw)
+        limits.update(overrides.get("default", {}))
+        limits.update(overrides.get(model, {}))
+    return limits
+
+
+def max_retries() -> int:
+    return int(os.getenv("OPENAI_MAX_RETRIES", "5").strip() or "5")
+
+
+def connect() -> sqlite3.Connection:
+    path = db_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS usage ("
+        " model TEXT NOT NULL, day TEXT NOT NULL, requests INTEGER NOT NULL DEFAULT 0,"
+        " input_tokens INTEGER NOT NULL DEFAULT 0, output_tokens INTEGER NOT NULL DEFAULT 0,"
+        " retries INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0,"
+        " PRIMARY KEY (model, day))"
+    )
+    return conn
+
+
+def refill(conn: sqlite3.Connection, key: str, capacity: float, now: float) -> float:
+    row = conn.execute("SELECT level, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return capacity
+    level, updated = row
+    return min(capacity, level + (now - updated) * capacity / 60.0)
+
+
+def store(conn: sqlite3.Connection, key: str, level: float, now: float) -> None:
+    conn.execute(
+        "INSERT INTO buckets (key, level, updated) VALUES (?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET level = excluded.level, updated = excluded.updated",
+        (key, level, now),
+    )
+
+
+def acquire(model: str, tokens: int = 0) -> None:
+    # Block until both the request bucket and the token bucket of `model` can pay for this call.
+    limits = limits_for(model)
+    rpm, tpm = float(limits.get("rpm") or 0), float(limits.get("tpm") or 0)
+    # A single call larger than the whole minute budget would wait forever otherwise.
+    tokens = min(tokens, int(tpm)) if tpm else 0
+    while True:
+        with closing(connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            wait = 0.0
+            req_level = refill(conn, f"{model}:requests", rpm, now) if rpm else 0.0
+            tok_level = refill(conn, f"{model}:tokens", tpm, now) if tpm else 0.0
+            if rpm and req_level < 1:
+                wait = max(wait, (1 - req_level) * 60.0 / rpm)
+            if tpm and tok_level < tokens:
+                wait = max(wait, (tokens - tok_level) * 60.0 / tpm)
+            if wait <= 0:
+                if rpm:
+                    store(conn, f"{model}:requests", req_level - 1, now)
+                if tpm:
+                    store(conn, f"{model}:tokens", tok_level - tokens, now)
+            conn.execute("COMMIT")
+        if wait <= 0:
+            return
+        # Jitter so waiting processes do not all wake up on the same refill.
+        time.sleep(wait + random.uniform(0, min(1.0, wait)))
+
+
+def settle(model: str, estimated: int, input_tokens: int, output_tokens: int) -> None:
+    # Charge the difference between the estimate paid in acquire() and the real usage.
+    tpm = float(limits_for(model).get("tpm") or 0)
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        if tpm and input_tokens + output_tokens:
+            level = refill(conn, f"{model}:tokens", tpm, now)
+            store(conn, f"{model}:tokens", level - (input_tokens + output_tokens - estimated), now)
+        record(conn, model, requests=1, input_tokens=input_tokens, output_tokens=output_tokens)
+        conn.execute("COMMIT")
+
+
+def penalize(model: str) -> None:
+    # After a 429 empty the request bucket so the other processes back off as well.
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        store(conn, f"{model}:requests", 0.0, time.time())
+        record(conn, model, retries=1)
+        conn.execute("COMMIT")
+
+
+def record(conn: sqlite3.Connection, model: str, **counts: int) -> None:
+    day = time.strftime("%Y-%m-%d")
+    conn.execute("INSERT OR IGNORE INTO usage (model, day) VALUES (?, ?)", (model, day))
+    for column, value in counts.items():
+        conn.execute(f"UPDATE usage SET {column} = {column} + ? WHERE model = ? AND day = ?", (value, model, day))
+
+
+def status_code(exc: BaseException) -> int | None:
+    code = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return int(code) if isinstance(code, int) else None
+
+
+def is_retryable(exc: BaseException, idempotent: bool = True) -> bool:
+    code = status_code(exc)
+    if not idempotent:
+        return code in NON_IDEMPOTENT_RETRYABLE_STATUS
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(exc).__mro__)
+
+
+def retry_after(exc: BaseException) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, exc: BaseException) -> float:
+    # Full jitter; never sooner than what the server asked for.
+    delay = random.uniform(0, min(BACKOFF_CAP_SEC, BACKOFF_BASE_SEC * (2 ** attempt)))
+    hint = retry_after(exc)
+    return max(delay, hint) if hint is not None else delay
+
+
+def estimate_tokens(text: str, expected_output: int = 0) -> int:
+    # ~4 characters per token; settle() corrects the bucket with the real usage afterwards.
+    return len(text) // 4 + expected_output
+
+
+def usage_tokens(result: Any) -> tuple[int, int]:
+    usage = getattr(result, "usage", None)
+    if usage is None:
+        return 0, 0
+    return int(getattr(usage, "input_tokens", 0) or 0), int(getattr(usage, "output_tokens", 0) or 0)
+
+
+def call_with_limits(
+    model: str, fn: Callable[[], T], tokens: int = 0, label: str = "OPENAI", idempotent: bool = True
+) -> T:
+    """Run fn() under the shared per-model buckets, retrying 429/5xx/connection errors with backoff.
+
+    Pass idempotent=False for calls that create a remote resource (video renders, batches, uploads): those
+    are retried on 429 only. Clients wrapped here are built with max_retries=0 so the SDK does not retry too.
+    """
+    attempts = max_retries() + 1
+    for attempt in range(attempts):
+        acquire(model, tokens)
+        try:
+            result = fn()
+        except Exception as exc:
+            if not is_retryable(exc, idempotent) or attempt == attempts - 1:
+                with closing(connect()) as conn:
+                    record(conn, model, failures=1)
+                raise
+            if status_code(exc) == 429:
+                penalize(model)
+            delay = backoff_delay(attempt, exc)
+            print(f"{label}_RETRY:{attempt + 1}/{attempts - 1}:{delay:.1f}s:{exc}", flush=True)
+            time.sleep(delay)
+            continue
+        settle(model, tokens, *usage_tokens(result))
+        return result
+    raise RuntimeError("unreachable")
+
+
+def usage_report() -> dict[str, Any]:
+    with closing(connect()) as conn:
+        now = time.time()
+        buckets = {}
+        for key, level, updated in conn.execute("SELECT key, level, updated FROM buckets ORDER BY key"):
+            model, kind = key.rsplit(":", 1)
+            limits = limits_for(model)
+            capacity = float(limits.get("rpm" if kind == "requests" else "tpm") or 0)
+            buckets[key] = {
+                "available": round(min(capacity, level + (now - updated) * capacity / 60.0), 1),
+                "per_minute": capacity,
+            }
+        usage = [
+            dict(zip(("model", "day", "requests", "input_tokens", "output_tokens", "retries", "failures"), row))
+            for row in conn.execute("SELECT model, day, requests, input_tokens, output_tokens, retries, failures FROM usage ORDER BY day, model")
+        ]
+    return {"db": str(db_path()), "buckets": buckets, "usage": usage}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Shared OpenAI rate limiter state.")
+    parser.add_argument("--reset", action="store_true", help="Refill every bucket (usage history is kept)")
+    args = parser.parse_args()
+    if args.reset:
+        with closing(connect()) as conn:
+            conn.execute("DELETE FROM buckets")
+    print(json.dumps(usage_report(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+WORK_DIR_NAME = "_work"
+# Stage of every file main.py leaves in output/<safe>/_work, by name suffix.
+STAGE_PATTERNS: list[tuple[str, re.Pattern[str]]] = [
+    ("sources", re.compile(r"_source_\d+\.mp4$")),
+    ("scene_clips", re.compile(r"_clip_\d+\.mp4$")),
+    ("concat", re.compile(r"(_concat\.txt|_scenes\.mp4)$")),
+    ("voiceover", re.compile(r"_voiceover(_\d+)?\.mp3$")),
+    ("music", re.compile(r"_music\.mp3$")),
+]
+# main.py regenerates every stage on each run, but Sora sources and the TTS voiceover are the slowest
+# to rebuild: when over budget they go only after the FFmpeg intermediates of every reel.
+LATE_PRUNE_STAGES = {"sources", "voiceover"}
+PRUNE_PASSES = 2
+# Reels touched more recently than this are assumed to be rendering and never pruned.
+DEFAULT_GRACE_MIN = 60
+
+
+def stage_for(path: Path) -> str:
+    if path.parent.name != WORK_DIR_NAME:
+        return "final"
+    for stage, pattern in STAGE_PATTERNS:
+        if pattern.search(path.name):
+            return stage
+    return "other"
+
+
+def retention_class(stage: str) -> str:
+    return "keep" if stage == "final" else "intermediate"
+
+
+def prune_priority(stage: str) -> int:
+    return 1 if stage in LATE_PRUNE_STAGES else 0
+
+
+def scan_reel(reel_dir: Path) -> dict[str, Any]:
+    stages: dict[str, dict[str, Any]] = {}
+    files: list[dict[str, Any]] = []
+    last_used = 0.0
+    for path in sorted(p for p in reel_dir.rglob("*") if p.is_file()):
+        st = path.stat()
+        stage = stage_for(path)
+        # Hardlinked library assets (Google Earth Studio) free nothing when deleted here.
+        shared = st.st_nlink > 1
+        entry = stages.setdefault(stage, {"files": 0, "bytes": 0, "shared_bytes": 0})
+        entry["files"] += 1
+        entry["bytes"] += st.st_size
+        if shared:
+            entry["shared_bytes"] += st.st_size
+        last_used = max(last_used, st.st_mtime)
+        files.append({"path": path, "stage": stage, "bytes": st.st_size, "shared": shared})
+    totals = {"keep": 0, "intermediate": 0}
+    for item in files:
+        if not item["shared"]:
+            totals[retention_class(item["stage"])] += item["bytes"]
+    return {
+        "reel": reel_dir.name,
+        "path": reel_dir,
+        "last_used": last_used,
+        "bytes": sum(item["bytes"] for item in files if not item["shared"]),
+        "stages": stages,
+        "reclaimable": totals["intermediate"],
+        "files": files,
+    }
+
+
+def scan_output(output_dir: Path) -> list[dict[str, Any]]:
+    if not output_dir.exists():
+        return []
+    reels = [scan_reel(path) for path in output_dir.iterdir() if path.is_dir() and not path.name.startswith(".")]
+    return sorted(reels, key=lambda reel: reel["last_used"])
+
+
+def usage_report(output_dir: Path) -> dict[str, Any]:
+    reels = scan_output(output_dir)
+    disk = shutil.disk_usage(output_dir if output_dir.exists() else output_dir.parent)
+    by_stage: dict[str, int] = {}
+    for reel in reels:
+        for stage, entry in reel["stages"].items():
+            by_stage[stage] = by_stage.get(stage, 0) + entry["bytes"] - entry["shared_bytes"]
+    return {
+        "output_dir": str(output_dir),
+        "reels": [
+            {
+                "reel": reel["reel"],
+                "last_used": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(reel["last_used"])) if reel["last_used"] else None,
+                "bytes": reel["bytes"],
+                "reclaimable": reel["reclaimable"],
+                "stages": reel["stages"],
+            }
+            for reel in reels
+        ],
+        "total_bytes": sum(reel["bytes"] for reel in reels),
+        "by_stage": by_stage,
+        "reclaimable_bytes": sum(reel["reclaimable"] for reel in reels),
+        "disk": {"total": disk.total, "used": disk.used, "free": disk.free},
+    }
+
+
+def remove_files(reel: dict[str, Any], max_priority: int, dry_run: bool) -> int:
+    freed = 0
+    kept = []
+    for item in reel["files"]:
+        if retention_class(item["stage"]) != "intermediate" or prune_priority(item["stage"]) > max_priority:
+            kept.append(item)
+            continue
+        if not dry_run:
+            item["path"].unlink(missing_ok=True)
+        if not item["shared"]:
+            freed += item["bytes"]
+    reel["files"] = kept
+    reel["bytes"] -= freed
+    return freed
+
+
+def prune(
+    output_dir: Path,
+    max_bytes: int | None = None,
+    max_age_days: float | None = None,
+    keep: set[str] | None = None,
+    grace_min: float = DEFAULT_GRACE_MIN,
+    dry_run: bool = False,
+) -> dict[str, Any]:
+    """Delete intermediates of least recently used reels, Sora sources and voiceovers last.
+
+    Final outputs (<safe>_reel*.mp4, the reel JSON and the Google Earth plan) are never removed.
+    """
+    keep = keep or set()
+    now = time.time()
+    scanned = scan_output(output_dir)
+    total = sum(reel["bytes"] for reel in scanned)
+    reels = [reel for reel in scanned if reel["reel"] not in keep and now - reel["last_used"] > grace_min * 60]
+    removed: list[dict[str, Any]] = []
+
+    def drop(reel: dict[str, Any], max_priority: int, reason: str) -> None:
+        nonlocal total
+        freed = remove_files(reel, max_priority, dry_run)
+        if freed:
+            total -= freed
+            removed.append({"reel": reel["reel"], "priority": max_priority, "bytes": freed, "reason": reason})
+
+    if max_age_days is not None:
+        for reel in reels:
+            if now - reel["last_used"] > max_age_days * 86400:
+                drop(reel, PRUNE_PASSES - 1, "age")
+    if max_bytes is not None:
+        # Oldest first: FFmpeg intermediates of every reel before any Sora source or voiceover.
+        for max_priority in range(PRUNE_PASSES):
+            for reel in reels:
+                if total <= max_bytes:
+                    break
+                drop(reel, max_priority, "budget")
+    return {
+        "dry_run": dry_run,
+        "removed": removed,
+        "freed_bytes": sum(item["bytes"] for item in removed),
+        "total_bytes": total,
+    }
+
+
+def retention_from_env() -> dict[str, Any] | None:
+    max_gb = os.getenv("REEL_STORAGE_MAX_GB", "").strip()
+    max_age = os.getenv("REEL_INTERMEDIATE_MAX_AGE_DAYS", "").strip()
+    if not max_gb and not max_age:
+        return None
+    return {
+        "max_bytes": int(float(max_gb) * 1024**3) if max_gb else None,
+        "max_age_days": float(max_age) if max_age else None,
+        "grace_min": float(os.getenv("REEL_STORAGE_GRACE_MIN", str(DEFAULT_GRACE_MIN))),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Disk usage and retention for reel outputs.")
+    parser.add_argument("command", choices=["report", "prune"])
+    parser.add_argument("--output-dir", default=str(Path(__file__).resolve().parent / "output"))
+    parser.add_argument("--max-gb", type=float, help="Prune LRU reels until the output dir fits in this size")
+    parser.add_argument("--max-age-days", type=float, help="Prune intermediates of reels not touched for this long")
+    parser.add_argument("--grace-min", type=float, default=DEFAULT_GRACE_MIN)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    if args.command == "report":
+        print(json.dumps(usage_report(output_dir), ensure_ascii=False, indent=2))
+        return 0
+    if args.max_gb is None and args.max_age_days is None:
+        print("prune needs --max-gb and/or --max-age-days", file=sys.stderr)
+        return 2
+    result = prune(
+        output_dir,
+        max_bytes=int(args.max_gb * 1024**3) if args.max_gb is not None else None,
+        max_age_days=args.max_age_days,
+        grace_min=args.grace_min,
+        dry_run=args.dry_run,
+    )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any
+
+from rate_limit import call_with_limits
+
+# Sora renders take minutes and cost money: every submitted video ID is stored per reel/block, so a
+# restarted pipeline re-attaches to pending or finished renders and only downloads them.
+DEFAULT_POLL_MIN_SEC = 5.0
+DEFAULT_POLL_MAX_SEC = 30.0
+DEFAULT_TIMEOUT_SEC = 1800.0
+# Without a usable progress estimate the poll interval grows by this factor up to the maximum.
+POLL_BACKOFF = 1.5
+# Remote states; "downloaded" is local and means out_path holds the finished clip.
+PENDING_STATES = {"queued", "in_progress", "completed"}
+# Consecutive poll/download errors before a job is given up (e.g. an expired video).
+MAX_POLL_ERRORS = 3
+
+
+def db_path() -> Path:
+    return Path(os.getenv("SORA_JOBS_DB") or Path(tempfile.gettempdir()) / "geohistory_sora_jobs.sqlite")
+
+
+def env_float(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    return float(raw) if raw else default
+
+
+def connect() -> sqlite3.Connection:
+    path = db_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " reel TEXT NOT NULL, block INTEGER NOT NULL, prompt_key TEXT NOT NULL, model TEXT NOT NULL,"
+        " seconds TEXT NOT NULL, video_id TEXT, status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0,"
+        " error TEXT, out_path TEXT, bytes INTEGER, submitted_at REAL, updated_at REAL NOT NULL,"
+        " next_poll_at REAL NOT NULL DEFAULT 0, poll_interval REAL NOT NULL DEFAULT 0, errors INTEGER NOT NULL DEFAULT 0,"
+        " PRIMARY KEY (reel, block))"
+    )
+    return conn
+
+
+def prompt_key(model: str, prompt: str, seconds: str) -> str:
+    return hashlib.sha256(f"{model}\x1f{seconds}\x1f{prompt}".encode("utf-8")).hexdigest()[:32]
+
+
+def write_content(content: Any, out_path: Path) -> int:
+    # Write next to the target and rename: a hardlinked library asset at out_path is replaced, not overwritten.
+    tmp = out_path.with_name(out_path.name + ".part")
+    if hasattr(content, "write_to_file"):
+        content.write_to_file(str(tmp))
+    elif hasattr(content, "content"):
+        tmp.write_bytes(content.content)
+    else:
+        tmp.write_bytes(bytes(content))
+    os.replace(tmp, out_path)
+    return out_path.stat().st_size
+
+
+class SoraJobTracker:
+    def __init__(self, client: Any, model: str):
+        self.client = client
+        self.model = model
+        self.poll_min = env_float("SORA_POLL_MIN_SEC", DEFAULT_POLL_MIN_SEC)
+        self.poll_max = max(self.poll_min, env_float("SORA_POLL_MAX_SEC", DEFAULT_POLL_MAX_SEC))
+        self.timeout = env_float("SORA_JOB_TIMEOUT_SEC", DEFAULT_TIMEOUT_SEC)
+        self.conn = connect()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, reel: str, block: int) -> dict[str, Any] | None:
+        row = self.conn.execute("SELECT * FROM jobs WHERE reel = ? AND block = ?", (reel, block)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, reel: str, block: int, **values: Any) -> None:
+        values["updated_at"] = time.time()
+        columns = ", ".join(f"{key} = ?" for key in values)
+        self.conn.execute(f"UPDATE jobs SET {columns} WHERE reel = ? AND block = ?", (*values.values(), reel, block))
+
+    def downloaded(self, job: dict[str, Any], out_path: Path) -> bool:
+        # A finished download counts only if out_path is still that file (same size, not a library hardlink).
+        try:
+            stat = out_path.stat()
+        except OSError:
+            return False
+        return job["out_path"] == str(out_path) and stat.st_size == job["bytes"] and stat.st_nlink == 1
+
+    def submit(self, reel: str, block: int, prompt: str, seconds: str, out_path: Path) -> dict[str, Any]:
+        key = prompt_key(self.model, prompt, seconds)
+        job = self.get(reel, block)
+        if job and job["prompt_key"] == key and job["video_id"] and job["status"] != "failed":
+            if job["status"] == "downloaded" and self.downloaded(job, out_path):
+                print(f"SORA_JOB:{reel}:{block}:reuse:{job['video_id']}", flush=True)
+                return job
+            print(f"SORA_JOB:{reel}:{block}:reattach:{job['video_id']}:{job['status']}", flush=True)
+            # A finished render whose file was lost is downloaded again, not rendered again.
+            status = "completed" if job["status"] == "downloaded" else job["status"]
+            self.update(reel, block, status=status, out_path=str(out_path), next_poll_at=0, poll_interval=self.poll_min, errors=0)
+            return self.get(reel, block)
+
+        video = call_with_limits(
+            self.model,
+            lambda: self.client.videos.create(model=self.model, prompt=prompt, seconds=seconds),
+            label="SORA",
+            idempotent=False,
+        )
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs (reel, block, prompt_key, model, seconds, video_id, status, progress, error,"
+            " out_path, bytes, submitted_at, updated_at, next_poll_at, poll_interval)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, NULL, ?, ?, ?, ?)",
+            (
+                reel,
+                block,
+                key,
+                self.model,
+                seconds,
+                video.id,
+                str(getattr(video, "status", None) or "queued"),
+                float(getattr(video, "progress", 0) or 0),
+                str(out_path),
+                now,
+                now,
+                now + self.poll_min,
+                self.poll_min,
+            ),
+        )
+        print(f"SORA_JOB:{reel}:{block}:submitted:{video.id}", flush=True)
+        return self.get(reel, block)
+
+    def next_interval(self, job: dict[str, Any], progress: float) -> float:
+        # With progress reported, aim the next poll at about half the estimated remaining time.
+        elapsed = time.time() - (job["submitted_at"] or time.time())
+        if progress > job["progress"] and progress > 0 and elapsed > 0:
+            remaining = elapsed * (100 - progress) / progress
+            return min(self.poll_max, max(self.poll_min, remaining / 2))
+        return min(self.poll_max, max(self.poll_min, job["poll_interval"] * POLL_BACKOFF))
+
+    def poll(self, job: dict[str, Any]) -> None:
+        reel, block = job["reel"], job["block"]
+        if job["status"] != "completed":
+            video = call_with_limits(
+                f"{self.model}:poll", lambda: self.client.videos.retrieve(job["video_id"]), label="SORA"
+            )
+            status = str(getattr(video, "status", "") or job["status"])
+            progress = float(getattr(video, "progress", 0) or 0)
+            if status == "failed":
+                error = getattr(video, "error", None)
+                self.update(reel, block, status="failed", error=str(getattr(error, "message", error) or "failed"))
+                return
+            interval = self.next_interval(job, progress)
+            self.update(
+                reel,
+                block,
+                status=status,
+                progress=max(progress, job["progress"]),
+                errors=0,
+                poll_interval=interval,
+                next_poll_at=time.time() + interval,
+            )
+            if status != "completed":
+                return
+        content = call_with_limits(
+            f"{self.model}:download", lambda: self.client.videos.download_content(job["video_id"]), label="SORA"
+        )
+        size = write_content(content, Path(job["out_path"]))
+        self.update(reel, block, status="downloaded", progress=100, bytes=size, error=None, errors=0)
+
+    def wait(self, reel: str, blocks: list[int]) -> dict[int, dict[str, Any]]:
+        # One loop polls every pending job of the reel when it is due; jobs still rendering at the
+        # timeout stay in the database for the next run.
+        deadline = time.time() + self.timeout
+        while True:
+            jobs = {block: self.get(reel, block) for block in blocks}
+            pending = [job for job in jobs.values() if job and job["status"] in PENDING_STATES]
+            if not pending or time.time() >= deadline:
+                return {block: job for block, job in jobs.items() if job}
+            for job in pending:
+                if job["next_poll_at"] <= time.time():
+                    try:
+                        self.poll(job)
+                    except Exception as exc:
+                        # call_with_limits already retried transient errors; a few more rounds, then give up.
+                        print(f"SORA_POLL_ERROR:{reel}:{job['block']}:{exc}", flush=True)
+                        errors = job["errors"] + 1
+                        interval = min(self.poll_max, max(self.poll_min, job["poll_interval"] * POLL_BACKOFF))
+                        self.update(
+                            reel,
+                            job["block"],
+                            status="failed" if errors >= MAX_POLL_ERRORS else job["status"],
+                            error=str(exc),
+                            errors=errors,
+                            poll_interval=interval,
+                            next_poll_at=time.time() + interval,
+                        )
+            due = [job["next_poll_at"] for job in (self.get(reel, block) for block in blocks) if job and job["status"] in PENDING_STATES]
+            if due:
+                time.sleep(max(0.05, min(min(due), deadline) - time.time()))
+
+
+def jobs_report(reel: str | None = None) -> list[dict[str, Any]]:
+    with closing(connect()) as conn:
+        if reel:
+            rows = conn.execute("SELECT * FROM jobs WHERE reel = ? ORDER BY block", (reel,)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY updated_at DESC").fetchall()
+    return [dict(row) for row in rows]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Persistent Sora job tracker state.")
+    parser.add_argument("--reel", help="Only this reel (safe title)")
+    parser.add_argument("--forget", action="store_true", help="Drop the jobs of --reel so the next run renders again")
+    args = parser.parse_args()
+    if args.forget:
+        if not args.reel:
+            print("--forget needs --reel", file=sys.stderr)
+            return 2
+        with closing(connect()) as conn:
+            conn.execute("DELETE FROM jobs WHERE reel = ?", (args.reel,))
+    print(json.dumps(jobs_report(args.reel), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())